@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, RevokedToken
 
 
 @admin.register(CustomUser)
@@ -12,3 +12,10 @@ class CustomUserAdmin(UserAdmin):
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('追加情報', {'fields': ('image',)}),
     )
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    """失効トークン管理画面"""
+    list_display = ('jti', 'expires_at', 'revoked_at')
+    search_fields = ('jti',)
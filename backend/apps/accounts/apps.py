@@ -5,3 +5,6 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.accounts'
     verbose_name = 'アカウント'
+
+    def ready(self):
+        from . import schema, signals  # noqa: F401
@@ -1,102 +1,87 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework import serializers
-from django.contrib.auth import authenticate
-from drf_spectacular.utils import extend_schema, OpenApiExample
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from .models import CustomUser
 
 
-class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
-    """メールアドレス認証用のJWTトークン取得シリアライザ"""
-    username_field = 'email'
+# 認証時にキャッシュするユーザーのフィールド（パスワード等は含めない）
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'image', 'is_active', 'is_staff', 'is_superuser')
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def get_user_cache_timeout():
+    return getattr(settings, 'ACCOUNTS_USER_CACHE_TIMEOUT', 60)
+
+
+def invalidate_cached_user(user_id):
+    """
+    認証用のユーザーキャッシュを削除
+    コミット前に別リクエストが古い行で再作成する場合に備え、コミット後にも削除する
+    """
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
 
-    # OpenAPI用にフィールドを明示的に定義
-    email = serializers.EmailField(
-        required=True,
-        error_messages={
-            'required': 'メールアドレスは必須です。',
-            'blank': 'メールアドレスは必須です。',
-            'invalid': '有効なメールアドレスを入力してください。',
-        }
-    )
-    password = serializers.CharField(
-        write_only=True,
-        required=True,
-        style={'input_type': 'password'},
-        error_messages={
-            'required': 'パスワードは必須です。',
-            'blank': 'パスワードは必須です。',
-        }
-    )
 
-    def validate(self, attrs):
-        """メールアドレスとパスワードで認証"""
-        email = attrs.get('email')
-        password = attrs.get('password')
-
-        if email and password:
-            # メールアドレスからユーザーを検索
-            try:
-                user = CustomUser.objects.get(email=email)
-            except CustomUser.DoesNotExist:
-                raise serializers.ValidationError(
-                    {'detail': 'メールアドレスまたはパスワードが正しくありません。'},
-                    code='authorization'
-                )
-
-            # パスワードを検証
-            if not user.check_password(password):
-                raise serializers.ValidationError(
-                    {'detail': 'メールアドレスまたはパスワードが正しくありません。'},
-                    code='authorization'
-                )
-
-            if not user.is_active:
-                raise serializers.ValidationError(
-                    {'detail': 'このアカウントは無効化されています。'},
-                    code='authorization'
-                )
-
-            # トークンを生成
-            refresh = self.get_token(user)
-
-            data = {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-
-            return data
-        else:
-            raise serializers.ValidationError(
-                {'detail': 'メールアドレスとパスワードの両方を入力してください。'},
-                code='authorization'
-            )
-
-
-class EmailTokenObtainPairView(TokenObtainPairView):
-    """メールアドレス認証用のJWTトークン取得ビュー"""
-    serializer_class = EmailTokenObtainPairSerializer
-
-    @extend_schema(
-        summary='JWTトークン取得（メール認証）',
-        description='メールアドレスとパスワードでJWTトークンを取得します。',
-        request=EmailTokenObtainPairSerializer,
-        responses={
-            200: OpenApiExample(
-                '認証成功',
-                value={
-                    'access': 'eyJ0eXAiOiJKV1QiLCJhbGc...',
-                    'refresh': 'eyJ0eXAiOiJKV1QiLCJhbGc...'
-                }
-            ),
-            400: OpenApiExample(
-                '認証失敗',
-                value={
-                    'detail': 'メールアドレスまたはパスワードが正しくありません。'
-                }
-            )
-        },
-        tags=['認証']
+def build_cached_user(values):
+    """
+    キャッシュしたフィールドだけを読み込んだ CustomUser を作成
+    それ以外のフィールドは遅延読み込みとなり、アクセスされた時点で初めてDBから取得する
+    """
+    # from_db はモデルのフィールド定義順に値を受け取る
+    field_names = [
+        field.attname for field in CustomUser._meta.concrete_fields
+        if field.attname in CACHED_USER_FIELDS
+    ]
+    return CustomUser.from_db(
+        router.db_for_read(CustomUser),
+        field_names,
+        [values[name] for name in field_names],
     )
-    def post(self, request, *args, **kwargs):
-        return super().post(request, *args, **kwargs)
+
+
+def get_cached_user(user_id):
+    """ユーザーIDからキャッシュ経由でユーザーを取得（存在しない場合は None）"""
+    key = user_cache_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        values = (
+            CustomUser.objects
+            .filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values(*CACHED_USER_FIELDS)
+            .first()
+        )
+        if values is None:
+            return None
+        cache.set(key, values, get_user_cache_timeout())
+    return build_cached_user(values)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ユーザーの取得を短時間キャッシュするJWT認証
+    キャッシュヒット時は認証でクエリを発行しない（ユーザーの保存・削除時にシグナルで削除）
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # パスワードハッシュとの照合が必要なため通常の取得を行う
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken('トークンにユーザー識別情報が含まれていません。') from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed('ユーザーが見つかりません。', code='user_not_found')
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed('このアカウントは無効化されています。', code='user_inactive')
+        return user
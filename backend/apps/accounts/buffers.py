@@ -0,0 +1,96 @@
+"""
+リクエストごとの書き込みをまとめるバッファ
+
+キーごとの値をプロセス内に溜め、一定間隔ごとにまとめて書き込む（apps.accounts.last_login / revocation）。
+
+- 反映間隔（秒、0 で即時書き込み）と件数の上限はサブクラスの get_flush_interval / get_buffer_size
+- 件数が上限に達した場合は間隔を待たずに書き込む
+- 溜まり始めてから反映間隔が経過するとタイマー（デーモンスレッド）で書き込むため、
+  以降のリクエストがないワーカーでも間隔ごとに反映される
+- プロセス終了時（atexit）に未反映の分を書き込む
+- タイマーと終了時の書き込みは ACCOUNTS_BACKGROUND_FLUSH が有効な場合のみ
+  （テストランナー config.test_runner が無効にする。テスト用のDBに別スレッド・破棄後に書き込まない）
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def background_flush_enabled():
+    return getattr(settings, 'ACCOUNTS_BACKGROUND_FLUSH', True)
+
+
+class WriteBuffer:
+    """キーごとの最新の値を保持し、まとめて書き込むバッファ（スレッドセーフ）"""
+    name = 'buffered writes'
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.timer = None
+        atexit.register(self.flush_on_exit)
+
+    def get_flush_interval(self):
+        raise NotImplementedError
+
+    def get_buffer_size(self):
+        raise NotImplementedError
+
+    def write(self, pending):
+        """溜まった {キー: 値} を書き込み、書き込んだ件数を返す"""
+        raise NotImplementedError
+
+    def record(self, key, value):
+        with self.lock:
+            self.pending[key] = value
+            remaining = self.get_flush_interval() - (time.monotonic() - self.last_flush)
+            due = remaining <= 0 or len(self.pending) >= self.get_buffer_size()
+            if not due and self.timer is None and background_flush_enabled():
+                self.schedule(remaining)
+        if due:
+            self.flush()
+
+    def schedule(self, delay):
+        """delay 秒後に書き込むタイマーを起動（lock を保持した状態で呼び出す）"""
+        self.timer = threading.Timer(delay, self.flush_in_background)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush_in_background(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush %s', self.name)
+        finally:
+            # タイマーのスレッドで開いた接続を閉じる
+            connections.close_all()
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        return pending
+
+    def flush(self):
+        """溜まった値を書き込み、書き込んだ件数を返す"""
+        pending = self.take()
+        if not pending:
+            return 0
+        return self.write(pending)
+
+    def flush_on_exit(self):
+        if not background_flush_enabled():
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush %s', self.name)
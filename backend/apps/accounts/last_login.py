@@ -0,0 +1,55 @@
+"""
+ログイン日時（CustomUser.last_login）の書き込みをまとめるバッファ
+
+トークン発行ごとにユーザー行を UPDATE すると、授業開始時など短時間にログインが集中した際に
+行の更新が競合する。ログイン日時はプロセス内に溜め、一定間隔ごとに1回の bulk_update
+（CASE WHEN による1文の UPDATE）で書き込む（apps.accounts.buffers）。
+
+- 反映間隔: settings.ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL（秒、0 で即時書き込み）
+- 件数が ACCOUNTS_LAST_LOGIN_BUFFER_SIZE に達した場合は間隔を待たずに書き込む
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from .buffers import WriteBuffer
+from .models import CustomUser
+
+
+def get_flush_interval():
+    return getattr(settings, 'ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL', 60)
+
+
+def get_buffer_size():
+    return getattr(settings, 'ACCOUNTS_LAST_LOGIN_BUFFER_SIZE', 1000)
+
+
+class LastLoginBuffer(WriteBuffer):
+    """ユーザーIDごとの最新ログイン日時を保持するバッファ"""
+    name = 'buffered last_login updates'
+
+    def get_flush_interval(self):
+        return get_flush_interval()
+
+    def get_buffer_size(self):
+        return get_buffer_size()
+
+    def record(self, user_id, logged_in_at=None):
+        super().record(user_id, logged_in_at or timezone.now())
+
+    def write(self, pending):
+        """溜まったログイン日時を1回の UPDATE で書き込む"""
+        users = [CustomUser(pk=user_id, last_login=logged_in_at) for user_id, logged_in_at in pending.items()]
+        # bulk_update はシグナルを送らないため、ユーザーの認証キャッシュは削除されない
+        return CustomUser.objects.bulk_update(users, ['last_login'], batch_size=500)
+
+
+last_login_buffer = LastLoginBuffer()
+
+
+def record_login(user):
+    """ログイン日時を記録（反映はバッファ経由）"""
+    last_login_buffer.record(user.pk)
+
+
+def flush_on_exit():
+    last_login_buffer.flush_on_exit()
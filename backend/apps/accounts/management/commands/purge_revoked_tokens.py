@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.accounts.revocation import purge_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = '有効期限（REFRESH_TOKEN_LIFETIME）を過ぎた失効トークンを削除します（定期実行用）'
+
+    def handle(self, *args, **options):
+        deleted = purge_revoked_tokens()
+        self.stdout.write(self.style.SUCCESS(f'{deleted}件の失効トークンを削除しました。'))
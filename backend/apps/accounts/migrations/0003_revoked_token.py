@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('jti', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='JTI')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='有効期限')),
+                ('revoked_at', models.DateTimeField(auto_now_add=True, verbose_name='失効日時')),
+            ],
+            options={
+                'verbose_name': '失効トークン',
+                'verbose_name_plural': '失効トークン',
+            },
+        ),
+    ]
@@ -25,3 +25,17 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class RevokedToken(models.Model):
+    """失効済みのリフレッシュトークン（ローテーションで使用済みになったもの）"""
+    jti = models.CharField(max_length=255, primary_key=True, verbose_name='JTI')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='有効期限')
+    revoked_at = models.DateTimeField(auto_now_add=True, verbose_name='失効日時')
+
+    class Meta:
+        verbose_name = '失効トークン'
+        verbose_name_plural = '失効トークン'
+
+    def __str__(self):
+        return self.jti
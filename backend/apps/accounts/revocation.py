@@ -0,0 +1,86 @@
+"""
+リフレッシュトークンの失効ストア
+
+- キャッシュ: 有効期限までの TTL で cache.add（確認と登録を1回の操作で行い、失効済みなら DB に問い合わせずに判定）
+- DB: JTI を主キーとする RevokedToken（キャッシュが消えても失効済みと判定できる）
+
+DB への書き込みは settings.ACCOUNTS_REVOKED_TOKEN_FLUSH_INTERVAL（秒）ごとにバッファからまとめて行う
+（apps.accounts.buffers）。リクエスト中は主キーでの存在確認だけを行う。
+反映前にキャッシュが消えた場合は、別のプロセスで同じトークンを再利用できる期間が残る。
+0 の場合（共有キャッシュがない構成の既定）はリクエスト中に INSERT し、一意制約でプロセスをまたいだ再利用を防ぐ。
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .buffers import WriteBuffer
+from .models import RevokedToken
+
+
+def revocation_cache_key(jti):
+    return f'accounts:revoked:{jti}'
+
+
+def get_flush_interval():
+    return getattr(settings, 'ACCOUNTS_REVOKED_TOKEN_FLUSH_INTERVAL', 0)
+
+
+def get_buffer_size():
+    return getattr(settings, 'ACCOUNTS_REVOKED_TOKEN_BUFFER_SIZE', 1000)
+
+
+class RevokedTokenBuffer(WriteBuffer):
+    """JTI ごとの有効期限を保持し、1回の INSERT で書き込むバッファ"""
+    name = 'buffered revoked tokens'
+
+    def get_flush_interval(self):
+        return get_flush_interval()
+
+    def get_buffer_size(self):
+        return get_buffer_size()
+
+    def write(self, pending):
+        tokens = [RevokedToken(jti=jti, expires_at=expires_at) for jti, expires_at in pending.items()]
+        # 同じ JTI が別のプロセスから書き込み済みの場合は無視する（判定はリクエスト時に済んでいる）
+        return len(RevokedToken.objects.bulk_create(tokens, batch_size=500, ignore_conflicts=True))
+
+
+revoked_token_buffer = RevokedTokenBuffer()
+
+
+def revoke_token(token):
+    """
+    トークンを失効させる。既に失効済みだった場合は False を返す
+    同じトークンで同時にリフレッシュしても、キャッシュ（共有キャッシュの場合）または一意制約により成功するのは1件のみ
+    """
+    jti = token.payload[api_settings.JTI_CLAIM]
+    expires_at = datetime.fromtimestamp(token.payload['exp'], tz=dt_timezone.utc)
+    timeout = int((expires_at - timezone.now()).total_seconds()) + 1
+    if timeout <= 0:
+        return False
+
+    if not cache.add(revocation_cache_key(jti), True, timeout):
+        return False
+
+    if get_flush_interval() > 0:
+        if jti in revoked_token_buffer.pending or RevokedToken.objects.filter(jti=jti).exists():
+            return False
+        revoked_token_buffer.record(jti, expires_at)
+        return True
+
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    return True
+
+
+def purge_revoked_tokens(now=None):
+    """有効期限を過ぎた失効トークンを削除（期限切れのトークンは署名検証の時点で拒否される）"""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
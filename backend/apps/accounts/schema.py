@@ -0,0 +1,6 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """CachedJWTAuthentication を JWTAuthentication と同じ Bearer 認証としてスキーマに記載"""
+    target_class = 'apps.accounts.authentication.CachedJWTAuthentication'
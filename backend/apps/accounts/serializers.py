@@ -1,10 +1,17 @@
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth.password_validation import validate_password
+from apps.common.dynamic_fields import DynamicFieldsMixin
+from .authentication import get_cached_user
+from .last_login import record_login
 from .models import CustomUser
+from .revocation import revoke_token
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """ユーザーシリアライザ"""
     class Meta:
         model = CustomUser
@@ -94,3 +101,103 @@ class RegisterSerializer(serializers.ModelSerializer):
             image=validated_data.get('image', None)
         )
         return user
+
+
+class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """メールアドレス認証用のJWTトークン取得シリアライザ"""
+    username_field = 'email'
+
+    # OpenAPI用にフィールドを明示的に定義
+    email = serializers.EmailField(
+        required=True,
+        error_messages={
+            'required': 'メールアドレスは必須です。',
+            'blank': 'メールアドレスは必須です。',
+            'invalid': '有効なメールアドレスを入力してください。',
+        }
+    )
+    password = serializers.CharField(
+        write_only=True,
+        required=True,
+        style={'input_type': 'password'},
+        error_messages={
+            'required': 'パスワードは必須です。',
+            'blank': 'パスワードは必須です。',
+        }
+    )
+
+    def validate(self, attrs):
+        """メールアドレスとパスワードで認証"""
+        email = attrs.get('email')
+        password = attrs.get('password')
+
+        if email and password:
+            # メールアドレスからユーザーを検索
+            try:
+                user = CustomUser.objects.get(email=email)
+            except CustomUser.DoesNotExist:
+                raise serializers.ValidationError(
+                    {'detail': 'メールアドレスまたはパスワードが正しくありません。'},
+                    code='authorization'
+                )
+
+            # パスワードを検証
+            if not user.check_password(password):
+                raise serializers.ValidationError(
+                    {'detail': 'メールアドレスまたはパスワードが正しくありません。'},
+                    code='authorization'
+                )
+
+            if not user.is_active:
+                raise serializers.ValidationError(
+                    {'detail': 'このアカウントは無効化されています。'},
+                    code='authorization'
+                )
+
+            # トークンを生成
+            refresh = self.get_token(user)
+
+            if api_settings.UPDATE_LAST_LOGIN:
+                record_login(user)
+
+            data = {
+                'refresh': str(refresh),
+                'access': str(refresh.access_token),
+            }
+
+            return data
+        else:
+            raise serializers.ValidationError(
+                {'detail': 'メールアドレスとパスワードの両方を入力してください。'},
+                code='authorization'
+            )
+
+
+class RevokingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    使用済みのリフレッシュトークンを失効させるトークン更新シリアライザ
+    ローテーション時に古いトークンを失効ストアへ登録し、再利用されたトークンは拒否する
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id and not api_settings.USER_AUTHENTICATION_RULE(get_cached_user(user_id)):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and not revoke_token(refresh):
+                raise TokenError('このトークンは失効しています。')
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
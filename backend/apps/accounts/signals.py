@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, raw=False, created=False, **kwargs):
+    """ユーザーの更新（無効化を含む）で認証用キャッシュを削除"""
+    if raw or created:
+        return
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
@@ -1,8 +1,19 @@
-from django.test import TestCase
+from datetime import timedelta
+
+import msgpack
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from .models import CustomUser
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from apps.common.query_budget import QueryBudgetTestMixin
+from .last_login import last_login_buffer
+from .models import CustomUser, RevokedToken
+from .revocation import purge_revoked_tokens, revoked_token_buffer
 
 
 class RegisterViewTestCase(TestCase):
@@ -162,6 +173,10 @@ class TokenObtainPairViewTestCase(TestCase):
             password='testpass1234'
         )
 
+    def tearDown(self):
+        # テストDBの破棄後に終了時の書き込みが走らないよう、未反映分を破棄
+        last_login_buffer.take()
+
     def test_token_obtain_with_email_success(self):
         """正常系: メールアドレスでトークン取得が成功する"""
         payload = {
@@ -229,3 +244,430 @@ class TokenObtainPairViewTestCase(TestCase):
         response = self.client.post(self.token_url, payload)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('detail', response.data)
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    """ユーザーをキャッシュするJWT認証のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.me_url = reverse('me')
+        self.user = CustomUser.objects.create_user(
+            username='cacheduser',
+            email='cached@example.com',
+            password='testpass1234'
+        )
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_warm_cache_authenticates_without_query(self):
+        """正常系: キャッシュ済みのユーザーはクエリなしで認証される"""
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'cacheduser')
+        self.assertEqual(response.data['email'], 'cached@example.com')
+
+    def test_deferred_fields_load_on_access(self):
+        """正常系: キャッシュにないフィールドはアクセス時に読み込まれる"""
+        self.client.get(self.me_url)
+        from .authentication import CachedJWTAuthentication
+        user = CachedJWTAuthentication().get_user(AccessToken.for_user(self.user))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('testpass1234'))
+
+    def test_deactivation_invalidates_cache(self):
+        """異常系: 無効化したユーザーはキャッシュがあっても認証されない"""
+        self.client.get(self.me_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_invalidates_cache(self):
+        """正常系: ユーザー情報の更新が次のリクエストに反映される"""
+        self.client.get(self.me_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.data['username'], 'renamed')
+
+    def test_deleted_user_is_rejected(self):
+        """異常系: 削除したユーザーのトークンは認証されない"""
+        self.client.get(self.me_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenRefreshRevocationTestCase(TestCase):
+    """リフレッシュトークンの失効のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.refresh_url = reverse('token_refresh')
+        self.user = CustomUser.objects.create_user(
+            username='refreshuser',
+            email='refresh@example.com',
+            password='testpass1234'
+        )
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def test_refresh_rotates_and_revokes(self):
+        """正常系: 更新で新しいトークンが発行され、使用済みトークンが失効する"""
+        response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+        response = self.client.post(self.refresh_url, {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reused_token_rejected_from_cache(self):
+        """異常系: 使用済みトークンはDBに問い合わせずに拒否される"""
+        self.client.post(self.refresh_url, {'refresh': self.refresh})
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reused_token_rejected_after_cache_loss(self):
+        """異常系: キャッシュが消えても使用済みトークンは拒否される"""
+        self.client.post(self.refresh_url, {'refresh': self.refresh})
+        cache.clear()
+
+        response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+    def test_inactive_user_cannot_refresh(self):
+        """異常系: 無効化されたユーザーはトークンを更新できない"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_purge_removes_only_expired(self):
+        """正常系: 有効期限を過ぎた失効トークンのみ削除される"""
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(minutes=1))
+        RevokedToken.objects.create(jti='active', expires_at=now + timedelta(days=1))
+
+        self.assertEqual(purge_revoked_tokens(), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['active'])
+
+
+@override_settings(ACCOUNTS_REVOKED_TOKEN_FLUSH_INTERVAL=60)
+class BufferedTokenRevocationTestCase(TestCase):
+    """失効トークンの書き込みバッファのテスト（共有キャッシュがある構成）"""
+
+    def setUp(self):
+        cache.clear()
+        revoked_token_buffer.take()
+        self.client = APIClient()
+        self.refresh_url = reverse('token_refresh')
+        self.user = CustomUser.objects.create_user(
+            username='refreshuser',
+            email='refresh@example.com',
+            password='testpass1234'
+        )
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def tearDown(self):
+        revoked_token_buffer.take()
+
+    def test_refresh_does_not_insert_on_request(self):
+        """正常系: リクエスト中は INSERT せず、まとめて書き込まれる"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(query['sql'].startswith('INSERT') for query in queries))
+        self.assertFalse(RevokedToken.objects.exists())
+
+        self.client.post(self.refresh_url, {'refresh': response.data['refresh']})
+        with self.assertNumQueries(1):
+            self.assertEqual(revoked_token_buffer.flush(), 2)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+    def test_reused_token_rejected_after_cache_loss(self):
+        """異常系: キャッシュが消えても、反映前はバッファ、反映後は DB で拒否される"""
+        self.client.post(self.refresh_url, {'refresh': self.refresh})
+        cache.clear()
+        response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        revoked_token_buffer.flush()
+        cache.clear()
+        response = self.client.post(self.refresh_url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(revoked_token_buffer.pending, {})
+
+    def test_flush_ignores_tokens_written_by_other_workers(self):
+        """正常系: 別のプロセスが書き込み済みの JTI があっても書き込みは失敗しない"""
+        self.client.post(self.refresh_url, {'refresh': self.refresh})
+        jti, expires_at = next(iter(revoked_token_buffer.pending.items()))
+        RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+
+        revoked_token_buffer.flush()
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+
+@override_settings(ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL=60)
+class LastLoginBufferTestCase(TestCase):
+    """ログイン日時の書き込みバッファのテスト"""
+
+    def setUp(self):
+        last_login_buffer.take()
+        self.client = APIClient()
+        self.token_url = reverse('token_obtain_pair')
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f'student{i}',
+                email=f'student{i}@example.com',
+                password='testpass1234'
+            )
+            for i in range(3)
+        ]
+
+    def tearDown(self):
+        last_login_buffer.take()
+
+    def login(self, user):
+        return self.client.post(self.token_url, {'email': user.email, 'password': 'testpass1234'})
+
+    def test_logins_are_buffered_and_flushed_in_one_update(self):
+        """正常系: ログイン日時は溜めてから1回の UPDATE で書き込まれる"""
+        for user in self.users:
+            self.assertEqual(self.login(user).status_code, status.HTTP_200_OK)
+        self.assertFalse(CustomUser.objects.filter(last_login__isnull=False).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(last_login_buffer.flush(), 3)
+        self.assertEqual(CustomUser.objects.filter(last_login__isnull=False).count(), 3)
+
+    def test_repeated_logins_keep_latest(self):
+        """正常系: 同じユーザーの複数回のログインは最新の日時のみ書き込まれる"""
+        self.login(self.users[0])
+        self.login(self.users[0])
+        latest = last_login_buffer.pending[self.users[0].pk]
+
+        self.assertEqual(last_login_buffer.flush(), 1)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].last_login, latest)
+
+    @override_settings(ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_immediately(self):
+        """正常系: 反映間隔が0の場合はログイン時に書き込まれる"""
+        self.login(self.users[0])
+        self.users[0].refresh_from_db()
+        self.assertIsNotNone(self.users[0].last_login)
+        self.assertEqual(last_login_buffer.pending, {})
+
+    @override_settings(ACCOUNTS_LAST_LOGIN_BUFFER_SIZE=2)
+    def test_full_buffer_is_flushed(self):
+        """正常系: 件数上限に達すると間隔を待たずに書き込まれる"""
+        self.login(self.users[0])
+        self.login(self.users[1])
+        self.assertEqual(CustomUser.objects.filter(last_login__isnull=False).count(), 2)
+
+    @override_settings(ACCOUNTS_BACKGROUND_FLUSH=True, ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL=1)
+    def test_idle_buffer_is_flushed_by_timer(self):
+        """正常系: 以降のログインがなくても反映間隔の経過後にタイマーで1回書き込まれる"""
+        import threading
+        from unittest import mock
+
+        flushed = threading.Event()
+        # 反映間隔をここから数える（setUp のユーザー作成に時間がかかっても間隔を過ぎないように）
+        last_login_buffer.take()
+        with mock.patch.object(last_login_buffer, 'flush', side_effect=flushed.set) as flush:
+            last_login_buffer.record(self.users[0].pk)
+            last_login_buffer.record(self.users[1].pk)
+            self.assertIsNotNone(last_login_buffer.timer)
+            self.assertTrue(flushed.wait(5))
+        flush.assert_called_once_with()
+        self.assertIsNone(last_login_buffer.timer)
+
+    def test_timer_and_exit_flush_are_disabled_in_tests(self):
+        """正常系: テスト実行時はタイマーを起動せず、終了時の書き込みも行わない"""
+        from .last_login import flush_on_exit
+
+        self.login(self.users[0])
+        self.assertIsNone(last_login_buffer.timer)
+        with self.assertNumQueries(0):
+            flush_on_exit()
+        self.assertIn(self.users[0].pk, last_login_buffer.pending)
+
+
+class MeSparseFieldsTestCase(TestCase):
+    """現在のユーザー情報取得APIの ?fields= のテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username='meuser',
+            email='me@example.com',
+            password='testpass1234'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_fields(self):
+        """正常系: 指定したフィールドのみ返す"""
+        response = self.client.get(reverse('me'), {'fields': 'id,username'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'id', 'username'})
+
+    def test_omit(self):
+        """正常系: 指定したフィールドを除外して返す"""
+        response = self.client.get(reverse('me'), {'omit': 'email,image'})
+        self.assertEqual(set(response.data), {'id', 'username'})
+
+
+class MessagePackTestCase(TestCase):
+    """MessagePack（application/msgpack）でのリクエスト・レスポンスのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username='msgpackuser',
+            email='msgpack@example.com',
+            password='testpass1234'
+        )
+
+    def tearDown(self):
+        last_login_buffer.take()
+
+    def test_token_obtain_and_me(self):
+        """正常系: MessagePack のボディでトークンを取得し、ユーザー情報を MessagePack で取得できる"""
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            msgpack.packb({'email': 'msgpack@example.com', 'password': 'testpass1234'}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        tokens = msgpack.unpackb(response.content)
+
+        response = self.client.get(
+            reverse('me'), HTTP_ACCEPT='application/msgpack', HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            msgpack.unpackb(response.content),
+            {'id': self.user.id, 'username': 'msgpackuser', 'email': 'msgpack@example.com', 'image': None},
+        )
+
+    def test_register_validation_error(self):
+        """異常系: バリデーションエラーも MessagePack で返す"""
+        response = self.client.post(
+            reverse('register'),
+            msgpack.packb({'username': 'msgpackuser', 'email': 'other@example.com', 'password': 'short'}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = msgpack.unpackb(response.content)
+        self.assertEqual(errors['username'], ['このユーザー名は既に使用されています。'])
+        self.assertIn('password2', errors)
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    """認証APIのクエリ数の上限（query_budgets）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username='budgetuser',
+            email='budget@example.com',
+            password='testpass1234'
+        )
+        self.sequence = 0
+
+    def tearDown(self):
+        last_login_buffer.take()
+
+    def make_users(self, size):
+        for _ in range(size):
+            self.sequence += 1
+            CustomUser.objects.create_user(
+                username=f'user{self.sequence}', email=f'user{self.sequence}@example.com', password='testpass1234'
+            )
+
+    def test_every_view_has_budget(self):
+        """すべてのビューのすべての HTTP メソッドにクエリ数の上限が宣言されている"""
+        from rest_framework.views import APIView
+        from apps.common.query_budget import get_undeclared_actions
+        from . import views
+
+        api_views = [
+            value for value in vars(views).values()
+            if isinstance(value, type) and issubclass(value, APIView) and value.__module__ == views.__name__
+        ]
+        self.assertEqual(len(api_views), 4)
+        for view in api_views:
+            with self.subTest(view=view.__name__):
+                self.assertEqual(get_undeclared_actions(view), [])
+
+    def test_register(self):
+        from .views import RegisterView
+
+        def prepare(size):
+            self.make_users(size)
+            payload = {
+                'username': f'newuser{size}',
+                'email': f'newuser{size}@example.com',
+                'password': 'testpass1234',
+                'password2': 'testpass1234',
+            }
+            return lambda: self.client.post(reverse('register'), payload)
+
+        self.assertQueryBudget(RegisterView, 'post', prepare)
+
+    def test_me(self):
+        from .views import MeView
+
+        def prepare(size):
+            self.make_users(size)
+            return lambda: self.client.get(reverse('me'))
+
+        self.client.force_authenticate(user=self.user)
+        self.assertQueryBudget(MeView, 'get', prepare)
+
+    def test_token_obtain(self):
+        from .views import EmailTokenObtainPairView
+
+        def prepare(size):
+            self.make_users(size)
+            payload = {'email': 'budget@example.com', 'password': 'testpass1234'}
+            return lambda: self.client.post(reverse('token_obtain_pair'), payload)
+
+        self.assertQueryBudget(EmailTokenObtainPairView, 'post', prepare)
+
+    def test_token_refresh(self):
+        from .views import RevokingTokenRefreshView
+
+        def prepare(size):
+            # 失効済みトークンが増えてもクエリ数は変わらない
+            for _ in range(size):
+                self.client.post(reverse('token_refresh'), {'refresh': str(RefreshToken.for_user(self.user))})
+            payload = {'refresh': str(RefreshToken.for_user(self.user))}
+            return lambda: self.client.post(reverse('token_refresh'), payload)
+
+        self.assertQueryBudget(RevokingTokenRefreshView, 'post', prepare)
@@ -1,9 +1,16 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_spectacular.utils import extend_schema, OpenApiExample
+from apps.common.dynamic_fields import DynamicFieldsViewMixin
 from .models import CustomUser
-from .serializers import RegisterSerializer, UserSerializer
+from .serializers import (
+    EmailTokenObtainPairSerializer,
+    RegisterSerializer,
+    RevokingTokenRefreshSerializer,
+    UserSerializer,
+)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -11,6 +18,8 @@ class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
+    # 1リクエストのクエリ数の上限（HTTP メソッドごと、apps.common.query_budget のテストで検証）
+    query_budgets = {'post': 3}
 
     @extend_schema(
         summary='ユーザー登録',
@@ -40,10 +49,11 @@ class RegisterView(generics.CreateAPIView):
         return Response(user_serializer.data, status=status.HTTP_201_CREATED)
 
 
-class MeView(generics.RetrieveAPIView):
+class MeView(DynamicFieldsViewMixin, generics.RetrieveAPIView):
     """現在のユーザー情報取得API"""
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    query_budgets = {'get': 0}
 
     @extend_schema(
         summary='現在のユーザー情報取得',
@@ -60,3 +70,63 @@ class MeView(generics.RetrieveAPIView):
     def get(self, request, *args, **kwargs):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
+
+
+class EmailTokenObtainPairView(TokenObtainPairView):
+    """メールアドレス認証用のJWTトークン取得ビュー"""
+    serializer_class = EmailTokenObtainPairSerializer
+    query_budgets = {'post': 1}
+
+    @extend_schema(
+        summary='JWTトークン取得（メール認証）',
+        description='メールアドレスとパスワードでJWTトークンを取得します。',
+        request=EmailTokenObtainPairSerializer,
+        responses={
+            200: OpenApiExample(
+                '認証成功',
+                value={
+                    'access': 'eyJ0eXAiOiJKV1QiLCJhbGc...',
+                    'refresh': 'eyJ0eXAiOiJKV1QiLCJhbGc...'
+                }
+            ),
+            400: OpenApiExample(
+                '認証失敗',
+                value={
+                    'detail': 'メールアドレスまたはパスワードが正しくありません。'
+                }
+            )
+        },
+        tags=['認証']
+    )
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+
+class RevokingTokenRefreshView(TokenRefreshView):
+    """使用済みリフレッシュトークンを失効させるJWTトークン更新ビュー"""
+    serializer_class = RevokingTokenRefreshSerializer
+    query_budgets = {'post': 4}
+
+    @extend_schema(
+        summary='JWTトークン更新',
+        description='リフレッシュトークンから新しいアクセストークンとリフレッシュトークンを発行します。使用したリフレッシュトークンは失効します。',
+        request=RevokingTokenRefreshSerializer,
+        responses={
+            200: OpenApiExample(
+                '更新成功',
+                value={
+                    'access': 'eyJ0eXAiOiJKV1QiLCJhbGc...',
+                    'refresh': 'eyJ0eXAiOiJKV1QiLCJhbGc...'
+                }
+            ),
+            401: OpenApiExample(
+                '失効済み',
+                value={
+                    'detail': 'このトークンは失効しています。'
+                }
+            )
+        },
+        tags=['認証']
+    )
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from apps.benchmarks.runner import (
+    BenchmarkError, ScenarioRunner, build_baseline, compare_with_baseline, load_baseline, save_baseline,
+)
+from apps.benchmarks.scenarios import SCENARIOS, SCENARIOS_BY_NAME, BenchmarkContext, BenchmarkDataMissing
+from apps.benchmarks.seeding import count_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        'seed_benchmark_data で作成したデータに対して apps.quiz の主要なエンドポイントを計測し、'
+        'p50 / p95 の応答時間・クエリ数・ピークメモリを出力します（ベースラインの保存・比較に対応）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=list(SCENARIOS_BY_NAME), dest='scenarios',
+            help='計測するシナリオ（複数指定可、省略時は全て）',
+        )
+        parser.add_argument('--iterations', type=int, default=30, help='計測の繰り返し回数（既定: 30）')
+        parser.add_argument('--warmup', type=int, default=3, help='計測前の実行回数（既定: 3）')
+        parser.add_argument('--cold', action='store_true', help='リクエストごとにキャッシュを削除する')
+        parser.add_argument('--save-baseline', metavar='PATH', help='計測結果をベースラインとして JSON で保存する')
+        parser.add_argument('--compare', metavar='PATH', help='ベースラインと比較し、性能低下があれば失敗する')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='応答時間・メモリの許容する悪化の割合（既定: 0.2）')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0, help='性能低下とみなす応答時間の最小の差（既定: 1.0）')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations は1以上を指定してください。')
+        if settings.DEBUG:
+            self.stderr.write('DEBUG=True のため、クエリの記録などのオーバーヘッドが計測値に含まれます。')
+
+        try:
+            context = BenchmarkContext.load()
+        except BenchmarkDataMissing as e:
+            raise CommandError(str(e))
+
+        scenarios = [SCENARIOS_BY_NAME[name] for name in options['scenarios']] if options['scenarios'] else SCENARIOS
+        runner = ScenarioRunner(context, iterations=options['iterations'], warmup=options['warmup'], cold=options['cold'])
+        results = {}
+        # テスト用クライアントのホスト名（testserver）を許可する
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.stdout.write(f'{"scenario":<24} {"p50 ms":>10} {"p95 ms":>10} {"queries":>8} {"peak KiB":>10}')
+            for scenario in scenarios:
+                try:
+                    result = runner.run(scenario)
+                except BenchmarkError as e:
+                    raise CommandError(str(e))
+                results[scenario.name] = result
+                self.stdout.write(
+                    f'{scenario.name:<24} {result["p50_ms"]:>10.2f} {result["p95_ms"]:>10.2f} '
+                    f'{result["queries"]:>8} {result["peak_memory_kb"]:>10.1f}'
+                )
+
+        data_counts = count_benchmark_data()
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], build_baseline(results, runner, data_counts))
+            self.stdout.write(f'ベースラインを {options["save_baseline"]} に保存しました。')
+
+        if options['compare']:
+            try:
+                baseline = load_baseline(options['compare'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'ベースラインを読み込めません: {e}')
+            if baseline.get('data') != data_counts:
+                self.stderr.write('ベースラインとデータの規模が異なるため、比較結果は参考値です。')
+            regressions = compare_with_baseline(
+                results, baseline, tolerance=options['tolerance'], min_delta_ms=options['min_delta_ms']
+            )
+            for name, metric, previous, current in regressions:
+                self.stdout.write(self.style.ERROR(f'{name}: {metric} {previous} -> {current}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)}件の性能低下を検出しました。')
+            self.stdout.write(self.style.SUCCESS('ベースラインからの性能低下はありません。'))
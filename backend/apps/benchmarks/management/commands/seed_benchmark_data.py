@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.benchmarks.seeding import SeedShape, benchmark_data_exists, clear_benchmark_data, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        'ベンチマーク用の合成データ（ユーザー名が bench- で始まるユーザーとその問題集など）を bulk_create で作成します。'
+        '本番のデータベースでは実行しないでください'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100, help='問題集の数（既定: 100）')
+        parser.add_argument('--questions-per-title', type=int, default=20, help='問題集あたりの問題数（既定: 20）')
+        parser.add_argument('--choices-per-question', type=int, default=4, help='問題あたりの選択肢数（既定: 4）')
+        parser.add_argument('--ratings-per-title', type=int, default=5, help='問題集あたりの評価数（既定: 5）')
+        parser.add_argument('--favorites-per-user', type=int, default=10, help='ユーザーあたりのお気に入り数（問題集・問題それぞれ、既定: 10）')
+        parser.add_argument('--users', type=int, default=50, help='ユーザー数（既定: 50）')
+        parser.add_argument('--public-ratio', type=float, default=0.9, help='公開する問題集の割合（既定: 0.9）')
+        parser.add_argument('--seed', type=int, default=0, help='乱数のシード（既定: 0）')
+        parser.add_argument('--batch-size', type=int, default=1000, help='1回の INSERT で作成する行数（既定: 1000）')
+        parser.add_argument('--compile-snapshots', action='store_true', help='公開問題集のスナップショットも作成する')
+        parser.add_argument('--clear', action='store_true', help='作成済みのベンチマーク用データを削除してから作成する')
+        parser.add_argument('--clear-only', action='store_true', help='作成済みのベンチマーク用データを削除するのみ')
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['clear_only']:
+            deleted = clear_benchmark_data()
+            self.stdout.write(f'{deleted}件のベンチマーク用データを削除しました。')
+            if options['clear_only']:
+                return
+        elif benchmark_data_exists():
+            raise CommandError('ベンチマーク用のデータが既にあります。--clear を指定すると削除してから作成します。')
+
+        try:
+            shape = SeedShape(
+                titles=options['titles'],
+                questions_per_title=options['questions_per_title'],
+                choices_per_question=options['choices_per_question'],
+                ratings_per_title=options['ratings_per_title'],
+                favorites_per_user=options['favorites_per_user'],
+                users=options['users'],
+                public_ratio=options['public_ratio'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        counts = seed_benchmark_data(
+            shape,
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            compile_snapshots=options['compile_snapshots'],
+            progress=lambda done: self.stdout.write(f'  問題集 {done:,} / {shape.titles:,}'),
+        )
+        summary = ', '.join(f'{name}={count:,}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'ベンチマーク用のデータを作成しました（{summary}）。'))
@@ -0,0 +1,146 @@
+"""
+シナリオの計測とベースラインとの比較
+
+各シナリオを warmup 回実行した後、iterations 回の応答時間から p50 / p95 を求める。
+クエリ数とピークメモリ（tracemalloc）は計測のオーバーヘッドが応答時間に混ざらないよう、
+それぞれ別の1回の実行で測る。
+
+ベースラインは JSON で保存し、比較時は次の場合を性能低下として報告する。
+- p50 / p95: ベースラインの (1 + tolerance) 倍を超え、かつ差が min_delta_ms を超える
+- クエリ数: ベースラインより多い（実行ごとに変わらない値のため許容幅なし）
+- ピークメモリ: ベースラインの (1 + tolerance) 倍を超える
+"""
+import json
+import math
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+BASELINE_VERSION = 1
+
+
+class BenchmarkError(Exception):
+    """シナリオのリクエストが失敗した"""
+
+
+def percentile(values, pct):
+    """線形補間によるパーセンタイル"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class ScenarioRunner:
+    """シナリオを実行して応答時間・クエリ数・ピークメモリを計測する"""
+
+    def __init__(self, context, iterations=30, warmup=3, cold=False):
+        self.context = context
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold = cold
+        # JWT認証を含めて計測するため、force_authenticate ではなくトークンを送る
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(context.user)}')
+
+    def request(self, scenario):
+        """シナリオのリクエストを1回送り、所要時間（ミリ秒）を返す"""
+        path, data = scenario.build(self.context)
+        if self.cold:
+            cache.clear()
+        started = time.perf_counter()
+        if scenario.method == 'get':
+            response = self.client.get(path, data)
+        else:
+            response = getattr(self.client, scenario.method)(path, data, format='json')
+        # ストリーミングのレスポンスは最後まで読み出すまでを計測する
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise BenchmarkError(f'{scenario.name}: {scenario.method.upper()} {path} が {response.status_code} を返しました。')
+        return elapsed
+
+    def count_queries(self, scenario):
+        with CaptureQueriesContext(connection) as queries:
+            self.request(scenario)
+        return len(queries)
+
+    def measure_peak_memory(self, scenario):
+        """1回のリクエストで確保されたメモリのピーク（KiB）"""
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            self.request(scenario)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        return round((peak - baseline) / 1024, 1)
+
+    def run(self, scenario):
+        for _ in range(self.warmup):
+            self.request(scenario)
+        timings = [self.request(scenario) for _ in range(self.iterations)]
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': self.count_queries(scenario),
+            'peak_memory_kb': self.measure_peak_memory(scenario),
+        }
+
+
+def build_baseline(results, runner, data_counts):
+    """計測結果と計測条件をベースラインとして保存する形式にまとめる"""
+    return {
+        'version': BASELINE_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'options': {'iterations': runner.iterations, 'warmup': runner.warmup, 'cold': runner.cold},
+        'data': data_counts,
+        'scenarios': results,
+    }
+
+
+def save_baseline(path, baseline):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2, min_delta_ms=1.0):
+    """ベースラインより悪化した指標を (シナリオ, 指標, ベースライン, 今回) のリストで返す"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit and current[metric] - previous[metric] > min_delta_ms:
+                regressions.append((name, metric, previous[metric], current[metric]))
+        if current['queries'] > previous['queries']:
+            regressions.append((name, 'queries', previous['queries'], current['queries']))
+        if current['peak_memory_kb'] > previous['peak_memory_kb'] * (1 + tolerance):
+            regressions.append((name, 'peak_memory_kb', previous['peak_memory_kb'], current['peak_memory_kb']))
+    return regressions
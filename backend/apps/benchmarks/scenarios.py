@@ -0,0 +1,121 @@
+"""
+ベンチマークのシナリオ
+
+apps.quiz.views の主要なエンドポイント（一覧・詳細・問題一覧・採点・検索・お気に入り）を、
+ベンチマーク用のユーザーとして呼び出す。対象の問題集などは作成済みのデータから選ぶ（BenchmarkContext）。
+"""
+from collections import defaultdict
+
+from apps.quiz.models import Title, Question, Choice
+from .seeding import BENCHMARK_USERNAME_PREFIX, SEARCH_TERMS, benchmark_users
+
+
+class BenchmarkDataMissing(Exception):
+    """ベンチマーク用のデータが作成されていない"""
+
+
+class BenchmarkContext:
+    """シナリオが参照するユーザー・問題集・回答"""
+
+    def __init__(self, user, title_id, question_id, answers, search_term):
+        self.user = user
+        self.title_id = title_id
+        self.question_id = question_id
+        self.answers = answers
+        self.search_term = search_term
+
+    @classmethod
+    def load(cls, answers_count=20):
+        """
+        作成済みのデータから対象を選ぶ
+        問題集は自分以外が所有する公開問題集のうち、ID順で中央のもの（学習者として閲覧する想定）
+        """
+        user = benchmark_users().order_by('pk').first()
+        if user is None:
+            raise BenchmarkDataMissing('ベンチマーク用のデータがありません。seed_benchmark_data で作成してください。')
+
+        titles = Title.objects.filter(
+            owner__username__startswith=BENCHMARK_USERNAME_PREFIX, status=Title.PUBLIC
+        ).exclude(owner=user).order_by('pk').values_list('pk', flat=True)
+        count = titles.count()
+        if not count:
+            raise BenchmarkDataMissing('ベンチマーク用の公開問題集がありません。')
+        title_id = titles[count // 2]
+
+        question_ids = list(
+            Question.objects.filter(title_id=title_id).order_by('order', 'id').values_list('pk', flat=True)[:answers_count]
+        )
+        if not question_ids:
+            raise BenchmarkDataMissing('ベンチマーク用の問題集に問題がありません。')
+        correct = defaultdict(list)
+        for question_id, choice_id in Choice.objects.filter(
+            question_id__in=question_ids, is_correct=True
+        ).values_list('question_id', 'id'):
+            correct[question_id].append(choice_id)
+        answers = [
+            {'question_id': question_id, 'selected_choice_ids': correct[question_id]}
+            for question_id in question_ids
+        ]
+        return cls(user, title_id, question_ids[0], answers, SEARCH_TERMS[0])
+
+
+class Scenario:
+    """
+    1つのリクエスト
+    build(context) は (パス, データ) を返す（GET はクエリパラメータ、POST は JSON のボディ）
+    """
+
+    def __init__(self, name, description, method, build):
+        self.name = name
+        self.description = description
+        self.method = method
+        self.build = build
+
+
+SCENARIOS = [
+    Scenario(
+        'titles-list', '問題集一覧', 'get',
+        lambda ctx: ('/api/quiz/titles/', {}),
+    ),
+    Scenario(
+        'titles-list-cursor', '問題集一覧（キーセットページネーション）', 'get',
+        lambda ctx: ('/api/quiz/titles/', {'pagination': 'cursor'}),
+    ),
+    Scenario(
+        'titles-search', '問題集の全文検索', 'get',
+        lambda ctx: ('/api/quiz/titles/', {'search': ctx.search_term}),
+    ),
+    Scenario(
+        'title-retrieve', '問題集の詳細', 'get',
+        lambda ctx: (f'/api/quiz/titles/{ctx.title_id}/', {}),
+    ),
+    Scenario(
+        'title-questions', '問題集の問題一覧', 'get',
+        lambda ctx: (f'/api/quiz/titles/{ctx.title_id}/questions/', {}),
+    ),
+    Scenario(
+        'title-questions-random', '問題集の問題一覧（ランダム出題）', 'get',
+        lambda ctx: (f'/api/quiz/titles/{ctx.title_id}/questions/', {'random': 'true', 'seed': 'bench', 'limit': 20}),
+    ),
+    Scenario(
+        'title-check', '一括採点', 'post',
+        lambda ctx: (f'/api/quiz/titles/{ctx.title_id}/check/', {'answers': ctx.answers}),
+    ),
+    Scenario(
+        'question-check', '1問の採点', 'post',
+        lambda ctx: (
+            f'/api/quiz/questions/{ctx.question_id}/check/',
+            {'selected_choice_ids': ctx.answers[0]['selected_choice_ids']},
+        ),
+    ),
+    Scenario(
+        'favorites-titles', '問題集のお気に入り一覧', 'get',
+        lambda ctx: ('/api/quiz/favorites/titles/', {}),
+    ),
+    Scenario(
+        'favorites-questions', '問題のお気に入り一覧', 'get',
+        lambda ctx: ('/api/quiz/favorites/questions/', {}),
+    ),
+]
+
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
@@ -0,0 +1,266 @@
+"""
+ベンチマーク用の合成データ
+
+問題集 × 問題 × 選択肢 × 評価 × お気に入りの形を指定して、bulk_create でまとめて作成する。
+数万件の問題集・数百万件の選択肢でもメモリ使用量が一定になるよう、問題集をチャンクに分けて書き込む。
+
+bulk_create はシグナルを発行しないため、シグナルで維持している値
+（問題数・評価数・評価合計・採番カウンタ・検索用文書）は作成時に計算して書き込み、
+最後に検索インデックスを再構築する。
+
+作成するデータはユーザー名が BENCHMARK_USERNAME_PREFIX で始まるユーザーとその所有物のみで、
+clear_benchmark_data で同じ範囲だけを削除する。
+"""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from apps.accounts.models import CustomUser
+from apps.quiz.models import (
+    Title, TitleDeletion, Question, Choice, Rating, TitleFavorite, QuestionFavorite, QuestionNote, TitleSnapshot,
+)
+from apps.quiz.ordering import ORDER_GAP
+from apps.quiz.search import build_search_document, get_search_backend
+from apps.quiz.snapshots import compile_title_snapshot
+
+BENCHMARK_USERNAME_PREFIX = 'bench-'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# 問題集名に含める語（検索のシナリオで使用）
+SEARCH_TERMS = ['Python', 'AWS', 'ネットワーク', 'データベース', 'セキュリティ', 'Linux', 'アルゴリズム', 'クラウド']
+
+# 1チャンクで作成する選択肢のおおよその件数（チャンク内の問題集数はこれから決める）
+CHUNK_ROWS = 50000
+
+# 問題のお気に入りの候補として、公開問題集ごとに保持する問題IDの数
+FAVORITE_QUESTION_SAMPLES = 5
+
+
+class SeedShape:
+    """作成するデータの形（問題集 × 問題 × 選択肢 × 評価 × お気に入り）"""
+
+    def __init__(self, titles=100, questions_per_title=20, choices_per_question=4,
+                 ratings_per_title=5, favorites_per_user=10, users=50, public_ratio=0.9):
+        if users < 1:
+            raise ValueError('ユーザー数は1以上を指定してください。')
+        if ratings_per_title >= users:
+            raise ValueError('問題集あたりの評価数はユーザー数より少なくしてください（所有者は評価しないため）。')
+        self.titles = titles
+        self.questions_per_title = questions_per_title
+        self.choices_per_question = choices_per_question
+        self.ratings_per_title = ratings_per_title
+        self.favorites_per_user = favorites_per_user
+        self.users = users
+        self.public_ratio = public_ratio
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def titles_per_chunk(self):
+        return max(1, CHUNK_ROWS // max(1, self.questions_per_title * max(1, self.choices_per_question)))
+
+
+def benchmark_users():
+    return CustomUser.objects.filter(username__startswith=BENCHMARK_USERNAME_PREFIX)
+
+
+def benchmark_data_exists():
+    return benchmark_users().exists()
+
+
+def count_benchmark_data():
+    """作成済みのベンチマーク用データの件数（ベースラインにデータの規模として記録する）"""
+    owned = Q(title__owner__username__startswith=BENCHMARK_USERNAME_PREFIX)
+    return {
+        'users': benchmark_users().count(),
+        'titles': Title.objects.filter(owner__username__startswith=BENCHMARK_USERNAME_PREFIX).count(),
+        'questions': Question.objects.filter(owned).count(),
+        'choices': Choice.objects.filter(question__title__owner__username__startswith=BENCHMARK_USERNAME_PREFIX).count(),
+        'ratings': Rating.objects.filter(owned).count(),
+        'title_favorites': TitleFavorite.objects.filter(owned).count(),
+        'question_favorites': QuestionFavorite.objects.filter(
+            question__title__owner__username__startswith=BENCHMARK_USERNAME_PREFIX
+        ).count(),
+    }
+
+
+def build_title(index, owner_id, shape, rng, stars):
+    term = SEARCH_TERMS[index % len(SEARCH_TERMS)]
+    name = f'{term} 問題集 {index + 1}'
+    description = f'{term} の理解度を確認する問題集です。'
+    return Title(
+        name=name,
+        description=description,
+        status=Title.PUBLIC if rng.random() < shape.public_ratio else Title.PRIVATE,
+        owner_id=owner_id,
+        search_document=build_search_document(name, description),
+        questions_count=shape.questions_per_title,
+        next_question_order=(shape.questions_per_title + 1) * ORDER_GAP,
+        ratings_count=len(stars),
+        ratings_sum=sum(stars),
+    )
+
+
+def build_questions(title, shape, rng):
+    return [
+        Question(
+            title=title,
+            text=f'問題{number}: {title.name} について正しいものを選びなさい。',
+            explanation=f'問題{number}の解説です。',
+            question_type=Question.MULTIPLE_CHOICE if rng.random() < 0.2 else Question.SINGLE_CHOICE,
+            order=number * ORDER_GAP,
+        )
+        for number in range(1, shape.questions_per_title + 1)
+    ]
+
+
+def build_choices(question, shape):
+    correct_count = 2 if question.question_type == Question.MULTIPLE_CHOICE else 1
+    return [
+        Choice(question=question, text=f'選択肢{order}', is_correct=order <= correct_count, order=order)
+        for order in range(1, shape.choices_per_question + 1)
+    ]
+
+
+def seed_chunk(start, end, shape, user_ids, rng, batch_size):
+    """問題集 start〜end-1 番目とその問題・選択肢・評価を作成し、公開問題集のIDと問題IDの候補を返す"""
+    titles, ratings = [], []
+    for index in range(start, end):
+        owner_id = user_ids[index % len(user_ids)]
+        # 所有者以外のユーザーが評価する
+        raters = [user_ids[(index + offset) % len(user_ids)] for offset in range(1, shape.ratings_per_title + 1)]
+        stars = [rng.randint(1, 5) for _ in raters]
+        titles.append(build_title(index, owner_id, shape, rng, stars))
+        ratings.append(list(zip(raters, stars)))
+
+    with transaction.atomic():
+        titles = Title.objects.bulk_create(titles, batch_size=batch_size)
+        questions = Question.objects.bulk_create(
+            [question for title in titles for question in build_questions(title, shape, rng)],
+            batch_size=batch_size,
+        )
+        Choice.objects.bulk_create(
+            [choice for question in questions for choice in build_choices(question, shape)],
+            batch_size=batch_size,
+        )
+        Rating.objects.bulk_create(
+            [
+                Rating(user_id=user_id, title=title, stars=stars)
+                for title, title_ratings in zip(titles, ratings)
+                for user_id, stars in title_ratings
+            ],
+            batch_size=batch_size,
+        )
+
+    public_title_ids = [title.pk for title in titles if title.status == Title.PUBLIC]
+    public = set(public_title_ids)
+    question_samples = [
+        question.pk for question in questions
+        if question.title_id in public and question.order <= FAVORITE_QUESTION_SAMPLES * ORDER_GAP
+    ]
+    return public_title_ids, question_samples
+
+
+def seed_favorites(shape, user_ids, public_title_ids, question_samples, rng, batch_size):
+    """ユーザーごとに公開問題集・問題をお気に入りに登録する"""
+    title_count = min(shape.favorites_per_user, len(public_title_ids))
+    question_count = min(shape.favorites_per_user, len(question_samples))
+    users_per_chunk = max(1, CHUNK_ROWS // max(1, shape.favorites_per_user))
+    for start in range(0, len(user_ids), users_per_chunk):
+        chunk = user_ids[start:start + users_per_chunk]
+        with transaction.atomic():
+            TitleFavorite.objects.bulk_create(
+                [
+                    TitleFavorite(user_id=user_id, title_id=title_id)
+                    for user_id in chunk
+                    for title_id in rng.sample(public_title_ids, title_count)
+                ],
+                batch_size=batch_size,
+            )
+            QuestionFavorite.objects.bulk_create(
+                [
+                    QuestionFavorite(user_id=user_id, question_id=question_id)
+                    for user_id in chunk
+                    for question_id in rng.sample(question_samples, question_count)
+                ],
+                batch_size=batch_size,
+            )
+
+
+def seed_benchmark_data(shape, seed=0, batch_size=1000, compile_snapshots=False, progress=None):
+    """
+    ベンチマーク用のデータを作成し、作成後の件数を返す
+    progress が指定された場合は、チャンクごとに作成済みの問題集数で呼び出す
+    """
+    rng = random.Random(seed)
+    # パスワードのハッシュ化は遅いため全ユーザーで共有する
+    password = make_password(BENCHMARK_PASSWORD)
+    users = CustomUser.objects.bulk_create(
+        [
+            CustomUser(
+                username=f'{BENCHMARK_USERNAME_PREFIX}user-{i}',
+                email=f'{BENCHMARK_USERNAME_PREFIX}user-{i}@example.com',
+                password=password,
+            )
+            for i in range(shape.users)
+        ],
+        batch_size=batch_size,
+    )
+    user_ids = [user.pk for user in users]
+
+    public_title_ids, question_samples = [], []
+    step = shape.titles_per_chunk()
+    for start in range(0, shape.titles, step):
+        end = min(start + step, shape.titles)
+        chunk_title_ids, chunk_question_ids = seed_chunk(start, end, shape, user_ids, rng, batch_size)
+        public_title_ids.extend(chunk_title_ids)
+        question_samples.extend(chunk_question_ids)
+        if progress is not None:
+            progress(end)
+
+    seed_favorites(shape, user_ids, public_title_ids, question_samples, rng, batch_size)
+
+    get_search_backend().rebuild(Title.objects.all())
+    if compile_snapshots:
+        for title_id in public_title_ids:
+            compile_title_snapshot(title_id)
+    return count_benchmark_data()
+
+
+def clear_benchmark_data():
+    """
+    ベンチマーク用のデータを削除し、削除した行数を返す
+
+    削除するのはベンチマーク用の問題集とその子の行のみで、1行ごとのシグナルで更新する対象も
+    削除されるため、子のテーブルから順に _raw_delete（コレクタ・シグナルなしの DELETE 1文）で削除する。
+    意図的に省略するシグナルと、その代わりの処理:
+    - 問題・選択肢・評価の post_delete: 集計・内容バージョンの更新先の問題集ごと削除する
+    - お気に入り・メモの post_delete: ユーザーの状態の更新日時を進めない（削除するのはベンチマーク用ユーザーの行と、削除する問題集への行のみ）
+    - 問題集の post_delete: 検索インデックスは最後に再構築し、一覧の条件付きGET用の削除は1件記録する
+    - カスケード: 参照する側のテーブルから順に削除するため発生しない
+    ベンチマーク用ユーザーによるそれ以外の問題集の評価は、集計を戻すため通常の delete() で削除する。
+    """
+    prefix = BENCHMARK_USERNAME_PREFIX
+    by_user = Q(user__username__startswith=prefix)
+    on_benchmark_title = Q(title__owner__username__startswith=prefix)
+    querysets = [
+        QuestionNote.objects.filter(by_user | Q(question__title__owner__username__startswith=prefix)),
+        QuestionFavorite.objects.filter(by_user | Q(question__title__owner__username__startswith=prefix)),
+        Choice.objects.filter(question__title__owner__username__startswith=prefix),
+        Question.objects.filter(title__owner__username__startswith=prefix),
+        TitleFavorite.objects.filter(by_user | on_benchmark_title),
+        Rating.objects.filter(on_benchmark_title),
+        TitleSnapshot.objects.filter(title__owner__username__startswith=prefix),
+        Title.objects.filter(owner__username__startswith=prefix),
+    ]
+    deleted = 0
+    with transaction.atomic():
+        deleted += Rating.objects.filter(by_user).exclude(on_benchmark_title).delete()[0]
+        for queryset in querysets:
+            deleted += queryset._raw_delete(queryset.db)
+        deleted += benchmark_users().delete()[0]
+        TitleDeletion.objects.create()
+
+    get_search_backend().rebuild(Title.objects.all())
+    return deleted
@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, Sum
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.accounts.models import CustomUser
+from apps.quiz.models import Title, Question, Choice, Rating
+from .runner import ScenarioRunner, compare_with_baseline, percentile
+from .scenarios import SCENARIOS, BenchmarkContext, BenchmarkDataMissing
+from .seeding import SeedShape, clear_benchmark_data, count_benchmark_data, seed_benchmark_data
+
+
+class SeedBenchmarkDataTest(TestCase):
+    """ベンチマーク用データの作成・削除のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.shape = SeedShape(
+            titles=12, questions_per_title=3, choices_per_question=4,
+            ratings_per_title=2, favorites_per_user=2, users=4, public_ratio=0.75,
+        )
+
+    def test_seed_creates_shape_with_consistent_counters(self):
+        """指定した形のデータを作成し、シグナルで維持する集計値も実データと一致する"""
+        counts = seed_benchmark_data(self.shape, seed=1, batch_size=5)
+        self.assertEqual(counts['users'], 4)
+        self.assertEqual(counts['titles'], 12)
+        self.assertEqual(counts['questions'], 36)
+        self.assertEqual(counts['choices'], 144)
+        self.assertEqual(counts['ratings'], 24)
+        self.assertEqual(counts['title_favorites'], 8)
+        self.assertEqual(counts['question_favorites'], 8)
+
+        titles = Title.objects.annotate(actual_questions=Count('questions', distinct=True))
+        for title in titles:
+            ratings = Rating.objects.filter(title=title).aggregate(count=Count('id'), total=Sum('stars'))
+            self.assertEqual(title.questions_count, title.actual_questions)
+            self.assertEqual(title.next_question_order, 4 * 1024)
+            self.assertEqual(title.ratings_count, ratings['count'])
+            self.assertEqual(title.ratings_sum, ratings['total'])
+            self.assertFalse(Rating.objects.filter(title=title, user=title.owner_id).exists())
+        self.assertFalse(Question.objects.filter(choices__isnull=True).exists())
+
+        term = Title.objects.filter(status=Title.PUBLIC).first().name.split()[0]
+        response = APIClient().get('/api/quiz/titles/', {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['results'])
+
+    def test_clear_removes_only_benchmark_data(self):
+        """削除はベンチマーク用のユーザーとその所有物のみ"""
+        other = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        title = Title.objects.create(name='通常の問題集', owner=other, status=Title.PUBLIC)
+        Question.objects.create(title=title, text='問題', order=1)
+        seed_benchmark_data(self.shape)
+
+        clear_benchmark_data()
+        self.assertEqual(set(count_benchmark_data().values()), {0})
+        self.assertEqual(list(Title.objects.values_list('pk', flat=True)), [title.pk])
+        self.assertEqual(Question.objects.count(), 1)
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_clear_restores_counters_of_other_titles(self):
+        """ベンチマーク用ユーザーによる通常の問題集の評価は、集計を戻して削除する"""
+        other = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        title = Title.objects.create(name='通常の問題集', owner=other, status=Title.PUBLIC)
+        seed_benchmark_data(self.shape)
+        bench_user = CustomUser.objects.exclude(pk=other.pk).first()
+        Rating.objects.create(user=bench_user, title=title, stars=4)
+
+        clear_benchmark_data()
+        title.refresh_from_db()
+        self.assertEqual((title.ratings_count, title.ratings_sum), (0, 0))
+
+    def test_command_refuses_to_seed_twice(self):
+        """作成済みの場合は --clear なしではエラー"""
+        call_command('seed_benchmark_data', titles=2, users=3, ratings_per_title=1, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', titles=2, users=3, ratings_per_title=1, stdout=StringIO())
+        call_command('seed_benchmark_data', titles=3, users=3, ratings_per_title=1, clear=True, stdout=StringIO())
+        self.assertEqual(count_benchmark_data()['titles'], 3)
+
+
+class RunBenchmarksTest(TestCase):
+    """シナリオの計測とベースラインの比較のテスト"""
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self):
+        seed_benchmark_data(SeedShape(
+            titles=6, questions_per_title=4, choices_per_question=3,
+            ratings_per_title=1, favorites_per_user=2, users=3, public_ratio=1.0,
+        ))
+
+    def test_missing_data(self):
+        with self.assertRaises(BenchmarkDataMissing):
+            BenchmarkContext.load()
+
+    def test_all_scenarios_run(self):
+        """全シナリオが成功し、p50 / p95・クエリ数・ピークメモリを返す"""
+        self.seed()
+        context = BenchmarkContext.load()
+        self.assertNotEqual(Title.objects.get(pk=context.title_id).owner_id, context.user.pk)
+        correct = set(Choice.objects.filter(question_id=context.question_id, is_correct=True).values_list('id', flat=True))
+        self.assertEqual(set(context.answers[0]['selected_choice_ids']), correct)
+
+        runner = ScenarioRunner(context, iterations=2, warmup=0)
+        for scenario in SCENARIOS:
+            with self.subTest(scenario=scenario.name):
+                result = runner.run(scenario)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertGreaterEqual(result['queries'], 0)
+                self.assertGreater(result['peak_memory_kb'], 0)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([5.0], 95), 5.0)
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50), 3.0)
+        self.assertAlmostEqual(percentile([1.0, 2.0, 3.0, 4.0, 5.0], 95), 4.8)
+
+    def test_compare_with_baseline(self):
+        """許容幅を超えた悪化とクエリ数の増加を検出する"""
+        baseline = {'scenarios': {'titles-list': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 2, 'peak_memory_kb': 100.0}}}
+        within = {'titles-list': {'p50_ms': 11.0, 'p95_ms': 23.0, 'queries': 2, 'peak_memory_kb': 110.0}}
+        self.assertEqual(compare_with_baseline(within, baseline, tolerance=0.2), [])
+
+        worse = {
+            'titles-list': {'p50_ms': 10.5, 'p95_ms': 30.0, 'queries': 3, 'peak_memory_kb': 200.0},
+            'new-scenario': {'p50_ms': 1.0, 'p95_ms': 1.0, 'queries': 1, 'peak_memory_kb': 1.0},
+        }
+        self.assertEqual(
+            [metric for _, metric, _, _ in compare_with_baseline(worse, baseline, tolerance=0.2)],
+            ['p95_ms', 'queries', 'peak_memory_kb'],
+        )
+        # 小さな値の揺らぎは min_delta_ms 未満なら無視する
+        fast = {'p50_ms': 0.5, 'p95_ms': 0.5, 'queries': 0, 'peak_memory_kb': 1.0}
+        self.assertEqual(compare_with_baseline(
+            {'question-check': {**fast, 'p95_ms': 0.9}}, {'scenarios': {'question-check': fast}}, min_delta_ms=1.0
+        ), [])
+
+    def test_command_saves_and_compares_baseline(self):
+        """ベースラインを保存し、クエリ数が増えた場合は失敗する"""
+        self.seed()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            options = {'scenarios': ['titles-list', 'title-check'], 'iterations': 2, 'warmup': 0}
+            call_command('run_benchmarks', save_baseline=path, stdout=StringIO(), stderr=StringIO(), **options)
+            with open(path, encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.assertEqual(set(baseline['scenarios']), {'titles-list', 'title-check'})
+            self.assertEqual(baseline['data']['titles'], 6)
+
+            baseline['scenarios']['titles-list']['queries'] -= 1
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(baseline, f)
+            out = StringIO()
+            with self.assertRaises(CommandError):
+                call_command('run_benchmarks', compare=path, tolerance=100, stdout=out, stderr=StringIO(), **options)
+            self.assertIn('titles-list: queries', out.getvalue())
@@ -0,0 +1,145 @@
+"""
+?fields= / ?omit= / ?expand= による出力フィールドの選択（スパースフィールドセット）
+
+- fields: 出力するフィールド（カンマ区切り、`owner.username` のようにドットでネスト先を指定）
+- omit: 出力しないフィールド（ネスト先の指定も可）
+- expand: シリアライザの Meta.expandable_fields に定義したフィールドをネストしたオブジェクトで出力
+
+出力しないフィールドは apps.quiz.optimizers が SQL からも除外する
+（モデルのカラムは defer()、ネストした関連は select_related / prefetch_related の対象外）。
+"""
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+QUERY_PARAMS = ('fields', 'omit', 'expand')
+
+_UNSET = object()
+
+
+def parse_field_paths(value):
+    """'id,owner.username,owner.id' → {'id': {}, 'owner': {'username': {}, 'id': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+class FieldSpec:
+    """リクエストで指定された出力フィールドの指定（ネスト先ごとに child() で辿る）"""
+
+    def __init__(self, fields=None, omit=None, expand=None):
+        self.fields = fields  # None は制限なし
+        self.omit = omit or {}
+        self.expand = expand or {}
+
+    @classmethod
+    def from_request(cls, request):
+        """参照系のリクエストのクエリ文字列から作成（指定がなければ None）"""
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        values = {name: request.query_params.get(name, '') for name in QUERY_PARAMS}
+        if not any(values.values()):
+            return None
+        return cls(
+            parse_field_paths(values['fields']) if values['fields'] else None,
+            parse_field_paths(values['omit']),
+            parse_field_paths(values['expand']),
+        )
+
+    def includes(self, name):
+        if self.fields is not None and name not in self.fields:
+            return False
+        # omit=owner はフィールドごと除外、omit=owner.email はネスト先のみ除外
+        return not (name in self.omit and not self.omit[name])
+
+    def expands(self, name):
+        return name in self.expand
+
+    def child(self, name):
+        """ネスト先のフィールドに対する指定（制限がなければ None）"""
+        fields = self.fields.get(name) if self.fields is not None else None
+        omit = self.omit.get(name)
+        expand = self.expand.get(name)
+        if not (fields or omit or expand):
+            return None
+        return FieldSpec(fields or None, omit, expand)
+
+    def apply(self, data):
+        """シリアライズ済みのデータに適用（共有キャッシュから返すレスポンス用。展開は行わない）"""
+        if isinstance(data, list):
+            return [self.apply(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for name, value in data.items():
+            if self.includes(name):
+                child = self.child(name)
+                result[name] = child.apply(value) if child is not None else value
+        return result
+
+
+class DynamicFieldsMixin:
+    """
+    FieldSpec に従って出力フィールドを絞り込むシリアライザ用Mixin
+    最上位のシリアライザは context['field_spec'] を、ネストしたシリアライザは親から渡された指定を使用する
+    """
+    _field_spec = _UNSET
+
+    def get_field_spec(self):
+        if self._field_spec is not _UNSET:
+            return self._field_spec
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return self.context.get('field_spec') if parent is None else None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # 除外したフィールド名 → ソース（SQL から除外するカラムの判定に使用）
+        self.omitted_fields = {}
+        spec = self.get_field_spec()
+        if spec is None:
+            return fields
+
+        for name, (serializer_class, kwargs) in getattr(self.Meta, 'expandable_fields', {}).items():
+            if spec.expands(name):
+                if isinstance(serializer_class, str):
+                    serializer_class = import_string(serializer_class)
+                fields[name] = serializer_class(**kwargs)
+
+        for name in list(fields):
+            field = fields[name]
+            if not spec.includes(name):
+                self.omitted_fields[name] = field.source or name
+                del fields[name]
+                continue
+            target = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(target, DynamicFieldsMixin):
+                target._field_spec = spec.child(name)
+        return fields
+
+
+class DynamicFieldsViewMixin:
+    """リクエストの FieldSpec をシリアライザの context に渡すView・ViewSet用Mixin"""
+
+    def get_field_spec(self):
+        if not hasattr(self, '_field_spec'):
+            self._field_spec = FieldSpec.from_request(getattr(self, 'request', None))
+        return self._field_spec
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        spec = self.get_field_spec()
+        if spec is not None:
+            context['field_spec'] = spec
+        return context
+
+    def get_output_field_names(self):
+        """出力する最上位のフィールド名（指定がなければ None）"""
+        if self.get_field_spec() is None:
+            return None
+        return set(self.get_serializer().fields)
@@ -0,0 +1,54 @@
+"""
+API のパーサー
+
+FastJSONParser: orjson による高速な JSON 解析
+JSONParser と同じ値を返す（orjson 未インストール時・UTF-8 以外は標準の json で解析）。
+- 20桁以上の整数は orjson では精度が失われるため、含まれる場合は json で解析する
+- orjson で解析できない入力も json で解析し直し、エラーの内容を JSONParser と揃える
+
+MessagePackParser: MessagePack（Content-Type: application/msgpack）のリクエストボディの解析
+"""
+import io
+
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# 数字を 0、それ以外を空白に置き換える変換表（正規表現より高速に20桁以上の数字の並びを探せる）
+DIGIT_TABLE = bytes(ord('0') if chr(c) in '0123456789' else ord(' ') for c in range(256))
+LONG_INTEGER = b'0' * 20
+
+
+class FastJSONParser(JSONParser):
+    """orjson で解析する JSONParser（解析できない場合は標準の json にフォールバック）"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if LONG_INTEGER not in body.translate(DIGIT_TABLE):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class MessagePackParser(BaseParser):
+    """MessagePack のパーサー（マップのキーは文字列のみ受け付ける）"""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except ValueError as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,112 @@
+"""
+ビューのアクションごとのクエリ数の上限（クエリ予算）
+
+ViewSet / APIView のクラス属性 query_budgets にアクションごとの上限を宣言する。
+
+    class TitleViewSet(viewsets.ModelViewSet):
+        query_budgets = {'list': 4, 'retrieve': 5, ...}
+
+ViewSet 以外の APIView では HTTP メソッド名（'get' / 'post' など）をアクション名とする。
+既知の不具合などで計測できないアクションは、理由とともに query_budget_exemptions に宣言する。
+
+    query_budget_exemptions = {'create': '一覧への POST は対象を指定できず常に失敗する'}
+上限は認証（force_authenticate で除外）を除き、キャッシュが空の状態で1リクエストが発行するクエリ数
+（トランザクションのセーブポイントを含む）。コミット後に実行する処理（on_commit）は含まない。
+
+QueryBudgetTestMixin.assertQueryBudget はデータ量を変えて同じエンドポイントを実行し、
+上限を超えないこと・データ量に応じてクエリ数が増えないこと（N+1 がないこと）を検証する。
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.viewsets import ViewSetMixin
+
+# ViewSet の標準アクションと HTTP メソッド
+VIEWSET_ACTIONS = {
+    'list': 'get', 'create': 'post', 'retrieve': 'get',
+    'update': 'put', 'partial_update': 'patch', 'destroy': 'delete',
+}
+
+
+def get_query_budget(view_class, action):
+    """宣言されたクエリ数の上限（未宣言は None）"""
+    return getattr(view_class, 'query_budgets', {}).get(action)
+
+
+def get_view_actions(view_class):
+    """ビューが受け付けるアクション（ViewSet はアクション名、APIView は HTTP メソッド名）"""
+    if issubclass(view_class, ViewSetMixin):
+        actions = [
+            name for name, method in VIEWSET_ACTIONS.items()
+            if hasattr(view_class, name) and method in view_class.http_method_names
+        ]
+        return actions + [extra.__name__ for extra in view_class.get_extra_actions()]
+    return [
+        method for method in view_class.http_method_names
+        if method not in ('head', 'options') and hasattr(view_class, method)
+    ]
+
+
+def get_query_budget_exemption(view_class, action):
+    """計測の対象外とする理由（対象外でなければ None）"""
+    return getattr(view_class, 'query_budget_exemptions', {}).get(action)
+
+
+def get_undeclared_actions(view_class):
+    """クエリ数の上限も対象外の理由も宣言されていないアクション"""
+    return [
+        action for action in get_view_actions(view_class)
+        if get_query_budget(view_class, action) is None and get_query_budget_exemption(view_class, action) is None
+    ]
+
+
+class QueryBudgetTestMixin:
+    """宣言されたクエリ数の上限をテストで検証する（TestCase と組み合わせて使う）"""
+
+    query_budget_sizes = (2, 10)
+
+    def reset_query_budget_state(self):
+        """計測前の状態に戻す（キャッシュがない状態のクエリ数を計測する）"""
+        cache.clear()
+
+    def assertQueryBudget(self, view_class, action, prepare, sizes=None):
+        """
+        sizes のデータ量ごとに prepare(size) でデータを用意し、返されたリクエスト関数のクエリ数を計測する
+
+        prepare は引数なしで呼び出すとレスポンスを返す関数を返す。
+        ストリーミングレスポンスは本文を読み切るまでを計測する。
+        """
+        name = f'{view_class.__name__}.{action}'
+        exemption = get_query_budget_exemption(view_class, action)
+        if exemption is not None:
+            self.skipTest(f'{name} はクエリ数の計測の対象外です: {exemption}')
+        budget = get_query_budget(view_class, action)
+        if budget is None:
+            self.fail(f'{name} のクエリ数の上限（query_budgets）が宣言されていません。')
+
+        sizes = sizes or self.query_budget_sizes
+        counts = []
+        for size in sizes:
+            send = prepare(size)
+            self.reset_query_budget_state()
+            with CaptureQueriesContext(connection) as queries:
+                response = send()
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            self.assertLess(
+                response.status_code, 400,
+                f'{name}（N={size}）が {response.status_code} を返しました: {getattr(response, "data", "")}'
+            )
+            statements = '\n'.join(query['sql'] for query in queries.captured_queries)
+            self.assertLessEqual(
+                len(queries), budget,
+                f'{name}（N={size}）のクエリ数 {len(queries)} が上限 {budget} を超えています。\n{statements}'
+            )
+            counts.append(len(queries))
+
+        self.assertLessEqual(
+            max(counts), counts[0],
+            f'{name} のクエリ数がデータ量に応じて増えています: '
+            + ', '.join(f'N={size}: {count}' for size, count in zip(sizes, counts))
+        )
+        return counts
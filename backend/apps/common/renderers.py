@@ -0,0 +1,79 @@
+"""
+API のレンダラー
+
+FastJSONRenderer: orjson による高速な JSON 描画
+JSONRenderer と同一のバイト列を返す（orjson 未インストール時・インデント指定時などは標準の json で描画）。
+- 日時は DRF の JSONEncoder で変換（orjson の形式にしない）
+- 指数表記の数値（1e+16 / 1e-05）は json と orjson で表記が異なるため、出力に含まれる場合は json で描画し直す
+- NaN / Infinity は json（STRICT_JSON）ではエラーだが orjson は null を出力する
+
+MessagePackRenderer: MessagePack（Accept: application/msgpack）での描画
+JSON と同じ構造をバイナリで返す。日時・Decimal などは JSON と同じ文字列・数値に変換する。
+"""
+import msgpack
+from rest_framework.utils import encoders
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# 数字・符号を 0、e を e、それ以外を空白に置き換える変換表（指数表記は b'0e0' として現れる）
+# 正規表現より高速に走査できる。文字列中の "1e5" なども一致するが、json で描画し直すだけなので問題ない
+EXPONENT_TABLE = bytes(
+    ord('0') if chr(c) in '0123456789+-' else ord('e') if chr(c) in 'eE' else ord(' ')
+    for c in range(256)
+)
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """orjson で描画する JSONRenderer（描画できない場合は標準の json にフォールバック）"""
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and not self.ensure_ascii
+            and self.compact
+            and self.strict
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if data is None or not self.can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            # 64bitを超える整数など orjson で扱えない値
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'0e0' in ret.translate(EXPONENT_TABLE):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # JSONRenderer と同様に JavaScript で不正な文字をエスケープ
+        for raw, escaped in LINE_SEPARATORS:
+            ret = ret.replace(raw, escaped)
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack のレンダラー（通信量を抑えたいモバイルクライアント向け）"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder_class = encoders.JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # 日時は MessagePack の Timestamp 型にせず、JSON と同じ ISO 8601 文字列で返す
+        return msgpack.packb(data, default=self.encoder_class().default, datetime=False)
@@ -12,13 +12,14 @@ class ChoiceInline(admin.TabularInline):
 @admin.register(Title)
 class TitleAdmin(admin.ModelAdmin):
     """タイトルの管理画面"""
-    list_display = ['name', 'owner', 'status', 'created_at', 'updated_at']
+    list_display = ['name', 'owner', 'status', 'questions_count', 'ratings_count', 'created_at', 'updated_at']
     list_filter = ['status', 'created_at']
     search_fields = ['name', 'description', 'owner__username']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['questions_count', 'ratings_count', 'ratings_sum', 'created_at', 'updated_at']
     fieldsets = [
         ('基本情報', {'fields': ['name', 'description', 'owner']}),
         ('設定', {'fields': ['status']}),
+        ('集計', {'fields': ['questions_count', 'ratings_count', 'ratings_sum']}),
         ('メタ情報', {'fields': ['created_at', 'updated_at']}),
     ]
 
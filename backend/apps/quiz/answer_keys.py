@@ -0,0 +1,184 @@
+"""
+採点用の解答キャッシュ
+
+採点（check）は問題・選択肢・問題集の公開状態を参照するだけの読み取り専用処理なので、
+問題ごとの解答（有効な選択肢ID・正解の選択肢ID・問題種別・解説）をキャッシュに保持する。
+キャッシュが温まっていれば採点時のDBクエリは問題集のアクセス情報の1件になる。
+
+解答には読み込んだ時点の問題集の内容バージョン（Title.content_version）を持たせ、
+採点のたびにDBから読むアクセス情報（公開状態・所有者・内容バージョン）と照合する。
+問題・選択肢の変更で内容バージョンが進むため、キャッシュがプロセスごと（LocMem）で
+他のワーカーが更新した場合でも、古い解答や公開状態で採点することはない。
+apps.quiz.signals による破棄は、同じプロセスでの再読み込みを早めるためのもの。
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_cache_timeout():
+    return getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_TIMEOUT', 60 * 60)
+
+
+def answer_key_cache_key(question_id):
+    return f'quiz:answer-key:{question_id}'
+
+
+def title_owner_cache_key(title_id):
+    return f'quiz:title-owner:{title_id}'
+
+
+class AnswerKey:
+    """問題1問分の解答"""
+
+    def __init__(self, question_id, title_id, content_version, question_type, explanation, choice_ids,
+                 correct_choice_ids):
+        self.question_id = question_id
+        self.title_id = title_id
+        self.content_version = content_version
+        self.question_type = question_type
+        self.explanation = explanation
+        self.choice_ids = frozenset(choice_ids)
+        self.correct_choice_ids = frozenset(correct_choice_ids)
+
+    def is_correct(self, selected_choice_ids):
+        """選択した選択肢が全て正解 かつ 正解が全て選択されている"""
+        return set(selected_choice_ids) == self.correct_choice_ids
+
+
+class TitleAccess:
+    """問題集の公開状態・所有者・内容バージョン"""
+
+    def __init__(self, title_id, status, owner_id, content_version):
+        self.title_id = title_id
+        self.status = status
+        self.owner_id = owner_id
+        self.content_version = content_version
+
+    def can_access(self, user):
+        from .models import Title
+
+        if self.status == Title.PUBLIC:
+            return True
+        return user.is_authenticated and self.owner_id == user.id
+
+
+def load_answer_keys(question_ids):
+    """
+    問題と選択肢をそれぞれ1クエリで読み込んで解答を組み立てる
+    内容バージョンを選択肢より先に読むため、間に選択肢が変わっても古いバージョンの解答として扱われる
+    """
+    from .models import Question, Choice
+
+    questions = list(Question.objects.filter(pk__in=question_ids).values_list(
+        'id', 'title_id', 'title__content_version', 'question_type', 'explanation'
+    ))
+    choices = {}
+    for choice_id, question_id, is_correct in Choice.objects.filter(
+        question_id__in=question_ids
+    ).values_list('id', 'question_id', 'is_correct'):
+        choices.setdefault(question_id, []).append((choice_id, is_correct))
+
+    answer_keys = {}
+    for question_id, title_id, content_version, question_type, explanation in questions:
+        question_choices = choices.get(question_id, [])
+        answer_keys[question_id] = AnswerKey(
+            question_id=question_id,
+            title_id=title_id,
+            content_version=content_version,
+            question_type=question_type,
+            explanation=explanation or '',
+            choice_ids=[choice_id for choice_id, _ in question_choices],
+            correct_choice_ids=[choice_id for choice_id, is_correct in question_choices if is_correct],
+        )
+    return answer_keys
+
+
+def get_answer_keys(question_ids, content_version=None):
+    """
+    複数問題の解答をキャッシュから取得し、不足分のみDBから読み込む
+    content_version を指定した場合、異なる内容バージョンで読み込んだ解答は読み込み直す
+    """
+    question_ids = list(dict.fromkeys(question_ids))
+    cached = cache.get_many([answer_key_cache_key(pk) for pk in question_ids])
+    answer_keys = {}
+    missing = []
+    for pk in question_ids:
+        answer_key = cached.get(answer_key_cache_key(pk))
+        if answer_key is None or (content_version is not None and answer_key.content_version != content_version):
+            missing.append(pk)
+        else:
+            answer_keys[pk] = answer_key
+
+    if missing:
+        loaded = load_answer_keys(missing)
+        cache.set_many(
+            {answer_key_cache_key(pk): answer_key for pk, answer_key in loaded.items()},
+            get_cache_timeout(),
+        )
+        answer_keys.update(loaded)
+    return answer_keys
+
+
+def get_answer_key(question_id):
+    """問題の解答を取得（存在しない場合はNone）"""
+    return get_answer_keys([question_id]).get(question_id)
+
+
+def get_title_access(title_id):
+    """
+    問題集のアクセス情報をDBから取得（存在しない場合はNone）
+    公開状態の変更を全ワーカーで即時に反映するため、キャッシュしない（主キーによる1クエリ）
+    """
+    from .models import Title
+
+    row = Title.objects.filter(pk=title_id).values_list('status', 'owner_id', 'content_version').first()
+    if row is None:
+        return None
+    return TitleAccess(title_id, *row)
+
+
+def get_title_owner_id(title_id):
+    """
+    問題集の所有者IDをキャッシュ経由で取得（存在しない場合はNone）
+    所有者はAPIから変更されないため、プロセスごとのキャッシュでも古い値を返さない
+    """
+    from .models import Title
+
+    key = title_owner_cache_key(title_id)
+    owner_id = cache.get(key)
+    if owner_id is None:
+        owner_id = Title.objects.filter(pk=title_id).values_list('owner_id', flat=True).first()
+        if owner_id is None:
+            return None
+        cache.set(key, owner_id, get_cache_timeout())
+    return owner_id
+
+
+def get_checked_answer_key(question_id):
+    """
+    問題の解答と問題集のアクセス情報を取得（問題が存在しない場合は (None, None)）
+    キャッシュした解答の内容バージョンが問題集と異なれば、DBから読み込み直す
+    """
+    answer_key = get_answer_key(question_id)
+    if answer_key is None:
+        return None, None
+    title_access = get_title_access(answer_key.title_id)
+    if title_access is not None and answer_key.content_version == title_access.content_version:
+        return answer_key, title_access
+
+    # 他のワーカーでの変更などでキャッシュした解答が古い
+    invalidate_answer_key(question_id)
+    answer_key = get_answer_key(question_id)
+    if answer_key is None:
+        return None, None
+    if title_access is None or answer_key.title_id != title_access.title_id:
+        title_access = get_title_access(answer_key.title_id)
+    return answer_key, title_access
+
+
+def invalidate_answer_key(question_id):
+    cache.delete(answer_key_cache_key(question_id))
+
+
+def invalidate_title_owner(title_id):
+    cache.delete(title_owner_cache_key(title_id))
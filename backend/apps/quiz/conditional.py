@@ -0,0 +1,72 @@
+"""
+条件付きGET（ETag / Last-Modified）
+
+問題集の内容バージョン（Title.content_version）などの軽量なクエリで得た値から ETag を組み立て、
+If-None-Match / If-Modified-Since が一致すればシリアライズの前に 304 を返す。
+ETag にはユーザー・レスポンス形式・クエリ文字列を含めるため、
+内容の異なるレスポンス同士で ETag が一致することはない。
+
+問題集一覧は、問題集の最大ID（作成）・最新の内容更新日時（更新）・削除の記録の最大ID（削除）を
+1回のクエリ（索引で求める最大値のみ、件数の集計なし）で読んだ一覧バージョン（get_titles_list_version）から
+ETag を作成する。DBから求めるため、キャッシュがプロセスごと（LocMem）で
+他のワーカーが更新した場合でも、変更後の一覧に 304 を返すことはない。
+"""
+import hashlib
+
+from django.db import connection
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def build_etag(*parts):
+    """ETag の材料から弱いETagを作成"""
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def get_titles_list_version():
+    """問題集一覧のバージョン（問題集の最大ID・最新の内容更新日時・削除の記録の最大ID）"""
+    from .models import Title, TitleDeletion
+
+    quote = connection.ops.quote_name
+    title_table = quote(Title._meta.db_table)
+    deletion_table = quote(TitleDeletion._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT (SELECT MAX({quote("id")}) FROM {title_table}), '
+            f'(SELECT MAX({quote("content_updated_at")}) FROM {title_table}), '
+            f'(SELECT MAX({quote("id")}) FROM {deletion_table})'
+        )
+        return ':'.join(str(value) for value in cursor.fetchone())
+
+
+class ConditionalGetMixin:
+    """ViewSet に条件付きGETを追加するMixin"""
+    conditional_vary_headers = ['Authorization', 'Accept']
+
+    def get_etag_variant(self, request):
+        """同じ内容でもレスポンスが変わる要素（ユーザー・形式・クエリ文字列）"""
+        user_id = request.user.pk if request.user.is_authenticated else 0
+        renderer = getattr(request, 'accepted_renderer', None)
+        return [user_id, renderer.format if renderer else '', request.META.get('QUERY_STRING', '')]
+
+    def check_conditional(self, request, *parts, last_modified=None):
+        """
+        レスポンスの検証子を設定し、リクエストの条件に一致すれば 304（または 412）を返す
+        一致しない場合は None を返すので、通常どおりレスポンスを作成する
+        """
+        etag = build_etag(*parts, *self.get_etag_variant(request))
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        self.conditional_validators = (etag, timestamp)
+        return get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """検証子（ETag / Last-Modified）をレスポンスヘッダに設定"""
+        validators = getattr(self, 'conditional_validators', None)
+        if validators is not None and response.status_code in (200, 304):
+            etag, timestamp = validators
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, self.conditional_vary_headers)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,84 @@
+"""
+問題集のエクスポート
+
+問題をチャンク単位の .iterator()（選択肢はチャンクごとに prefetch）で読み出し、
+1問ずつシリアライズして書き出す。問題集の大きさに関わらずメモリ使用量は一定。
+出力は apps.quiz.importers でそのまま再インポートできる形式:
+
+- NDJSON: 1行目に問題集の情報（"type": "title"）、以降1行1問
+- JSON: {"title": {...}, "questions": [...]}
+- MessagePack: NDJSON と同じレコードを MessagePack のオブジェクトとして連続で出力
+"""
+import json
+
+import msgpack
+
+from django.db.models import Prefetch
+from .models import Choice
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_title_data(title):
+    return {
+        'type': 'title',
+        'id': title.id,
+        'name': title.name,
+        'description': title.description,
+        'status': title.status,
+        'questions_count': title.questions_count,
+    }
+
+
+def export_question_data(question):
+    """問題1問分（インポート時のレコード形式と同じ）"""
+    return {
+        'text': question.text,
+        'explanation': question.explanation,
+        'question_type': question.question_type,
+        'order': question.order,
+        'choices': [
+            {'text': choice.text, 'is_correct': choice.is_correct, 'order': choice.order}
+            for choice in question.choices.all()
+        ],
+    }
+
+
+def iter_export_questions(title, chunk_size=EXPORT_CHUNK_SIZE):
+    """問題を表示順に逐次読み出す（選択肢はチャンクごとに1クエリでまとめて取得）"""
+    questions = title.questions.order_by('order', 'id').prefetch_related(
+        Prefetch('choices', queryset=Choice.objects.order_by('order', 'id'))
+    )
+    return questions.iterator(chunk_size=chunk_size)
+
+
+def iter_ndjson_export(title, chunk_size=EXPORT_CHUNK_SIZE):
+    yield dumps(export_title_data(title)) + '\n'
+    for question in iter_export_questions(title, chunk_size):
+        yield dumps(export_question_data(question)) + '\n'
+
+
+def iter_json_export(title, chunk_size=EXPORT_CHUNK_SIZE):
+    yield '{"title":' + dumps(export_title_data(title)) + ',"questions":['
+    separator = ''
+    for question in iter_export_questions(title, chunk_size):
+        yield separator + dumps(export_question_data(question))
+        separator = ','
+    yield ']}\n'
+
+
+def iter_msgpack_export(title, chunk_size=EXPORT_CHUNK_SIZE):
+    yield msgpack.packb(export_title_data(title))
+    for question in iter_export_questions(title, chunk_size):
+        yield msgpack.packb(export_question_data(question))
+
+
+EXPORTERS = {
+    'ndjson': iter_ndjson_export,
+    'json': iter_json_export,
+    'msgpack': iter_msgpack_export,
+}
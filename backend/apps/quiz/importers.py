@@ -0,0 +1,395 @@
+"""
+問題の一括インポート
+
+アップロードされたファイル（CSV / JSON / NDJSON / MessagePack）をチャンク単位で逐次パースし、
+1件ずつ QuestionCreateSerializer と同じ規則で検証した上で、
+Question と Choice をチャンクごとの bulk_create でまとめて書き込む。
+
+JSON / NDJSON / MessagePack のレコード形式は POST /api/quiz/questions/ のリクエストと同じ:
+    {"text": "...", "explanation": "...", "question_type": "single", "order": 0,
+     "choices": [{"text": "...", "is_correct": true, "order": 1}, ...]}
+apps.quiz.exporters の出力（NDJSON の "type": "title" 行を含む）もそのまま読み込める。
+
+CSV の列:
+    text, explanation, question_type, order, choice1 〜 choice5,
+    correct（正解の選択肢番号。複数の場合は "1|3" のように区切る）
+"""
+import codecs
+import csv
+import json
+import re
+
+import msgpack
+from django.db import transaction
+from rest_framework import serializers
+from .models import Title, Question, Choice
+from .ordering import ORDER_GAP
+from .sampling import invalidate_title_question_ids
+from .serializers import QuestionCreateSerializer
+from .signals import adjust_title_counters
+
+MAX_REPORTED_ERRORS = 100
+CSV_CHOICE_COLUMNS = [f'choice{i}' for i in range(1, 6)]
+CSV_CORRECT_SEPARATOR_RE = re.compile(r'[|;,\s]+')
+
+
+class ImportParseError(Exception):
+    """ファイル全体として読み込めない場合のエラー"""
+
+
+class ImportAborted(Exception):
+    """検証エラーがあったためインポート全体を取り消す"""
+
+
+class ImportRecordError:
+    """パースできなかったレコード"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def decode_error(line_number):
+    return ImportParseError(
+        f'{line_number}行目を UTF-8 の文字列として読み込めません。ファイルを UTF-8 で保存してください。'
+    )
+
+
+def iter_text_lines(chunks, encoding='utf-8-sig'):
+    """バイト列のチャンクを逐次デコードし、改行付きの行として返す"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ''
+    line_number = 1
+    try:
+        for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                line_number += 1
+                yield line + '\n'
+        buffer += decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        # デコードできなかったバイトを含む行（バッファ内の改行の分だけ先の行）
+        raise decode_error(line_number + buffer.count('\n'))
+    if buffer:
+        yield buffer
+
+
+def iter_text_chunks(chunks, encoding='utf-8-sig'):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    line_number = 1
+    try:
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                line_number += text.count('\n')
+                yield text
+        text = decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise decode_error(line_number)
+    if text:
+        yield text
+
+
+def iter_ndjson_records(chunks):
+    """NDJSON（1行1レコード）を逐次パース"""
+    for line_number, line in enumerate(iter_text_lines(chunks), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, ImportRecordError('JSONとして解析できません。')
+            continue
+        # エクスポートしたファイルの先頭行（問題集の情報）は読み飛ばす
+        if isinstance(record, dict) and record.get('type') == 'title':
+            continue
+        yield line_number, record
+
+
+class JSONStream:
+    """
+    JSONテキストをチャンク単位で読み進めるための簡易ストリーム
+    トップレベルの配列（またはオブジェクトの "questions" 配列）の要素を1件ずつ取り出す
+    """
+
+    def __init__(self, text_chunks):
+        self.chunks = iter(text_chunks)
+        self.buffer = ''
+        self.position = 0
+        self.exhausted = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        if self.exhausted:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.exhausted = True
+            return False
+        # 読み終えた部分を捨ててバッファを一定サイズに保つ
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """空白を読み飛ばして次の1文字を返す（終端ならNone）"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        char = self.peek()
+        if char is None or char not in chars:
+            raise ImportParseError('JSONの形式が正しくありません。')
+        self.position += 1
+        return char
+
+    def read_value(self):
+        """次のJSON値を1つ読み込む（チャンク境界をまたぐ場合は追加で読み込む）"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                value, end = None, None
+            # 数値などが途中で切れている可能性があるため、終端以外は後続文字がある場合のみ確定
+            if end is not None and (end < len(self.buffer) or self.exhausted):
+                self.position = end
+                return value
+            if not self.fill():
+                if end is not None:
+                    self.position = end
+                    return value
+                raise ImportParseError('JSONの形式が正しくありません。')
+
+    def expect_end(self):
+        """トップレベルの値の後ろに空白以外が続いていないことを確認する"""
+        if self.peek() is not None:
+            raise ImportParseError('JSONの末尾に余分なデータがあります。')
+
+    def iter_array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.expect(',]') == ']':
+                return
+
+    def iter_records(self):
+        first = self.peek()
+        if first == '[':
+            yield from self.iter_array()
+            self.expect_end()
+            return
+        if first != '{':
+            raise ImportParseError('JSONは配列、または "questions" を含むオブジェクトである必要があります。')
+
+        # {"title": {...}, "questions": [...]} 形式（エクスポート形式）
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            self.expect_end()
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            if key == 'questions' and self.peek() == '[':
+                yield from self.iter_array()
+            else:
+                self.read_value()
+            if self.expect(',}') == '}':
+                self.expect_end()
+                return
+
+
+def iter_json_records(chunks):
+    """JSONを逐次パース（全体をメモリに載せない）"""
+    stream = JSONStream(iter_text_chunks(chunks))
+    for index, record in enumerate(stream.iter_records(), start=1):
+        yield index, record
+
+
+def iter_msgpack_records(chunks):
+    """連続した MessagePack のオブジェクトを逐次パース（1オブジェクト1レコード）"""
+    unpacker = msgpack.Unpacker(raw=False)
+    index = 0
+    position = 0  # 読み飛ばした先頭を含むオブジェクトの件数
+    try:
+        for chunk in chunks:
+            unpacker.feed(chunk)
+            for record in unpacker:
+                position += 1
+                # エクスポートしたファイルの先頭（問題集の情報）は読み飛ばす
+                if isinstance(record, dict) and record.get('type') == 'title':
+                    continue
+                index += 1
+                yield index, record
+        # 末尾のオブジェクトが途中で途切れている場合、read_bytes は ValueError になる
+        unpacker.read_bytes(1)
+    except ValueError:
+        # 不正な形式・途中で途切れたデータ・UTF-8 として不正な文字列（UnicodeDecodeError）
+        raise ImportParseError(f'{position + 1}件目のオブジェクトを MessagePack として解析できません。')
+
+
+def csv_row_to_record(row):
+    """CSVの1行をQuestionCreateSerializerの入力形式に変換"""
+    correct = {
+        int(value) for value in CSV_CORRECT_SEPARATOR_RE.split(row.get('correct') or '')
+        if value.isdigit()
+    }
+    choices = []
+    for index, column in enumerate(CSV_CHOICE_COLUMNS, start=1):
+        text = (row.get(column) or '').strip()
+        if text:
+            choices.append({'text': text, 'is_correct': index in correct, 'order': index})
+
+    record = {
+        'text': row.get('text') or '',
+        'explanation': row.get('explanation') or '',
+        'question_type': row.get('question_type') or 'single',
+        'choices': choices,
+    }
+    if (row.get('order') or '').strip():
+        record['order'] = row['order'].strip()
+    return record
+
+
+def iter_csv_records(chunks):
+    """CSV（ヘッダ行付き）を逐次パース"""
+    # 閉じていない引用符などを黙って読み進めない（strict）
+    reader = csv.DictReader(iter_text_lines(chunks), strict=True)
+    try:
+        if reader.fieldnames is None or 'text' not in reader.fieldnames:
+            raise ImportParseError('CSVのヘッダ行に text 列が必要です。')
+        for index, row in enumerate(reader, start=1):
+            yield index, csv_row_to_record(row)
+    except csv.Error as e:
+        raise ImportParseError(f'{reader.reader.line_num}行目をCSVとして解析できません: {e}')
+
+
+PARSERS = {
+    'csv': iter_csv_records,
+    'json': iter_json_records,
+    'ndjson': iter_ndjson_records,
+    'msgpack': iter_msgpack_records,
+}
+
+EXTENSION_FORMATS = {
+    'csv': 'csv',
+    'json': 'json',
+    'ndjson': 'ndjson',
+    'jsonl': 'ndjson',
+    'msgpack': 'msgpack',
+}
+
+
+def detect_format(filename, requested=None):
+    """ファイル形式を指定値または拡張子から判定"""
+    if requested:
+        return requested if requested in PARSERS else None
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return EXTENSION_FORMATS.get(extension)
+
+
+class QuestionImporter:
+    """
+    問題のインポート処理
+    - skip_errors=False: 1件でもエラーがあれば全体をロールバック
+    - skip_errors=True: エラーの行を除いて取り込む
+    - 既に問題がある問題集に取り込む場合、ファイルの表示順は使わず既存の問題の後ろにファイルの順で採番する
+      （エクスポートの表示順をそのまま使うと既存の問題と重複するため）
+    """
+    chunk_size = 500
+
+    def __init__(self, title, skip_errors=False, chunk_size=None):
+        self.title = title
+        self.skip_errors = skip_errors
+        if chunk_size:
+            self.chunk_size = chunk_size
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.keep_orders = True
+
+    def add_error(self, row, detail):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': detail})
+
+    def validate(self, validator, row, record):
+        if isinstance(record, ImportRecordError):
+            self.add_error(row, {'non_field_errors': [record.message]})
+            return None
+        try:
+            return validator.run_validation(record)
+        except serializers.ValidationError as exc:
+            self.add_error(row, exc.detail)
+            return None
+
+    def run(self, records):
+        """レコードを検証・書き込みし、取り込み件数を返す"""
+        # フィールド定義を使い回すため、検証用シリアライザは1つだけ生成する
+        validator = QuestionCreateSerializer()
+        try:
+            with transaction.atomic():
+                # 問題数は集計済みの値を使う（追加のクエリなし）
+                self.keep_orders = not self.title.questions_count
+                chunk = []
+                for row, record in records:
+                    validated = self.validate(validator, row, record)
+                    if validated is None:
+                        continue
+                    chunk.append(validated)
+                    if len(chunk) >= self.chunk_size:
+                        self.write_chunk(chunk)
+                        chunk = []
+                if chunk:
+                    self.write_chunk(chunk)
+
+                if self.error_count and not self.skip_errors:
+                    raise ImportAborted()
+                self.finish()
+        except ImportAborted:
+            self.imported = 0
+        return self.imported
+
+    def write_chunk(self, chunk):
+        if not self.keep_orders:
+            for data in chunk:
+                data.pop('order', None)
+        # 表示順未指定（または0）の問題の分だけ採番カウンタからまとめて払い出す
+        auto_count = sum(1 for data in chunk if not data.get('order'))
+        next_order = Title.allocate_question_orders(self.title.pk, auto_count) if auto_count else None
+
+        questions = []
+        for data in chunk:
+            fields = {key: value for key, value in data.items() if key != 'choices'}
+            if not fields.get('order'):
+                fields['order'] = next_order
+                next_order += ORDER_GAP
+            questions.append(Question(title=self.title, **fields))
+        Question.objects.bulk_create(questions)
+
+        # bulk_create はシグナルを発行しないため、明示指定された表示順にカウンタを追従させる
+        Title.reserve_question_order(self.title.pk, max(question.order for question in questions))
+
+        Choice.objects.bulk_create([
+            Choice(question=question, **{key: value for key, value in choice.items() if key != 'id'})
+            for question, data in zip(questions, chunk)
+            for choice in data['choices']
+        ])
+        self.imported += len(questions)
+
+    def finish(self):
+        """bulk_create はシグナルを発行しないため、集計値とキャッシュを明示的に更新"""
+        adjust_title_counters(self.title.pk, questions_count=self.imported, content_version=1 if self.imported else 0)
+        title_id = self.title.pk
+        transaction.on_commit(lambda: invalidate_title_question_ids(title_id))
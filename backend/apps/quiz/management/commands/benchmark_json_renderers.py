@@ -0,0 +1,92 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from apps.accounts.models import CustomUser
+from apps.common.parsers import FastJSONParser
+from apps.common.renderers import FastJSONRenderer, orjson
+from apps.quiz.models import Title, Question, Choice
+from apps.quiz.optimizers import prefetch_objects
+from apps.quiz.serializers import TitleDetailSerializer
+
+
+def measure(func, repeat):
+    """func を repeat 回実行し、1回あたりの中央値（ミリ秒）を返す"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = '問題集詳細（TitleDetailSerializer）の出力で標準の JSONRenderer / JSONParser と orjson 版の速度を比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=200, help='問題数（既定: 200）')
+        parser.add_argument('--choices', type=int, default=4, help='問題あたりの選択肢数（既定: 4）')
+        parser.add_argument('--repeat', type=int, default=50, help='計測の繰り返し回数（既定: 50）')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson がインストールされていないため比較できません。')
+
+        # 計測用のデータはトランザクションごと破棄する
+        with transaction.atomic():
+            data = self.build_detail_data(options['questions'], options['choices'])
+            transaction.set_rollback(True)
+
+        stdlib_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        content = stdlib_renderer.render(data)
+        if fast_renderer.render(data) != content:
+            raise CommandError('FastJSONRenderer の出力が JSONRenderer と一致しません。')
+        stdlib_parser, fast_parser = JSONParser(), FastJSONParser()
+        if fast_parser.parse(io.BytesIO(content)) != stdlib_parser.parse(io.BytesIO(content)):
+            raise CommandError('FastJSONParser の解析結果が JSONParser と一致しません。')
+
+        repeat = options['repeat']
+        rows = [
+            ('render', measure(lambda: stdlib_renderer.render(data), repeat),
+             measure(lambda: fast_renderer.render(data), repeat)),
+            ('parse', measure(lambda: stdlib_parser.parse(io.BytesIO(content)), repeat),
+             measure(lambda: fast_parser.parse(io.BytesIO(content)), repeat)),
+        ]
+
+        self.stdout.write(f'{len(content):,} bytes, {repeat} runs (median)')
+        for name, stdlib_ms, fast_ms in rows:
+            self.stdout.write(
+                f'{name:<7} json: {stdlib_ms:8.3f} ms  orjson: {fast_ms:8.3f} ms  x{stdlib_ms / fast_ms:.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS('出力は JSONRenderer / JSONParser と一致しました。'))
+
+    def build_detail_data(self, questions_count, choices_count):
+        """計測用の問題集を作成し、詳細レスポンスのデータを返す"""
+        owner = CustomUser.objects.create_user(
+            username='benchmark-json', email='benchmark-json@example.com', password='benchmark-json'
+        )
+        title = Title.objects.create(
+            name='ベンチマーク用の問題集', description='JSON描画の計測用\n"引用符" と \\ を含む', status=Title.PUBLIC, owner=owner
+        )
+        questions = Question.objects.bulk_create([
+            Question(
+                title=title,
+                text=f'問題{i}: 次のうち正しいものを選びなさい。',
+                explanation=f'解説{i}\t（タブ・改行\nを含む）',
+                order=i,
+            )
+            for i in range(1, questions_count + 1)
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=question, text=f'選択肢{j}', is_correct=j == 1, order=j)
+            for question in questions
+            for j in range(1, choices_count + 1)
+        ])
+
+        title = Title.objects.select_related('owner').get(pk=title.pk)
+        prefetch_objects([title], TitleDetailSerializer)
+        return TitleDetailSerializer(title).data
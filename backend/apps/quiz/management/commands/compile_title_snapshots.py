@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from apps.quiz.models import Title, TitleSnapshot
+from apps.quiz.snapshots import compile_title_snapshot
+
+
+class Command(BaseCommand):
+    help = '公開中の問題集のスナップショットを作成・更新します（バックフィル／修復用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'title_ids',
+            nargs='*',
+            type=int,
+            help='対象の問題集ID（省略時は公開中の全件）',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='最新のスナップショットがある場合も作り直す',
+        )
+
+    def handle(self, *args, **options):
+        title_ids = options['title_ids'] or list(
+            Title.objects.filter(status=Title.PUBLIC).values_list('id', flat=True)
+        )
+        if options['force']:
+            TitleSnapshot.objects.filter(title_id__in=title_ids).delete()
+
+        compiled = sum(1 for title_id in title_ids if compile_title_snapshot(title_id) is not None)
+        self.stdout.write(self.style.SUCCESS(f'{compiled}件の問題集のスナップショットを作成しました。'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from apps.quiz.models import Title
+from apps.quiz.search import build_search_document, get_search_backend
+
+
+class Command(BaseCommand):
+    help = '問題集の検索用文書と全文検索インデックスを再構築します'
+
+    def handle(self, *args, **options):
+        count = 0
+        for title in Title.objects.only('name', 'description').iterator():
+            Title.objects.filter(pk=title.pk).update(
+                search_document=build_search_document(title.name, title.description)
+            )
+            count += 1
+
+        get_search_backend().rebuild(Title.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'{count}件の問題集の検索インデックスを再構築しました。'))
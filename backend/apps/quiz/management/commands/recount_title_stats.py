@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from apps.quiz.models import Title, Question, Rating
+from apps.quiz.ordering import ORDER_GAP
+
+
+def recount_title_stats(queryset):
+    """Titleの集計カラムを実テーブルから再計算して一括更新する"""
+    questions_count = Question.objects.filter(title=OuterRef('pk')).order_by().values('title').annotate(
+        n=Count('id')
+    ).values('n')
+    ratings = Rating.objects.filter(title=OuterRef('pk')).order_by().values('title')
+    ratings_count = ratings.annotate(n=Count('id')).values('n')
+    ratings_sum = ratings.annotate(total=Sum('stars')).values('total')
+    max_order = Question.objects.filter(title=OuterRef('pk')).order_by().values('title').annotate(
+        max_order=Max('order')
+    ).values('max_order')
+
+    return queryset.update(
+        questions_count=Coalesce(Subquery(questions_count), Value(0)),
+        ratings_count=Coalesce(Subquery(ratings_count), Value(0)),
+        ratings_sum=Coalesce(Subquery(ratings_sum), Value(0)),
+        # 採番カウンタは払い出し済みの値を再利用しないよう、巻き戻さずに追従のみ行う
+        next_question_order=Greatest(F('next_question_order'), Coalesce(Subquery(max_order), Value(0)) + ORDER_GAP),
+    )
+
+
+class Command(BaseCommand):
+    help = '問題集の問題数・評価数・評価合計・採番カウンタを再計算します（バックフィル／整合性修復用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'title_ids',
+            nargs='*',
+            type=int,
+            help='対象の問題集ID（省略時は全件）',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Title.objects.all()
+        if options['title_ids']:
+            queryset = queryset.filter(pk__in=options['title_ids'])
+
+        updated = recount_title_stats(queryset)
+        self.stdout.write(self.style.SUCCESS(f'{updated}件の問題集の集計値を再計算しました。'))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_title_counters(apps, schema_editor):
+    """既存データから集計カラムを初期化"""
+    Title = apps.get_model('quiz', 'Title')
+    Question = apps.get_model('quiz', 'Question')
+    Rating = apps.get_model('quiz', 'Rating')
+
+    questions = Question.objects.filter(title=OuterRef('pk')).order_by().values('title')
+    ratings = Rating.objects.filter(title=OuterRef('pk')).order_by().values('title')
+    Title.objects.update(
+        questions_count=Coalesce(Subquery(questions.annotate(n=Count('id')).values('n')), Value(0)),
+        ratings_count=Coalesce(Subquery(ratings.annotate(n=Count('id')).values('n')), Value(0)),
+        ratings_sum=Coalesce(Subquery(ratings.annotate(total=Sum('stars')).values('total')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='questions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='問題数'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='ratings_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='評価数'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='ratings_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='評価合計'),
+        ),
+        migrations.RunPython(backfill_title_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_title_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['title', 'order', 'id'], name='quiz_question_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionfavorite',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='quiz_qfav_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionnote',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='quiz_note_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_rating_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_title_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='quiz_title_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='titlefavorite',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='quiz_tfav_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:04
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# 検索用文書の作成規則（このマイグレーション作成時点の apps.quiz.search.build_search_document の複製）
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def build_search_document(*texts):
+    runs = [run for text in texts for run in WORD_RE.findall(unicodedata.normalize('NFKC', text or '').lower())]
+    grams = [run[i:i + 2] for run in runs for i in range(len(run) - 1)]
+    unigrams = sorted({char for run in runs for char in run})
+    return ' '.join(grams + unigrams)
+
+
+def create_search_index(apps, schema_editor):
+    """検索用文書をバックフィルし、DBごとの全文検索インデックスを作成"""
+    Title = apps.get_model('quiz', 'Title')
+    for title in Title.objects.only('name', 'description').iterator():
+        Title.objects.filter(pk=title.pk).update(
+            search_document=build_search_document(title.name, title.description)
+        )
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_title_fts USING fts5(document, tokenize='unicode61')"
+        )
+        schema_editor.execute('INSERT INTO quiz_title_fts (rowid, document) SELECT id, search_document FROM quiz_title')
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS quiz_title_search_gin ON quiz_title "
+            "USING gin (to_tsvector('simple'::regconfig, COALESCE(\"search_document\", '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS quiz_title_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS quiz_title_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='検索用文書'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
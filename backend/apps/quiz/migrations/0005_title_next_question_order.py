@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-17 06:00
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_next_question_order(apps, schema_editor):
+    """既存の問題の max(order) + 1 で採番カウンタを初期化"""
+    Title = apps.get_model('quiz', 'Title')
+    Question = apps.get_model('quiz', 'Question')
+
+    max_order = Question.objects.filter(title=OuterRef('pk')).order_by().values('title').annotate(
+        max_order=Max('order')
+    ).values('max_order')
+    Title.objects.update(next_question_order=Coalesce(Subquery(max_order), Value(0)) + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_title_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='next_question_order',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='次の表示順'),
+        ),
+        migrations.RunPython(backfill_next_question_order, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-17 08:00
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_content_updated_at(apps, schema_editor):
+    """既存の問題集は更新日時を内容更新日時の初期値とする"""
+    Title = apps.get_model('quiz', 'Title')
+    Title.objects.update(content_updated_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_title_next_question_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='内容バージョン'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='content_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='内容更新日時'),
+        ),
+        migrations.RunPython(backfill_content_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-17 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0006_title_content_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleSnapshot',
+            fields=[
+                ('title', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='quiz.title', verbose_name='問題集')),
+                ('content_version', models.PositiveIntegerField(verbose_name='内容バージョン')),
+                ('content_updated_at', models.DateTimeField(verbose_name='内容更新日時')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='内容ハッシュ')),
+                ('document', models.BinaryField(verbose_name='ドキュメント（gzip圧縮JSON）')),
+                ('compiled_at', models.DateTimeField(auto_now=True, verbose_name='コンパイル日時')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+            ],
+            options={
+                'verbose_name': '公開スナップショット',
+                'verbose_name_plural': '公開スナップショット',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-17 12:00
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# apps.quiz.ordering.ORDER_GAP の値（マイグレーション作成時点で固定）
+ORDER_GAP = 1024
+
+
+def advance_question_order_counters(apps, schema_editor):
+    """
+    採番カウンタを問題集ごとに既存の表示順の最大値の ORDER_GAP 後ろに合わせる
+    既存の問題の order（レスポンスに含まれる値）は書き換えない
+    連番のままの問題集は、初回の並べ替えで ORDER_GAP 間隔に振り直される（apps.quiz.ordering）
+    """
+    Title = apps.get_model('quiz', 'Title')
+    Question = apps.get_model('quiz', 'Question')
+
+    max_order = (
+        Question.objects.filter(title_id=OuterRef('pk'))
+        .order_by()
+        .values('title_id')
+        .annotate(max_order=Max('order'))
+        .values('max_order')
+    )
+    Title.objects.update(next_question_order=Coalesce(Subquery(max_order), Value(0)) + ORDER_GAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_title_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='title',
+            name='next_question_order',
+            field=models.PositiveIntegerField(default=ORDER_GAP, editable=False, verbose_name='次の表示順'),
+        ),
+        migrations.RunPython(advance_question_order_counters, migrations.RunPython.noop),
+    ]
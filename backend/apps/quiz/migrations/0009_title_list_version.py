@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_question_order_gap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title_id', models.BigIntegerField(blank=True, null=True, verbose_name='問題集ID（一括削除はNone）')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='削除日時')),
+            ],
+            options={
+                'verbose_name': '問題集の削除の記録',
+                'verbose_name_plural': '問題集の削除の記録',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['content_updated_at'], name='quiz_title_content_upd_idx'),
+        ),
+    ]
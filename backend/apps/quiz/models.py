@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .ordering import ORDER_GAP
+from .search import build_search_document
 
 
 class Title(models.Model):
@@ -23,6 +27,17 @@ class Title(models.Model):
         verbose_name='ステータス'
     )
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='titles', verbose_name='作成者')
+    # 集計値の非正規化カラム（apps.quiz.signals で F() 更新により維持）
+    questions_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='問題数')
+    ratings_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='評価数')
+    ratings_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name='評価合計')
+    # 次に自動採番する問題の表示順（allocate_question_orders で ORDER_GAP 間隔で原子的に払い出す）
+    next_question_order = models.PositiveIntegerField(default=ORDER_GAP, editable=False, verbose_name='次の表示順')
+    # 問題集・問題・選択肢・評価のいずれかが変わるたびに進む内容バージョン（ETag / Last-Modified 用）
+    content_version = models.PositiveIntegerField(default=1, editable=False, verbose_name='内容バージョン')
+    content_updated_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='内容更新日時')
+    # 全文検索用のバイグラム文書（apps.quiz.search 参照）
+    search_document = models.TextField(blank=True, default='', editable=False, verbose_name='検索用文書')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
 
@@ -30,10 +45,64 @@ class Title(models.Model):
         verbose_name = '問題集'
         verbose_name_plural = '問題集'
         ordering = ['-created_at']
+        indexes = [
+            # キーセットページネーション用 (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='quiz_title_created_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='quiz_title_status_created_idx'),
+            # 問題集一覧の条件付きGET（最新の内容更新日時）用
+            models.Index(fields=['content_updated_at'], name='quiz_title_content_upd_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    # F() で更新する集計カラム（インスタンスの保存で古い値に巻き戻さないよう通常の save では書き込まない）
+    COUNTER_FIELDS = (
+        'questions_count', 'ratings_count', 'ratings_sum', 'next_question_order',
+        'content_version', 'content_updated_at',
+    )
+
+    def save(self, *args, **kwargs):
+        """保存時に検索用文書を更新"""
+        self.search_document = build_search_document(self.name, self.description)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'description'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def allocate_question_orders(cls, title_id, count=1):
+        """
+        問題の表示順を count 件分まとめて払い出し、先頭の値を返す（2件目以降は ORDER_GAP ずつ加算した値）
+        並べ替えで間に挿入できるよう ORDER_GAP 間隔で払い出す（apps.quiz.ordering）
+        先に F() で UPDATE して行ロックを取るため、同時に採番しても値は重複しない
+        """
+        with transaction.atomic():
+            updated = cls.objects.filter(pk=title_id).update(
+                next_question_order=F('next_question_order') + count * ORDER_GAP
+            )
+            if not updated:
+                raise cls.DoesNotExist()
+            next_order = cls.objects.filter(pk=title_id).values_list('next_question_order', flat=True).get()
+        return next_order - count * ORDER_GAP
+
+    @classmethod
+    def reserve_question_order(cls, title_id, order):
+        """明示指定された表示順が採番カウンタ以上なら、カウンタを ORDER_GAP 後ろまで進める"""
+        cls.objects.filter(pk=title_id, next_question_order__lte=order).update(next_question_order=order + ORDER_GAP)
+
+    @property
+    def average_rating(self):
+        """平均評価（小数第1位で丸め、評価なしの場合はNone）"""
+        if not self.ratings_count:
+            return None
+        return round(self.ratings_sum / self.ratings_count, 1)
+
 
 class Question(models.Model):
     """問題"""
@@ -61,6 +130,9 @@ class Question(models.Model):
         verbose_name = '問題'
         verbose_name_plural = '問題'
         ordering = ['title', 'order', 'id']
+        indexes = [
+            models.Index(fields=['title', 'order', 'id'], name='quiz_question_order_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title.name} - {self.text[:50]}'
@@ -93,6 +165,9 @@ class TitleFavorite(models.Model):
         verbose_name_plural = '問題集のお気に入り'
         unique_together = ['user', 'title']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='quiz_tfav_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.title.name}'
@@ -109,6 +184,9 @@ class QuestionFavorite(models.Model):
         verbose_name_plural = '問題のお気に入り'
         unique_together = ['user', 'question']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='quiz_qfav_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.question.text[:30]}'
@@ -131,10 +209,20 @@ class Rating(models.Model):
         verbose_name_plural = '評価'
         unique_together = ['user', 'title']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='quiz_rating_created_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.title.name} ({self.stars}★)'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """DBから読み込んだ時点の星評価を保持（集計値の差分更新用）"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stars = instance.__dict__.get('stars')
+        return instance
+
 
 class QuestionNote(models.Model):
     """問題メモ"""
@@ -149,6 +237,50 @@ class QuestionNote(models.Model):
         verbose_name_plural = '問題メモ'
         unique_together = ['user', 'question']
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='quiz_note_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.question.text[:30]}'
+
+
+class TitleSnapshot(models.Model):
+    """
+    公開問題集のスナップショット
+    公開時・公開後の編集時に詳細レスポンス（TitleDetailSerializer）をJSONにコンパイルし、
+    gzip圧縮して保存する（apps.quiz.snapshots 参照）
+    """
+    title = models.OneToOneField(
+        Title, on_delete=models.CASCADE, primary_key=True, related_name='snapshot', verbose_name='問題集'
+    )
+    # 所有者は常にライブの内容を参照するため、JOINせずに判定できるよう保持する
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', verbose_name='作成者')
+    content_version = models.PositiveIntegerField(verbose_name='内容バージョン')
+    content_updated_at = models.DateTimeField(verbose_name='内容更新日時')
+    content_hash = models.CharField(max_length=64, verbose_name='内容ハッシュ')
+    document = models.BinaryField(verbose_name='ドキュメント（gzip圧縮JSON）')
+    compiled_at = models.DateTimeField(auto_now=True, verbose_name='コンパイル日時')
+
+    class Meta:
+        verbose_name = '公開スナップショット'
+        verbose_name_plural = '公開スナップショット'
+
+    def __str__(self):
+        return f'{self.title_id} (v{self.content_version})'
+
+
+class TitleDeletion(models.Model):
+    """
+    問題集の削除の記録
+    問題集一覧の条件付きGET（apps.quiz.conditional）で、件数を集計せずに削除を検出するために使用する
+    """
+    title_id = models.BigIntegerField(null=True, blank=True, verbose_name='問題集ID（一括削除はNone）')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='削除日時')
+
+    class Meta:
+        verbose_name = '問題集の削除の記録'
+        verbose_name_plural = '問題集の削除の記録'
+
+    def __str__(self):
+        return f'{self.title_id} ({self.deleted_at})'
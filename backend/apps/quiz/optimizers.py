@@ -0,0 +1,141 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework import serializers
+from apps.common.dynamic_fields import DynamicFieldsViewMixin
+
+
+def _get_serializer(serializer):
+    """シリアライザのクラス・インスタンス・ListSerializerを単体のインスタンスに正規化"""
+    if isinstance(serializer, type):
+        serializer = serializer()
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    return serializer
+
+
+def _readable_fields(serializer):
+    return [field for field in serializer.fields.values() if not field.write_only]
+
+
+def _get_model_field(model, source):
+    if not source or source == '*' or '.' in source:
+        return None
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def build_related_plan(serializer, model, prefix=''):
+    """
+    シリアライザのフィールド構成から select_related / prefetch_related の対象を導出する
+    - 単一のネストシリアライザ（FK/OneToOne）: select_related（さらに内側も再帰的に辿る）
+    - many=True のネストシリアライザ: 子モデルのデフォルト並び順を保った Prefetch
+    """
+    select_related = []
+    prefetch_related = []
+
+    for field in _readable_fields(serializer):
+        model_field = _get_model_field(model, field.source)
+        if model_field is None or not model_field.is_relation:
+            continue
+
+        lookup = f'{prefix}{field.source}'
+
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+            related_model = model_field.related_model
+            queryset = optimize_queryset(related_model._default_manager.all(), field.child)
+            prefetch_related.append(Prefetch(lookup, queryset=queryset))
+        elif isinstance(field, serializers.ModelSerializer):
+            if model_field.many_to_one or model_field.one_to_one:
+                select_related.append(lookup)
+                nested_select, nested_prefetch = build_related_plan(
+                    field, model_field.related_model, prefix=f'{lookup}__'
+                )
+                select_related.extend(nested_select)
+                prefetch_related.extend(nested_prefetch)
+            else:
+                prefetch_related.append(lookup)
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch_related.append(lookup)
+
+    return select_related, prefetch_related
+
+
+def build_deferred_fields(serializer, model, keep=(), prefix=''):
+    """
+    ?fields= / ?omit= で出力しないモデルのカラムを導出する（defer() の対象）
+    - 主キー・関連（外部キー）・keep のカラムは除外しない
+    - 単一のネストシリアライザ（select_related 対象）の内側も再帰的に辿る
+    """
+    readable_fields = _readable_fields(serializer)
+    deferred = []
+    for source in getattr(serializer, 'omitted_fields', {}).values():
+        model_field = _get_model_field(model, source)
+        if model_field is None or not model_field.concrete or model_field.is_relation:
+            continue
+        if model_field.primary_key or source in keep:
+            continue
+        deferred.append(f'{prefix}{source}')
+
+    for field in readable_fields:
+        model_field = _get_model_field(model, field.source)
+        if (
+            isinstance(field, serializers.ModelSerializer)
+            and model_field is not None
+            and (model_field.many_to_one or model_field.one_to_one)
+        ):
+            deferred.extend(build_deferred_fields(
+                field, model_field.related_model, prefix=f'{prefix}{field.source}__'
+            ))
+    return deferred
+
+
+def optimize_queryset(queryset, serializer, keep_fields=()):
+    """
+    シリアライザで出力する関連オブジェクトをまとめて取得するクエリセットに変換する
+    問題数に関わらず発行クエリ数が一定になる
+    ?fields= / ?omit= で出力しないカラム・関連は取得しない（keep_fields のカラムは常に取得）
+    """
+    serializer = _get_serializer(serializer)
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return queryset
+
+    select_related, prefetch_related = build_related_plan(serializer, queryset.model)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    deferred = build_deferred_fields(serializer, queryset.model, keep=keep_fields)
+    if deferred:
+        queryset = queryset.defer(*deferred)
+    return queryset
+
+
+def prefetch_objects(objects, serializer):
+    """取得済みのオブジェクトに、シリアライザで出力する関連オブジェクト（prefetch 対象）をまとめて読み込む"""
+    serializer = _get_serializer(serializer)
+    if objects and isinstance(serializer, serializers.ModelSerializer):
+        _, prefetch_related = build_related_plan(serializer, type(objects[0]))
+        prefetch_related_objects(objects, *prefetch_related)
+    return objects
+
+
+class QuerysetOptimizerMixin(DynamicFieldsViewMixin):
+    """
+    アクションごとのシリアライザに合わせてクエリセットを最適化するViewSet用Mixin
+    シリアライザを省略した場合は、リクエストの ?fields= / ?omit= / ?expand= を反映したシリアライザを使用する
+    """
+    def get_cursor_ordering(self):
+        """キーセットページネーションの並び順（リクエストにより並び順が変わるビューはオーバーライドする）"""
+        return getattr(self, 'cursor_ordering', ())
+
+    def get_optimizer_keep_fields(self):
+        """出力しない場合も取得するカラム（キーセットページネーションはページ末尾の行の並び順のカラムからカーソルを作成する）"""
+        return [name.lstrip('-') for name in self.get_cursor_ordering()]
+
+    def optimize_queryset(self, queryset, serializer_class=None):
+        if serializer_class is not None:
+            return optimize_queryset(queryset, serializer_class)
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        return optimize_queryset(queryset, serializer, keep_fields=self.get_optimizer_keep_fields())
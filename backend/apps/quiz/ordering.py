@@ -0,0 +1,80 @@
+"""
+問題・選択肢の並べ替え
+
+並べ替え後の並び（IDのリスト）を受け取り、現在の order の値のうち
+最長増加部分列（そのままで順序が正しい行）を据え置いて、残りの行だけを
+前後の据え置き行の order の間（ギャップ）に割り当てる。
+1件の移動であれば通常は1行の UPDATE で済む。
+ギャップが足りない場合は全体を ORDER_GAP 間隔で振り直す（リバランス）。
+"""
+from bisect import bisect_left
+
+ORDER_GAP = 1024
+
+
+def longest_increasing_subsequence(values):
+    """狭義単調増加な最長部分列のインデックス集合を返す（O(n log n)）"""
+    tails = []
+    tail_indices = []
+    previous = [None] * len(values)
+    for index, value in enumerate(values):
+        position = bisect_left(tails, value)
+        if position:
+            previous[index] = tail_indices[position - 1]
+        if position == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[position] = value
+            tail_indices[position] = index
+
+    kept = set()
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        kept.add(index)
+        index = previous[index]
+    return kept
+
+
+def plan_orders(current_orders):
+    """
+    並べ替え後の並びにおける現在の order の一覧から、新しい order の一覧を求める
+    据え置きにできる行は同じ値のまま返す
+    """
+    kept = longest_increasing_subsequence(current_orders)
+    new_orders = list(current_orders)
+    lower = 0
+    pending = []
+    for index, order in enumerate(current_orders + [None]):
+        if index < len(current_orders) and index not in kept:
+            pending.append(index)
+            continue
+        if pending:
+            if order is None:
+                # 末尾は上限がないため ORDER_GAP 間隔で後ろに並べる
+                step = ORDER_GAP
+            else:
+                step = (order - lower) // (len(pending) + 1)
+                if step < 1:
+                    return rebalanced_orders(len(current_orders))
+            for offset, pending_index in enumerate(pending, start=1):
+                new_orders[pending_index] = lower + step * offset
+            pending = []
+        if order is not None:
+            lower = order
+    return new_orders
+
+
+def rebalanced_orders(count):
+    return [ORDER_GAP * position for position in range(1, count + 1)]
+
+
+def apply_order(objects):
+    """並べ替え後の並びのオブジェクトに新しい order を設定し、変更したオブジェクトを返す"""
+    new_orders = plan_orders([obj.order for obj in objects])
+    changed = []
+    for obj, order in zip(objects, new_orders):
+        if obj.order != order:
+            obj.order = order
+            changed.append(obj)
+    return changed
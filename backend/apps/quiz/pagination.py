@@ -1,4 +1,131 @@
-from rest_framework.pagination import PageNumberPagination
+import datetime
+
+from django.core import signing
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def to_cursor_value(value):
+    """カーソルに埋め込む値をJSON化可能な形に変換（日時はマイクロ秒まで保持）"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def clamp_page_size(page_size, minimum=10, maximum=50):
+    """ページサイズを範囲内に丸める"""
+    if page_size is None:
+        return None
+    return max(minimum, min(page_size, maximum))
+
+
+class KeysetPagination(BasePagination):
+    """
+    キーセット（カーソル）ページネーション
+    - 並び順のキー（例: (created_at, id)）の直前値を署名付きカーソルに埋め込み、
+      OFFSET/COUNT を使わずに WHERE 条件で次ページを取得する
+    - ページの深さに関わらずコストが一定
+    - 並び順は view.get_cursor_ordering() / view.cursor_ordering で指定（末尾は一意なキーにすること）
+    - カーソルは並び順ごとに署名するため、別の並び順（検索の有無など）のカーソルは無効
+    - view.get_cursor_query_params() のパラメータ（ランダム表示のシードなど）は次ページのURLに固定する
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    signing_salt = 'apps.quiz.pagination.cursor'
+    invalid_cursor_message = '無効なカーソルです。'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return clamp_page_size(page_size)
+
+    def get_ordering(self, view):
+        get_cursor_ordering = getattr(view, 'get_cursor_ordering', None)
+        if get_cursor_ordering is not None:
+            return tuple(get_cursor_ordering())
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def get_signing_salt(self):
+        return f'{self.signing_salt}:{",".join(self.ordering)}'
+
+    def encode_cursor(self, values):
+        return signing.dumps([to_cursor_value(value) for value in values], salt=self.get_signing_salt())
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = signing.loads(encoded, salt=self.get_signing_salt())
+        except signing.BadSignature:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def build_keyset_filter(self, values):
+        """(a, b, c) > (x, y, z) を方向付きで展開した条件を組み立てる"""
+        condition = Q()
+        for index, field in enumerate(self.ordering_fields):
+            lookup = 'lt' if self.ordering[index].startswith('-') else 'gt'
+            term = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_field, prev_value in zip(self.ordering_fields[:index], values[:index]):
+                term &= Q(**{prev_field: prev_value})
+            condition |= term
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        get_query_params = getattr(view, 'get_cursor_query_params', None)
+        self.fixed_query_params = get_query_params() if get_query_params is not None else {}
+        self.ordering = self.get_ordering(view)
+        self.ordering_fields = [field.lstrip('-') for field in self.ordering]
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.build_keyset_filter(values))
+
+        # 1件多く取得して次ページの有無を判定
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, field) for field in self.ordering_fields]
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        for key, value in self.fixed_query_params.items():
+            url = replace_query_param(url, key, value)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -7,19 +134,32 @@ class CustomPageNumberPagination(PageNumberPagination):
     - デフォルト: 20件/ページ
     - カスタマイズ可能: ?page_size=30
     - 範囲: 10〜50件
+    - ?pagination=cursor または ?cursor=... でキーセットページネーションに切り替え
     """
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 50
+    mode_query_param = 'pagination'
+    cursor_pagination_class = KeysetPagination
+
+    def is_cursor_mode(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param in request.query_params
+        )
 
     def get_page_size(self, request):
         """ページサイズを取得（範囲制限付き）"""
-        page_size = super().get_page_size(request)
-        if page_size is not None:
-            # 最小値チェック
-            if page_size < 10:
-                return 10
-            # 最大値チェック
-            if page_size > 50:
-                return 50
-        return page_size
+        return clamp_page_size(super().get_page_size(request))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.is_cursor_mode(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
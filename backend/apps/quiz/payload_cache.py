@@ -0,0 +1,117 @@
+"""
+公開問題集のレスポンス（シリアライズ済みデータ）の2段キャッシュ
+
+- 1段目: プロセス内の LRU（件数上限付き）
+- 2段目: Django のキャッシュ（settings.CACHES。本番は Redis）
+
+キーには問題集の内容バージョン（Title.content_version / content_updated_at）を含める。
+問題集・問題・選択肢・評価が変わると apps.quiz.signals が内容バージョンを進めるため、
+変更後は別のキーとなり、古いエントリは参照されずに期限切れ・LRU で追い出される。
+
+キャッシュミス時は cache.add によるロックで再構築を1ワーカーに限定し（single-flight）、
+他のワーカーは再構築の完了を待ってキャッシュから読み込む。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_cache_timeout():
+    return getattr(settings, 'QUIZ_PAYLOAD_CACHE_TIMEOUT', 60 * 10)
+
+
+def get_local_cache_size():
+    return getattr(settings, 'QUIZ_PAYLOAD_LOCAL_CACHE_SIZE', 256)
+
+
+class LocalLRUCache:
+    """
+    プロセス内のLRUキャッシュ（件数上限・有効期限付き、スレッドセーフ）
+    上限・有効期限を省略した場合は、アクセスのたびに settings から読み込む（override_settings 等を反映する）
+    """
+
+    def __init__(self, max_size=None, timeout=None):
+        self._max_size = max_size
+        self._timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return self._max_size if self._max_size is not None else get_local_cache_size()
+
+    @property
+    def timeout(self):
+        return self._timeout if self._timeout is not None else get_cache_timeout()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            max_size = self.max_size
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalLRUCache()
+
+
+def payload_cache_key(kind, title):
+    """問題集の内容バージョンを含むキー（内容が変わると別のキーになる）"""
+    updated_at = int(title.content_updated_at.timestamp() * 1_000_000)
+    return f'quiz:payload:{kind}:{title.pk}:v{title.content_version}:{updated_at}'
+
+
+def build_single_flight(key, builder):
+    """ロックを取得できたワーカーのみが再構築し、他のワーカーはその結果を待つ"""
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, get_cache_timeout())
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    # ロックを取得したワーカーが失敗・遅延した場合は自分で構築する
+    return builder()
+
+
+def get_or_build(key, builder):
+    """プロセス内LRU → 共有キャッシュ → 再構築（single-flight）の順に取得"""
+    value = local_cache.get(key)
+    if value is not None:
+        return value
+    value = cache.get(key)
+    if value is None:
+        value = build_single_flight(key, builder)
+    local_cache.set(key, value)
+    return value
@@ -0,0 +1,19 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    NDJSON（改行区切りJSON）のレンダラー
+    ストリーミング出力は StreamingHttpResponse で直接返すため、
+    ここではエラーレスポンスなど通常のレスポンスを1行のJSONとして出力する
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n').encode(self.charset)
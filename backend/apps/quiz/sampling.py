@@ -0,0 +1,178 @@
+"""
+ランダム出題（?random=true）のサンプリング
+
+ORDER BY RANDOM() で候補全体をDB側で並べ替える代わりに、問題IDの一覧から
+Python側でシード付き乱数によりN件を選び、その行だけを読み込む。
+同じシードであれば常に同じ順序になるため、ページをまたいでも出題順が安定する。
+
+問題集をまたぐ一覧（候補が多い）は、候補全体のIDを読み込まずに
+IDの範囲からシード付きで選んだ値のうち候補に存在するものだけを取り出す。
+"""
+import random
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Max, Min, Value, When
+from rest_framework.exceptions import ValidationError
+
+QUESTION_IDS_CACHE_TIMEOUT = 60 * 10
+# IDの範囲から選ぶ値の数（残りの件数に対する倍率、回ごとに倍にする）と試行回数
+SAMPLE_PROBE_FACTOR = 4
+SAMPLE_PROBE_ROUNDS = 4
+# 1回のクエリで存在を確かめる値の数（id__in のパラメータ数の上限）
+SAMPLE_PROBE_BATCH_SIZE = 500
+
+
+def get_default_limit():
+    return getattr(settings, 'QUIZ_RANDOM_DEFAULT_LIMIT', 100)
+
+
+def get_max_limit():
+    return getattr(settings, 'QUIZ_RANDOM_MAX_LIMIT', 1000)
+
+
+def question_ids_cache_key(title_id):
+    return f'quiz:question-ids:{title_id}'
+
+
+def get_title_question_ids(title_id):
+    """問題集に含まれる問題IDの一覧（表示順）をキャッシュ経由で取得"""
+    from .models import Question
+
+    key = question_ids_cache_key(title_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            Question.objects.filter(title_id=title_id).order_by('order', 'id').values_list('id', flat=True)
+        )
+        cache.set(key, ids, QUESTION_IDS_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_title_question_ids(title_id):
+    cache.delete(question_ids_cache_key(title_id))
+
+
+def reservoir_sample(iterable, k, rng):
+    """リザーバサンプリング（候補を全件メモリに載せずにk件を一様に選ぶ）"""
+    reservoir = []
+    for index, item in enumerate(iterable):
+        if index < k:
+            reservoir.append(item)
+        else:
+            position = rng.randint(0, index)
+            if position < k:
+                reservoir[position] = item
+    rng.shuffle(reservoir)
+    return reservoir
+
+
+def sample_ids(ids, seed, limit=None):
+    """IDの一覧からシード付きでlimit件を選び、ランダムな順序で返す"""
+    rng = random.Random(seed)
+    if limit is None or limit >= len(ids):
+        ids = list(ids)
+        rng.shuffle(ids)
+        return ids
+    return rng.sample(ids, limit)
+
+
+def sample_items(items, seed, limit=None):
+    """シリアライズ済みの問題の一覧から、IDの一覧と同じ規則で選ぶ（同じシードなら同じ結果）"""
+    by_id = {item['id']: item for item in items}
+    return [by_id[pk] for pk in sample_ids(list(by_id), seed, limit)]
+
+
+def sample_queryset_ids(queryset, seed, limit):
+    """
+    クエリセットの候補からIDをlimit件選ぶ（同じシード・同じデータなら同じ結果）
+
+    IDの最小〜最大の範囲からシード付きで値を選び、候補に存在するIDだけを選んだ順に残す（棄却サンプリング）。
+    読み込む行数は候補数によらず limit の数倍に収まる。
+    選んだ値は SAMPLE_PROBE_BATCH_SIZE 件ずつ問い合わせ、limit 件揃った時点で打ち切る。
+    範囲が狭い場合と、候補が範囲に対して疎で規定回数で揃わない場合は、候補全体のIDから選ぶ。
+    """
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    id_range = range(bounds['low'], bounds['high'] + 1)
+    if len(id_range) <= limit * SAMPLE_PROBE_FACTOR:
+        return sample_all_queryset_ids(queryset, seed, limit)
+
+    rng = random.Random(seed)
+    probed = set()
+    found = []
+    for round_index in range(SAMPLE_PROBE_ROUNDS):
+        size = (limit - len(found)) * (SAMPLE_PROBE_FACTOR << round_index)
+        if len(probed) + size > len(id_range) // 2:
+            break
+        while size > 0:
+            probes = []
+            while len(probes) < min(size, SAMPLE_PROBE_BATCH_SIZE):
+                pk = rng.choice(id_range)
+                if pk not in probed:
+                    probed.add(pk)
+                    probes.append(pk)
+            size -= len(probes)
+            existing = set(queryset.filter(id__in=probes).values_list('id', flat=True))
+            found.extend(pk for pk in probes if pk in existing)
+            if len(found) >= limit:
+                return found[:limit]
+    return sample_all_queryset_ids(queryset, seed, limit)
+
+
+def sample_all_queryset_ids(queryset, seed, limit):
+    """クエリセットの候補全体からIDをlimit件選ぶ（IDはストリーミングで読み出す）"""
+    rng = random.Random(seed)
+    ids = queryset.order_by('id').values_list('id', flat=True).iterator()
+    return reservoir_sample(ids, limit, rng)
+
+
+def order_by_ids(queryset, ids):
+    """指定したIDの順序で並べたクエリセットを返す"""
+    if not ids:
+        return queryset.none().annotate(random_position=Value(0, output_field=IntegerField()))
+    position = Case(
+        *[When(id=pk, then=Value(index)) for index, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).annotate(random_position=position).order_by('random_position')
+
+
+def sort_by_ids(objects, ids):
+    """読み込んだオブジェクトを指定したIDの順序に並べ替える"""
+    by_id = {obj.id: obj for obj in objects}
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+class RandomParams:
+    """?random=true&seed=...&limit=N のパラメータ"""
+
+    def __init__(self, enabled, seed=None, limit=None):
+        self.enabled = enabled
+        self.seed = seed
+        self.limit = limit
+
+    @classmethod
+    def from_request(cls, request, default_limit=None):
+        params = request.query_params
+        if params.get('random', '').lower() != 'true':
+            return cls(False)
+
+        # シード未指定時は生成してレスポンスヘッダで返す（以降のページで再利用する）
+        seed = params.get('seed') or secrets.token_hex(8)
+
+        limit = params.get('limit')
+        if limit is None:
+            limit = default_limit
+        else:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ValidationError({'limit': '出題数は数値で指定してください。'})
+            if limit < 1:
+                raise ValidationError({'limit': '出題数は1以上で指定してください。'})
+        if limit is not None:
+            limit = min(limit, get_max_limit())
+        return cls(True, seed, limit)
@@ -0,0 +1,172 @@
+"""
+問題集の全文検索
+
+日本語は空白で単語が区切られないため、文字バイグラム（＋1文字検索用のユニグラム）を
+空白区切りで並べた検索用文書（Title.search_document）を作成し、
+DBごとの全文検索インデックスに載せる。
+
+- PostgreSQL: to_tsvector('simple', search_document) の GIN インデックス
+- SQLite: FTS5 仮想テーブル（quiz_title_fts）
+- その他: icontains による部分一致（フォールバック）
+
+使用するバックエンドは settings.QUIZ_SEARCH_BACKEND（ドット区切りのクラスパス）で
+上書きでき、未設定の場合は接続先DBから自動選択する。
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """NFKC正規化・小文字化した上で、文字・数字の連続（ラン）に分割する"""
+    return WORD_RE.findall(unicodedata.normalize('NFKC', text or '').lower())
+
+
+def bigrams(run):
+    if len(run) < 2:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def build_search_document(*texts):
+    """検索用文書（バイグラム列＋ユニグラム列）を作成する"""
+    runs = [run for text in texts for run in tokenize(text)]
+    grams = [gram for run in runs for gram in bigrams(run) if len(gram) == 2]
+    unigrams = sorted({char for run in runs for char in run})
+    return ' '.join(grams + unigrams)
+
+
+def build_query_terms(query):
+    """検索語をランごとのトークン列に変換（2文字以上はバイグラムのフレーズ、1文字はユニグラム）"""
+    return [bigrams(run) for run in tokenize(query)]
+
+
+class BaseSearchBackend:
+    """検索バックエンドの基底クラス"""
+
+    def search(self, queryset, query):
+        """
+        検索語に一致する行に絞り込み、関連度（search_rank、大きいほど高い）順に並べる
+        """
+        raise NotImplementedError
+
+    def index(self, title):
+        """問題集の保存時に呼ばれる（インデックスの更新）"""
+
+    def remove(self, title_id):
+        """問題集の削除時に呼ばれる（インデックスからの削除）"""
+
+    def rebuild(self, queryset):
+        """インデックスを全件再構築する"""
+        for title in queryset.iterator():
+            self.index(title)
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """部分一致検索（全文検索インデックスがないDB向けのフォールバック）"""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 による全文検索（bm25 で順位付け）"""
+    fts_table = 'quiz_title_fts'
+
+    def build_match(self, query):
+        phrases = ['"{}"'.format(' '.join(terms)) for terms in build_query_terms(query)]
+        return ' AND '.join(phrases)
+
+    def search(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return SimpleSearchBackend().search(queryset, query)
+
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s', (match,))
+        ).annotate(
+            # FTS5 の rank は bm25 の値（小さいほど関連度が高い）なので符号を反転する
+            search_rank=RawSQL(
+                f'SELECT -rank FROM {self.fts_table} WHERE {self.fts_table} MATCH %s AND rowid = {table}."id"',
+                (match,),
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created_at', '-id')
+
+    def index(self, title):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [title.pk])
+            cursor.execute(
+                f'INSERT INTO {self.fts_table} (rowid, document) VALUES (%s, %s)',
+                [title.pk, title.search_document],
+            )
+
+    def remove(self, title_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [title_id])
+
+    def rebuild(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.fts_table}')
+            cursor.executemany(
+                f'INSERT INTO {self.fts_table} (rowid, document) VALUES (%s, %s)',
+                list(queryset.values_list('pk', 'search_document').iterator()),
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL の tsvector による全文検索（ts_rank で順位付け）
+    式はマイグレーションで作成する GIN インデックス（quiz_title_search_gin）と一致させること
+    """
+    vector_sql = "to_tsvector('simple'::regconfig, COALESCE({table}.\"search_document\", ''))"
+
+    def build_tsquery(self, query):
+        phrases = []
+        for terms in build_query_terms(query):
+            phrase = ' <-> '.join("'{}'".format(term) for term in terms)
+            phrases.append(f'({phrase})')
+        return ' & '.join(phrases)
+
+    def search(self, queryset, query):
+        tsquery = self.build_tsquery(query)
+        if not tsquery:
+            return SimpleSearchBackend().search(queryset, query)
+
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        vector = self.vector_sql.format(table=table)
+        return queryset.filter(
+            RawSQL(f"{vector} @@ to_tsquery('simple'::regconfig, %s)", (tsquery,), output_field=BooleanField())
+        ).annotate(
+            # ts_rank は real（float4）を返すため、キーセットのカーソル（JSON の倍精度の値）と
+            # 比較で誤差が出ないよう double precision に揃える
+            search_rank=RawSQL(
+                f"ts_rank({vector}, to_tsquery('simple'::regconfig, %s))::double precision",
+                (tsquery,),
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created_at', '-id')
+
+
+BACKENDS_BY_VENDOR = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTSSearchBackend,
+}
+
+
+def get_search_backend():
+    """設定または接続先DBに応じた検索バックエンドを返す"""
+    backend_path = getattr(settings, 'QUIZ_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return BACKENDS_BY_VENDOR.get(connection.vendor, SimpleSearchBackend)()
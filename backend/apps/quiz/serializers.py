@@ -1,16 +1,24 @@
+from django.db import transaction
 from rest_framework import serializers
 from apps.accounts.serializers import UserSerializer
+from apps.common.dynamic_fields import DynamicFieldsMixin
+from .answer_keys import invalidate_answer_key
 from .models import Title, Question, Choice, TitleFavorite, QuestionFavorite, Rating, QuestionNote
 
 
-class ChoiceSerializer(serializers.ModelSerializer):
+class ChoiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """選択肢シリアライザ"""
     class Meta:
         model = Choice
         fields = ['id', 'text', 'is_correct', 'order']
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class ChoiceInputSerializer(ChoiceSerializer):
+    """選択肢入力用シリアライザ（更新時は既存選択肢のidを指定すると差分更新される）"""
+    id = serializers.IntegerField(required=False)
+
+
+class QuestionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """問題シリアライザ"""
     choices = ChoiceSerializer(many=True, read_only=True)
 
@@ -18,6 +26,19 @@ class QuestionSerializer(serializers.ModelSerializer):
         model = Question
         fields = ['id', 'title', 'text', 'explanation', 'question_type', 'order', 'choices', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
+        # ?expand=title で問題集をオブジェクトで出力
+        expandable_fields = {
+            'title': ('apps.quiz.serializers.TitleSerializer', {'read_only': True}),
+        }
+
+
+class QuestionWithUserStateSerializer(QuestionSerializer):
+    """問題シリアライザ（ログインユーザーのお気に入り・メモの状態付き）"""
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    has_note = serializers.BooleanField(read_only=True, default=False)
+
+    class Meta(QuestionSerializer.Meta):
+        fields = QuestionSerializer.Meta.fields + ['is_favorited', 'has_note']
 
 
 class QuestionCreateSerializer(serializers.ModelSerializer):
@@ -28,7 +49,7 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
             'blank': '問題文を入力してください。',
         }
     )
-    choices = ChoiceSerializer(
+    choices = ChoiceInputSerializer(
         many=True,
         error_messages={
             'required': '選択肢は必須です。',
@@ -59,6 +80,16 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
         if correct_count == 0:
             raise serializers.ValidationError('正解の選択肢が1つ以上必要です。')
 
+        # 既存選択肢のIDチェック（更新時のみ有効、作成時は無視）
+        choice_ids = [choice['id'] for choice in value if 'id' in choice]
+        if len(choice_ids) != len(set(choice_ids)):
+            raise serializers.ValidationError('重複した選択肢IDが含まれています。')
+        if self.instance is not None and choice_ids:
+            existing_ids = set(self.instance.choices.values_list('id', flat=True))
+            invalid_ids = set(choice_ids) - existing_ids
+            if invalid_ids:
+                raise serializers.ValidationError(f'この問題の選択肢ではないIDが含まれています: {sorted(invalid_ids)}')
+
         return value
 
     def validate(self, data):
@@ -82,76 +113,119 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         choices_data = validated_data.pop('choices')
-        question = Question.objects.create(**validated_data)
 
-        for choice_data in choices_data:
-            Choice.objects.create(question=question, **choice_data)
+        with transaction.atomic():
+            question = Question.objects.create(**validated_data)
+            Choice.objects.bulk_create([
+                Choice(question=question, **self._choice_fields(choice_data))
+                for choice_data in choices_data
+            ])
+            # bulk_create はシグナルを発行しないため解答キャッシュを明示的に破棄
+            transaction.on_commit(lambda: invalidate_answer_key(question.pk))
 
         return question
 
     def update(self, instance, validated_data):
         choices_data = validated_data.pop('choices', None)
 
-        # 問題本体を更新
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            # 問題本体を更新
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        # 選択肢を更新（全削除して再作成）
-        if choices_data is not None:
-            instance.choices.all().delete()
-            for choice_data in choices_data:
-                Choice.objects.create(question=instance, **choice_data)
+            # 選択肢を差分更新（IDを維持し、変更・追加・削除をそれぞれ1文で反映）
+            # 選択肢のシグナルは発行しないため、問題集の内容バージョンは上の instance.save()
+            # （question_saved）で1回だけ進め、解答キャッシュはコミット後に1回だけ破棄する
+            if choices_data is not None:
+                self._sync_choices(instance, choices_data)
+                transaction.on_commit(lambda: invalidate_answer_key(instance.pk))
 
         return instance
 
+    @staticmethod
+    def _choice_fields(choice_data):
+        return {key: value for key, value in choice_data.items() if key != 'id'}
 
-class TitleSerializer(serializers.ModelSerializer):
+    def _sync_choices(self, question, choices_data):
+        existing = {choice.id: choice for choice in question.choices.all()}
+        to_update = []
+        to_create = []
+        kept_ids = set()
+
+        for choice_data in choices_data:
+            choice_id = choice_data.get('id')
+            fields = self._choice_fields(choice_data)
+            if choice_id is None:
+                to_create.append(Choice(question=question, **fields))
+                continue
+
+            kept_ids.add(choice_id)
+            choice = existing[choice_id]
+            if any(getattr(choice, attr) != value for attr, value in fields.items()):
+                for attr, value in fields.items():
+                    setattr(choice, attr, value)
+                to_update.append(choice)
+
+        removed_ids = set(existing) - kept_ids
+        if removed_ids:
+            # QuerySet.delete() は Choice にシグナルの受信者があるため削除前に行を読み込み、
+            # 1行ごとに pre_delete / post_delete を発行する（post_delete の choice_changed が
+            # 1行ごとに問題集の内容バージョンを進めるUPDATEを発行する）。
+            # ここでは意図的に _raw_delete（DELETE 1文）で削除し、次の処理を省略する:
+            # - pre_delete / post_delete（choice_changed）: 内容バージョンは update() の instance.save()
+            #   （question_saved）で1回進め、解答キャッシュは update() でコミット後に1回破棄する
+            # - カスケード: 選択肢を参照するテーブルはない（QuestionChoiceUpdateTest で検証）
+            removed = Choice.objects.filter(id__in=removed_ids)
+            removed._raw_delete(removed.db)
+        if to_update:
+            Choice.objects.bulk_update(to_update, ['text', 'is_correct', 'order'])
+        if to_create:
+            Choice.objects.bulk_create(to_create)
+
+        # レスポンスで最新の選択肢を返すため、プリフェッチ済みのキャッシュを破棄
+        if hasattr(question, '_prefetched_objects_cache'):
+            question._prefetched_objects_cache.pop('choices', None)
+
+
+class TitleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """タイトルシリアライザ（一覧用）"""
     owner = UserSerializer(read_only=True)
-    questions_count = serializers.SerializerMethodField()
-    average_rating = serializers.SerializerMethodField()
+    questions_count = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Title
         fields = ['id', 'name', 'description', 'status', 'owner', 'questions_count', 'average_rating', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
+        # ?expand=questions で問題（選択肢を含む）も出力
+        expandable_fields = {
+            'questions': ('apps.quiz.serializers.QuestionSerializer', {'many': True, 'read_only': True}),
+        }
 
-    def get_questions_count(self, obj):
-        return obj.questions.count()
 
-    def get_average_rating(self, obj):
-        ratings = obj.ratings.all()
-        if ratings.exists():
-            return round(sum(r.stars for r in ratings) / ratings.count(), 1)
-        return None
+class TitleWithUserStateSerializer(TitleSerializer):
+    """タイトル一覧用シリアライザ（ログインユーザーのお気に入り・評価の状態付き）"""
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    my_rating = serializers.IntegerField(read_only=True, default=None)
 
+    class Meta(TitleSerializer.Meta):
+        fields = TitleSerializer.Meta.fields + ['is_favorited', 'my_rating']
 
-class TitleDetailSerializer(serializers.ModelSerializer):
+
+class TitleDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """タイトル詳細シリアライザ"""
     owner = UserSerializer(read_only=True)
     questions = QuestionSerializer(many=True, read_only=True)
-    questions_count = serializers.SerializerMethodField()
-    average_rating = serializers.SerializerMethodField()
-    ratings_count = serializers.SerializerMethodField()
+    questions_count = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    ratings_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Title
         fields = ['id', 'name', 'description', 'status', 'owner', 'questions', 'questions_count', 'average_rating', 'ratings_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-    def get_questions_count(self, obj):
-        return obj.questions.count()
-
-    def get_average_rating(self, obj):
-        ratings = obj.ratings.all()
-        if ratings.exists():
-            return round(sum(r.stars for r in ratings) / ratings.count(), 1)
-        return None
-
-    def get_ratings_count(self, obj):
-        return obj.ratings.count()
-
 
 class TitleCreateSerializer(serializers.ModelSerializer):
     """タイトル作成用シリアライザ"""
@@ -175,7 +249,7 @@ class TitleCreateSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'status']
 
 
-class TitleFavoriteSerializer(serializers.ModelSerializer):
+class TitleFavoriteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """問題集のお気に入りシリアライザ"""
     user = UserSerializer(read_only=True)
     title = TitleSerializer(read_only=True)
@@ -195,7 +269,7 @@ class TitleFavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class QuestionFavoriteSerializer(serializers.ModelSerializer):
+class QuestionFavoriteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """問題のお気に入りシリアライザ"""
     user = UserSerializer(read_only=True)
     question = QuestionSerializer(read_only=True)
@@ -215,7 +289,7 @@ class QuestionFavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """評価シリアライザ"""
     user = UserSerializer(read_only=True)
     title = TitleSerializer(read_only=True)
@@ -245,7 +319,7 @@ class RatingCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class QuestionNoteSerializer(serializers.ModelSerializer):
+class QuestionNoteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """問題メモシリアライザ"""
     user = UserSerializer(read_only=True)
     question = QuestionSerializer(read_only=True)
@@ -270,6 +344,28 @@ class QuestionNoteCreateSerializer(serializers.ModelSerializer):
         fields = ['id', 'note']
 
 
+def validate_answer(answer_key, selected_choice_ids):
+    """選択肢IDが解答（apps.quiz.answer_keys.AnswerKey）の問題に対して妥当かチェック"""
+    # 選択肢が当該問題のものかチェック
+    invalid_ids = set(selected_choice_ids) - answer_key.choice_ids
+    if invalid_ids:
+        raise serializers.ValidationError({
+            'selected_choice_ids': f'無効な選択肢IDが含まれています: {list(invalid_ids)}'
+        })
+
+    # 単一選択の場合は1つのみ
+    if answer_key.question_type == Question.SINGLE_CHOICE and len(selected_choice_ids) != 1:
+        raise serializers.ValidationError({
+            'selected_choice_ids': '単一選択の問題では、選択肢を1つだけ選択してください。'
+        })
+
+    # 複数選択の場合は1つ以上
+    if answer_key.question_type == Question.MULTIPLE_CHOICE and len(selected_choice_ids) < 1:
+        raise serializers.ValidationError({
+            'selected_choice_ids': '複数選択の問題では、選択肢を1つ以上選択してください。'
+        })
+
+
 class CheckAnswerSerializer(serializers.Serializer):
     """回答チェック用シリアライザ"""
     selected_choice_ids = serializers.ListField(
@@ -293,30 +389,8 @@ class CheckAnswerSerializer(serializers.Serializer):
         return value
 
     def validate(self, data):
-        """問題全体のバリデーション"""
-        question = self.context.get('question')
-        selected_choice_ids = data.get('selected_choice_ids', [])
-
-        # 選択肢が当該問題のものかチェック
-        valid_choice_ids = set(question.choices.values_list('id', flat=True))
-        invalid_ids = set(selected_choice_ids) - valid_choice_ids
-        if invalid_ids:
-            raise serializers.ValidationError({
-                'selected_choice_ids': f'無効な選択肢IDが含まれています: {list(invalid_ids)}'
-            })
-
-        # 単一選択の場合は1つのみ
-        if question.question_type == Question.SINGLE_CHOICE and len(selected_choice_ids) != 1:
-            raise serializers.ValidationError({
-                'selected_choice_ids': '単一選択の問題では、選択肢を1つだけ選択してください。'
-            })
-
-        # 複数選択の場合は1つ以上
-        if question.question_type == Question.MULTIPLE_CHOICE and len(selected_choice_ids) < 1:
-            raise serializers.ValidationError({
-                'selected_choice_ids': '複数選択の問題では、選択肢を1つ以上選択してください。'
-            })
-
+        """問題全体のバリデーション（context['answer_key'] の解答と照合）"""
+        validate_answer(self.context['answer_key'], data.get('selected_choice_ids', []))
         return data
 
 
@@ -327,3 +401,94 @@ class CheckAnswerResponseSerializer(serializers.Serializer):
     is_correct = serializers.BooleanField()
     explanation = serializers.CharField(allow_blank=True)
     correct_choice_ids = serializers.ListField(child=serializers.IntegerField())
+
+
+class BatchAnswerSerializer(CheckAnswerSerializer):
+    """一括採点の回答1件分（context['answer_keys'] の解答と照合）"""
+    question_id = serializers.IntegerField(
+        error_messages={
+            'required': '問題IDは必須です。',
+            'invalid': '問題IDは数値で入力してください。',
+        }
+    )
+
+    def validate(self, data):
+        answer_key = self.context['answer_keys'].get(data['question_id'])
+        if answer_key is None:
+            raise serializers.ValidationError({
+                'question_id': 'この問題集に含まれない問題です。'
+            })
+        validate_answer(answer_key, data.get('selected_choice_ids', []))
+        return data
+
+
+class BatchCheckAnswerSerializer(serializers.Serializer):
+    """一括採点用シリアライザ"""
+    MAX_ANSWERS = 500
+
+    answers = BatchAnswerSerializer(
+        many=True,
+        error_messages={
+            'required': '回答のリストは必須です。',
+            'null': '回答のリストを入力してください。',
+            'not_a_list': '回答はリスト形式で入力してください。',
+        }
+    )
+
+    def validate_answers(self, value):
+        if not value:
+            raise serializers.ValidationError('回答を1つ以上入力してください。')
+        if len(value) > self.MAX_ANSWERS:
+            raise serializers.ValidationError(f'一度に採点できる回答は{self.MAX_ANSWERS}件までです。')
+
+        question_ids = [answer['question_id'] for answer in value]
+        if len(question_ids) != len(set(question_ids)):
+            raise serializers.ValidationError('重複した問題IDが含まれています。')
+        return value
+
+
+class BatchCheckAnswerResponseSerializer(serializers.Serializer):
+    """一括採点結果シリアライザ"""
+    title_id = serializers.IntegerField()
+    total = serializers.IntegerField()
+    correct_count = serializers.IntegerField()
+    score = serializers.FloatField()
+    results = CheckAnswerResponseSerializer(many=True)
+
+
+class ReorderSerializer(serializers.Serializer):
+    """問題・選択肢の並べ替え用シリアライザ"""
+    question_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        error_messages={
+            'not_a_list': '問題IDはリスト形式で入力してください。',
+        }
+    )
+    choices = serializers.DictField(
+        child=serializers.ListField(child=serializers.IntegerField()),
+        required=False,
+        error_messages={
+            'not_a_dict': '選択肢の並びは問題IDをキーとするオブジェクトで入力してください。',
+        }
+    )
+
+    def validate_question_ids(self, value):
+        if len(value) != len(set(value)):
+            raise serializers.ValidationError('重複した問題IDが含まれています。')
+        return value
+
+    def validate_choices(self, value):
+        choices = {}
+        for question_id, choice_ids in value.items():
+            if not str(question_id).isdigit():
+                raise serializers.ValidationError('選択肢の並びのキーは問題IDで指定してください。')
+            if len(choice_ids) != len(set(choice_ids)):
+                raise serializers.ValidationError('重複した選択肢IDが含まれています。')
+            choices[int(question_id)] = choice_ids
+        return choices
+
+    def validate(self, data):
+        if not data.get('question_ids') and not data.get('choices'):
+            raise serializers.ValidationError('question_ids または choices を指定してください。')
+        return data
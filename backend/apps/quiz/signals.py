@@ -0,0 +1,155 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest, Now
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Title, TitleDeletion, Question, Choice, Rating, TitleFavorite, QuestionFavorite, QuestionNote
+from .search import get_search_backend
+from .sampling import invalidate_title_question_ids
+from .answer_keys import invalidate_answer_key, invalidate_title_owner
+from .snapshots import schedule_title_snapshot, schedule_question_title_snapshot
+from .user_state import touch_user_state
+
+
+def adjust_title_counters(title_id, **deltas):
+    """
+    Titleの集計カラムを F() で原子的に加減算する
+    例: adjust_title_counters(1, questions_count=1)
+    """
+    # 減算時は整合性が崩れていても負数にならないよう0で下限を設ける
+    updates = {
+        field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items() if delta
+    }
+    if 'content_version' in updates:
+        updates['content_updated_at'] = Now()
+        schedule_title_snapshot(title_id)
+    if updates:
+        Title.objects.filter(pk=title_id).update(**updates)
+
+
+def touch_title(title_id):
+    """問題集の内容バージョンを進める（ETag / Last-Modified の更新）"""
+    adjust_title_counters(title_id, content_version=1)
+
+
+def deleted_with(origin, *models):
+    """
+    削除の起点（post_delete の origin: インスタンスまたはクエリセット）が models のいずれかか
+    親と一緒にカスケード削除される行は、親の削除時にまとめて反映する（1行ごとに更新しない）
+    """
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+def touch_question_title(question_id):
+    """問題が属する問題集の内容バージョンを進める"""
+    Title.objects.filter(questions__id=question_id).update(
+        content_version=F('content_version') + 1, content_updated_at=Now()
+    )
+    schedule_question_title_snapshot(question_id)
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    問題作成時に問題数を加算し、ランダム出題用のID一覧と採点用の解答キャッシュを破棄
+    表示順が明示指定された場合に備えて採番カウンタも追従させる
+    """
+    if raw:
+        return
+    adjust_title_counters(instance.title_id, questions_count=1 if created else 0, content_version=1)
+    Title.reserve_question_order(instance.title_id, instance.order)
+    invalidate_title_question_ids(instance.title_id)
+    invalidate_answer_key(instance.pk)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, origin=None, **kwargs):
+    """問題削除時に問題数を減算し、ランダム出題用のID一覧と採点用の解答キャッシュを破棄"""
+    # 問題集ごと削除する場合、削除される問題集の集計は更新しない
+    if not deleted_with(origin, Title):
+        adjust_title_counters(instance.title_id, questions_count=-1, content_version=1)
+    invalidate_title_question_ids(instance.title_id)
+    invalidate_answer_key(instance.pk)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, raw=False, origin=None, **kwargs):
+    """選択肢の変更時に採点用の解答キャッシュを破棄し、問題集の内容バージョンを進める"""
+    # 問題・問題集と一緒に削除される場合は、問題の削除時の処理で反映される
+    if not raw and not deleted_with(origin, Question, Title):
+        invalidate_answer_key(instance.question_id)
+        touch_question_title(instance.question_id)
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    """評価の作成・更新時に評価数と評価合計を更新"""
+    if raw:
+        return
+    if created:
+        adjust_title_counters(instance.title_id, ratings_count=1, ratings_sum=instance.stars, content_version=1)
+    else:
+        loaded_stars = getattr(instance, '_loaded_stars', None)
+        if loaded_stars is not None and instance.stars != loaded_stars:
+            adjust_title_counters(instance.title_id, ratings_sum=instance.stars - loaded_stars, content_version=1)
+    instance._loaded_stars = instance.stars
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, origin=None, **kwargs):
+    """評価削除時に評価数と評価合計を減算"""
+    if deleted_with(origin, Title):
+        return
+    stars = getattr(instance, '_loaded_stars', None)
+    if stars is None:
+        stars = instance.stars
+    adjust_title_counters(instance.title_id, ratings_count=-1, ratings_sum=-stars, content_version=1)
+
+
+@receiver(post_save, sender=Title)
+def title_saved(sender, instance, created, raw=False, **kwargs):
+    """問題集の保存時に検索インデックスを更新し、所有者のキャッシュを破棄（管理画面での変更に備える）"""
+    if not raw:
+        get_search_backend().index(instance)
+        invalidate_title_owner(instance.pk)
+        if created:
+            if instance.status == Title.PUBLIC:
+                schedule_title_snapshot(instance.pk)
+        else:
+            touch_title(instance.pk)
+
+
+@receiver(post_delete, sender=Title)
+def title_deleted(sender, instance, **kwargs):
+    """問題集の削除時に検索インデックスから除外し、所有者のキャッシュを破棄して、一覧の条件付きGET用に削除を記録"""
+    get_search_backend().remove(instance.pk)
+    invalidate_title_owner(instance.pk)
+    TitleDeletion.objects.create(title_id=instance.pk)
+
+
+@receiver(post_save, sender=TitleFavorite)
+@receiver(post_delete, sender=TitleFavorite)
+@receiver(post_save, sender=QuestionFavorite)
+@receiver(post_delete, sender=QuestionFavorite)
+@receiver(post_save, sender=QuestionNote)
+@receiver(post_delete, sender=QuestionNote)
+def user_state_changed(sender, instance, raw=False, **kwargs):
+    """お気に入り・メモの変更時に、一覧に付与するユーザーの状態の更新日時を進める（評価は内容バージョンで反映）"""
+    if not raw:
+        touch_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def owner_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """所有者のユーザー情報（問題集のレスポンスに含まれる）の変更時に内容バージョンを進める"""
+    if raw or created:
+        return
+    # last_login のみの更新など、レスポンスに含まれない項目の保存では進めない
+    if update_fields is not None and not {'username', 'email', 'image'} & set(update_fields):
+        return
+    titles = Title.objects.filter(owner=instance)
+    titles.update(content_version=F('content_version') + 1, content_updated_at=Now())
+    for title_id in titles.filter(status=Title.PUBLIC).values_list('id', flat=True):
+        schedule_title_snapshot(title_id)
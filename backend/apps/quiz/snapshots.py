@@ -0,0 +1,128 @@
+"""
+公開問題集のスナップショット
+
+問題集の公開時・公開後の編集時（内容バージョンが進んだトランザクションのコミット後）に、
+詳細レスポンスを JSONRenderer と同じバイト列にコンパイルし、gzip圧縮して TitleSnapshot に保存する。
+所有者以外による公開問題集の詳細・問題一覧の取得は、このドキュメントを
+TitleSnapshot の1テーブルへの1クエリ（JOINなし）で読み込んで返す。
+クライアントが gzip を受け付ける場合は圧縮済みのバイト列をそのまま返す。
+
+スナップショットは問題集の内容バージョンが一致する場合のみ使用するため、
+コンパイル前・非公開化の直後などは通常どおりライブの内容を返す。
+"""
+import gzip
+import hashlib
+import json
+import logging
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Subquery
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from apps.common.renderers import FastJSONRenderer
+from .models import Title, Question, TitleSnapshot
+from .optimizers import prefetch_objects
+from .serializers import TitleDetailSerializer
+
+logger = logging.getLogger(__name__)
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def snapshots_enabled():
+    return getattr(settings, 'QUIZ_TITLE_SNAPSHOTS', True)
+
+
+def render_title_document(title):
+    """詳細レスポンスと同じJSONのバイト列を作成"""
+    prefetch_objects([title], TitleDetailSerializer)
+    return FastJSONRenderer().render(TitleDetailSerializer(title).data)
+
+
+def compile_title_snapshot(title_id):
+    """
+    公開中の問題集のスナップショットを作成・更新する（非公開の場合は削除）
+    すでに最新の内容バージョンでコンパイル済みであれば何もしない
+    """
+    title = Title.objects.select_related('owner').filter(pk=title_id).first()
+    if title is None or title.status != Title.PUBLIC:
+        TitleSnapshot.objects.filter(title_id=title_id).delete()
+        return None
+
+    compiled_version = TitleSnapshot.objects.filter(title_id=title_id).values_list(
+        'content_version', flat=True
+    ).first()
+    if compiled_version == title.content_version:
+        return None
+
+    content = render_title_document(title)
+    defaults = {
+        'owner_id': title.owner_id,
+        'content_version': title.content_version,
+        'content_updated_at': title.content_updated_at,
+        'content_hash': hashlib.sha256(content).hexdigest(),
+        'document': gzip.compress(content, mtime=0),
+    }
+    try:
+        with transaction.atomic():
+            snapshot, _ = TitleSnapshot.objects.update_or_create(title_id=title_id, defaults=defaults)
+    except IntegrityError:
+        # 同時に作成された場合は、先に作成した側のスナップショットを使う
+        return None
+    return snapshot
+
+
+def compile_title_snapshot_safely(title_id):
+    """コミット後の処理から呼ばれるため、失敗してもレスポンスには影響させない"""
+    try:
+        compile_title_snapshot(title_id)
+    except Exception:
+        logger.exception('問題集 %s のスナップショットの作成に失敗しました。', title_id)
+
+
+def schedule_title_snapshot(title_id):
+    """コミット後にスナップショットを再コンパイルする"""
+    if snapshots_enabled():
+        transaction.on_commit(lambda: compile_title_snapshot_safely(title_id))
+
+
+def schedule_question_title_snapshot(question_id):
+    """問題が属する問題集のスナップショットをコミット後に再コンパイルする"""
+    if not snapshots_enabled():
+        return
+
+    def compile_snapshot():
+        title_id = Question.objects.filter(pk=question_id).values_list('title_id', flat=True).first()
+        if title_id is not None:
+            compile_title_snapshot_safely(title_id)
+
+    transaction.on_commit(compile_snapshot)
+
+
+def get_current_snapshot(title_id):
+    """
+    内容バージョンが最新のスナップショットを取得（なければ・公開中でなければNone）
+    バージョン・公開状態の照合はサブクエリで行い、JOINなしの1クエリで済ませる
+    """
+    current_version = Title.objects.filter(pk=title_id, status=Title.PUBLIC).values('content_version')
+    return TitleSnapshot.objects.filter(
+        title_id=title_id, content_version=Subquery(current_version)
+    ).first()
+
+
+def load_document(snapshot):
+    """スナップショットのドキュメントを展開して読み込む"""
+    return json.loads(gzip.decompress(bytes(snapshot.document)))
+
+
+def document_response(snapshot, request):
+    """ドキュメントのバイト列をそのまま返す（gzip を受け付けるクライアントには圧縮したまま返す）"""
+    if ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response = HttpResponse(bytes(snapshot.document), content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(bytes(snapshot.document)), content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -1,7 +1,16 @@
-from django.test import TestCase
+import json
+from unittest import mock, skipUnless
+from io import StringIO
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from apps.accounts.models import CustomUser
+from apps.common.query_budget import QueryBudgetTestMixin
 from .models import Title, Question, Choice, TitleFavorite, QuestionFavorite, Rating, QuestionNote
 
 
@@ -223,8 +232,9 @@ class CheckAnswerAPITest(APITestCase):
     """回答採点APIのテスト"""
 
     def setUp(self):
-        self.user = CustomUser.objects.create_user(username='testuser', password='testpass')
-        self.other_user = CustomUser.objects.create_user(username='otheruser', password='testpass')
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', email='other@example.com', password='testpass')
 
         # 公開タイトル（単一選択）
         self.public_title = Title.objects.create(
@@ -409,3 +419,2235 @@ class CheckAnswerAPITest(APITestCase):
         response = self.client.post(f'/api/quiz/questions/{self.single_question.id}/check/', data, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_warm_check_reads_only_title_access(self):
+        """解答キャッシュが温まっていれば、採点のDBクエリは問題集のアクセス情報の1件のみ"""
+        self.client.force_authenticate(user=self.user)
+        url = f'/api/quiz/questions/{self.single_question.id}/check/'
+        data = {'selected_choice_ids': [self.single_choice1.id]}
+        self.client.post(url, data, format='json')
+
+        with self.assertNumQueries(1):
+            response = self.client.post(url, data, format='json')
+        self.assertTrue(response.data['is_correct'])
+        self.assertEqual(response.data['correct_choice_ids'], [self.single_choice1.id])
+
+    def test_check_reflects_choice_and_status_changes(self):
+        """選択肢や公開状態の変更後はキャッシュが破棄される"""
+        self.client.force_authenticate(user=self.user)
+        url = f'/api/quiz/questions/{self.single_question.id}/check/'
+        self.client.post(url, {'selected_choice_ids': [self.single_choice1.id]}, format='json')
+
+        Choice.objects.filter(pk=self.single_choice1.pk).update(is_correct=False)
+        self.single_choice2.is_correct = True
+        self.single_choice2.save()
+        response = self.client.post(url, {'selected_choice_ids': [self.single_choice2.id]}, format='json')
+        self.assertTrue(response.data['is_correct'])
+
+        self.public_title.status = Title.PRIVATE
+        self.public_title.save()
+        response = self.client.post(url, {'selected_choice_ids': [self.single_choice2.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_check_ignores_answer_key_cached_by_other_worker(self):
+        """他のワーカーで変更された（キャッシュが破棄されていない）場合も、内容バージョンの照合で新しい解答・公開状態で採点する"""
+        self.client.force_authenticate(user=self.user)
+        url = f'/api/quiz/questions/{self.single_question.id}/check/'
+        self.client.post(url, {'selected_choice_ids': [self.single_choice1.id]}, format='json')
+
+        # キャッシュを破棄しない（このプロセスのキャッシュには古い解答が残る）
+        with mock.patch('apps.quiz.signals.invalidate_answer_key'):
+            Choice.objects.filter(pk=self.single_choice1.pk).update(is_correct=False)
+            self.single_choice2.is_correct = True
+            self.single_choice2.save()
+        response = self.client.post(url, {'selected_choice_ids': [self.single_choice2.id]}, format='json')
+        self.assertTrue(response.data['is_correct'])
+
+        # シグナルを経由しない公開状態の変更も反映される
+        Title.objects.filter(pk=self.public_title.pk).update(status=Title.PRIVATE)
+        response = self.client.post(url, {'selected_choice_ids': [self.single_choice2.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_check_missing_question(self):
+        """存在しない問題は404"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/quiz/questions/99999/check/', {'selected_choice_ids': [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TitleCounterTest(TestCase):
+    """問題集の集計カラムのテスト"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', email='other@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PUBLIC)
+
+    def test_questions_count_follows_create_and_delete(self):
+        """問題の作成・削除で問題数が更新される"""
+        question = Question.objects.create(title=self.title, text='問題1')
+        Question.objects.create(title=self.title, text='問題2')
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.questions_count, 2)
+
+        question.delete()
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.questions_count, 1)
+
+    def test_rating_counters_follow_create_update_delete(self):
+        """評価の作成・更新・削除で評価数と平均評価が更新される"""
+        rating = Rating.objects.create(user=self.user, title=self.title, stars=5)
+        Rating.objects.create(user=self.other_user, title=self.title, stars=2)
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.ratings_count, 2)
+        self.assertEqual(self.title.average_rating, 3.5)
+
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.stars = 3
+        rating.save()
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.ratings_sum, 5)
+
+        rating.delete()
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.ratings_count, 1)
+        self.assertEqual(self.title.average_rating, 2.0)
+
+    def test_recount_command_repairs_counters(self):
+        """再計算コマンドで集計値が修復される"""
+        from django.core.management import call_command
+
+        Question.objects.create(title=self.title, text='問題1')
+        Rating.objects.create(user=self.user, title=self.title, stars=4)
+        Title.objects.filter(pk=self.title.pk).update(questions_count=0, ratings_count=0, ratings_sum=0)
+
+        call_command('recount_title_stats', stdout=StringIO())
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.questions_count, 1)
+        self.assertEqual(self.title.ratings_count, 1)
+        self.assertEqual(self.title.average_rating, 4.0)
+
+
+@override_settings(QUIZ_TITLE_SNAPSHOTS=False)
+class TitleQueryCountTest(APITestCase):
+    """問題集APIの発行クエリ数のテスト（ライブの内容から組み立てる経路）"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='公開タイトル', owner=self.user, status=Title.PUBLIC)
+
+    def add_questions(self, count):
+        for i in range(count):
+            question = Question.objects.create(title=self.title, text=f'問題{i}', order=i + 1)
+            Choice.objects.create(question=question, text='正解', is_correct=True, order=1)
+            Choice.objects.create(question=question, text='不正解', is_correct=False, order=2)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_retrieve_and_questions_do_not_scale_with_questions(self):
+        """詳細取得と問題一覧のクエリ数が問題数に依存しない"""
+        self.add_questions(2)
+        retrieve_small = self.count_queries(f'/api/quiz/titles/{self.title.id}/')
+        questions_small = self.count_queries(f'/api/quiz/titles/{self.title.id}/questions/')
+
+        self.add_questions(20)
+        self.assertEqual(self.count_queries(f'/api/quiz/titles/{self.title.id}/'), retrieve_small)
+        self.assertEqual(self.count_queries(f'/api/quiz/titles/{self.title.id}/questions/'), questions_small)
+        self.assertLessEqual(retrieve_small, 3)
+
+    def test_list_does_not_scale_with_titles(self):
+        """一覧取得のクエリ数が問題集の件数に依存しない"""
+        small = self.count_queries('/api/quiz/titles/')
+        for i in range(15):
+            owner = CustomUser.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='testpass')
+            Title.objects.create(name=f'タイトル{i}', owner=owner, status=Title.PUBLIC)
+        self.assertEqual(self.count_queries('/api/quiz/titles/'), small)
+
+
+class UserListQueryCountTest(APITestCase):
+    """お気に入り・評価・メモ一覧の発行クエリ数のテスト（ユーザーあたり1,000件）"""
+
+    LIST_URLS = [
+        '/api/quiz/favorites/titles/',
+        '/api/quiz/favorites/questions/',
+        '/api/quiz/ratings/',
+        '/api/quiz/notes/',
+    ]
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.owner = CustomUser.objects.create_user(username='owner', email='owner@example.com', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.created = 0
+
+    def add_rows(self, count):
+        """各一覧の対象を count 件ずつ追加（問題集ごとに問題1件・選択肢2件）"""
+        start = self.created
+        titles = Title.objects.bulk_create([
+            Title(name=f'タイトル{i}', owner=self.owner, status=Title.PUBLIC)
+            for i in range(start, start + count)
+        ])
+        questions = Question.objects.bulk_create([
+            Question(title=title, text=f'問題{i}', order=1)
+            for i, title in enumerate(titles, start)
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=question, text=text, is_correct=is_correct, order=order)
+            for question in questions
+            for order, (text, is_correct) in enumerate([('正解', True), ('不正解', False)], 1)
+        ])
+        TitleFavorite.objects.bulk_create([TitleFavorite(user=self.user, title=title) for title in titles])
+        QuestionFavorite.objects.bulk_create([QuestionFavorite(user=self.user, question=q) for q in questions])
+        Rating.objects.bulk_create([Rating(user=self.user, title=title, stars=4) for title in titles])
+        QuestionNote.objects.bulk_create([QuestionNote(user=self.user, question=q, note='メモ') for q in questions])
+        self.created += count
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'page_size': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), len(response.data['results'])
+
+    def test_lists_do_not_scale_with_rows(self):
+        """1,000件でも数件の場合と同じクエリ数で一覧を返す"""
+        self.add_rows(3)
+        small = {url: self.count_queries(url)[0] for url in self.LIST_URLS}
+
+        self.add_rows(997)
+        for url in self.LIST_URLS:
+            queries, results = self.count_queries(url)
+            self.assertEqual(results, 50)
+            self.assertEqual(queries, small[url], url)
+            self.assertLessEqual(queries, 3, url)
+
+
+class KeysetPaginationTest(APITestCase):
+    """キーセットページネーションのテスト"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.titles = [
+            Title.objects.create(name=f'タイトル{i}', owner=self.user, status=Title.PUBLIC)
+            for i in range(25)
+        ]
+        # 作成日時が同一の行があってもページ境界で欠落しないこと
+        Title.objects.filter(pk__in=[t.pk for t in self.titles[5:15]]).update(created_at=self.titles[5].created_at)
+
+    def test_walk_all_pages_with_cursor(self):
+        """カーソルを辿ると全件を重複・欠落なく取得できる"""
+        seen = []
+        url = '/api/quiz/titles/?pagination=cursor&page_size=10'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in context.captured_queries))
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), {t.id for t in self.titles})
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_search_with_cursor_keeps_relevance_order(self):
+        """検索とカーソルを併用しても関連度順のまま重複・欠落なく取得できる"""
+        for i, title in enumerate(self.titles):
+            # 関連度が行ごとに異なり、作成日時の順と一致しないようにする
+            title.description = ' '.join(['ネットワーク'] * (i % 4)) or 'その他'
+            title.save()
+
+        expected = [
+            item['id'] for item in
+            self.client.get('/api/quiz/titles/', {'search': 'ネットワーク', 'page_size': 50}).data['results']
+        ]
+        self.assertGreater(len(expected), 10)
+
+        seen = self.walk('/api/quiz/titles/?' + urlencode({'search': 'ネットワーク', 'pagination': 'cursor', 'page_size': 10}))
+        self.assertEqual(seen, expected)
+
+    def assert_search_walk_matches_page_order(self, keyword):
+        expected = [
+            item['id'] for item in
+            self.client.get('/api/quiz/titles/', {'search': keyword, 'page_size': 50}).data['results']
+        ]
+        seen = self.walk('/api/quiz/titles/?' + urlencode({'search': keyword, 'pagination': 'cursor', 'page_size': 10}))
+        self.assertEqual(seen, expected)
+        return seen
+
+    def test_search_with_cursor_and_tied_ranks(self):
+        """関連度が同じ行がページ境界をまたいでも重複・欠落しない"""
+        for title in self.titles:
+            title.description = 'ネットワーク'
+            title.save()
+
+        seen = self.assert_search_walk_matches_page_order('ネットワーク')
+        self.assertEqual(sorted(seen), sorted(t.id for t in self.titles))
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL の全文検索（ts_rank）の経路')
+    def test_postgres_search_with_cursor_and_tied_ranks(self):
+        """ts_rank（float4）の関連度でも、同じ関連度の行がページ境界で重複・欠落しない"""
+        with override_settings(QUIZ_SEARCH_BACKEND='apps.quiz.search.PostgresSearchBackend'):
+            self.test_search_with_cursor_and_tied_ranks()
+
+    def test_cursor_from_other_ordering_is_invalid(self):
+        """検索なしの一覧で発行したカーソルは検索時には使えない"""
+        next_url = self.client.get('/api/quiz/titles/?pagination=cursor&page_size=10').data['next']
+        response = self.client.get(next_url + '&' + urlencode({'search': 'タイトル'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_cursor(self):
+        """改ざんされたカーソルは404"""
+        response = self.client.get('/api/quiz/titles/?cursor=invalid')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_is_default(self):
+        """パラメータ未指定時は従来のページ番号方式"""
+        response = self.client.get('/api/quiz/titles/')
+        self.assertEqual(response.data['count'], 25)
+
+
+class TitleSearchTest(APITestCase):
+    """問題集の全文検索のテスト"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.network = Title.objects.create(
+            name='ネットワーク基礎', description='TCP/IPとルーティング', owner=self.user, status=Title.PUBLIC
+        )
+        self.database = Title.objects.create(
+            name='データベース入門', description='SQLとネットワーク越しの接続', owner=self.user, status=Title.PUBLIC
+        )
+        self.aws = Title.objects.create(name='AWS認定試験対策', owner=self.user, status=Title.PUBLIC)
+
+    def search(self, keyword):
+        response = self.client.get('/api/quiz/titles/', {'search': keyword})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_japanese_bigrams(self):
+        """日本語の語句で検索でき、タイトル名一致が上位に来る"""
+        self.assertEqual(self.search('ネットワーク'), [self.network.id, self.database.id])
+        self.assertEqual(self.search('入門'), [self.database.id])
+        self.assertEqual(self.search('ワークネット'), [])
+
+    def test_search_single_char_and_ascii(self):
+        """1文字検索と英字の大文字小文字を無視した検索"""
+        self.assertEqual(self.search('aws'), [self.aws.id])
+        self.assertIn(self.database.id, self.search('門'))
+
+    def test_index_follows_update_and_delete(self):
+        """保存・削除で検索インデックスが更新される"""
+        self.aws.name = 'クラウド設計'
+        self.aws.save()
+        self.assertEqual(self.search('AWS'), [])
+        self.assertEqual(self.search('クラウド'), [self.aws.id])
+
+        self.aws.delete()
+        self.assertEqual(self.search('クラウド'), [])
+
+    def test_rebuild_command(self):
+        """再構築コマンドで検索インデックスが復元される"""
+        from django.core.management import call_command
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('ルーティング'), [self.network.id])
+
+
+class RandomSamplingTest(APITestCase):
+    """ランダム出題（シード付きサンプリング）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='公開タイトル', owner=self.user, status=Title.PUBLIC)
+        self.questions = [
+            Question.objects.create(title=self.title, text=f'問題{i}', order=i + 1)
+            for i in range(30)
+        ]
+
+    def get_ids(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('RANDOM()' in q['sql'] for q in context.captured_queries))
+        results = response.data['results'] if 'results' in response.data else response.data
+        return [item['id'] for item in results], response
+
+    def test_title_questions_same_seed_same_order(self):
+        """同じシードなら同じ順序、limitで出題数を絞れる"""
+        url = f'/api/quiz/titles/{self.title.id}/questions/'
+        first, response = self.get_ids(url, {'random': 'true', 'seed': 'abc', 'limit': 10})
+        second, _ = self.get_ids(url, {'random': 'true', 'seed': 'abc', 'limit': 10})
+        other, _ = self.get_ids(url, {'random': 'true', 'seed': 'xyz', 'limit': 10})
+
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(response['X-Random-Seed'], 'abc')
+
+    def test_title_questions_generates_seed(self):
+        """シード未指定時は生成したシードを返し、それで再現できる"""
+        url = f'/api/quiz/titles/{self.title.id}/questions/'
+        first, response = self.get_ids(url, {'random': 'true'})
+        self.assertEqual(sorted(first), [q.id for q in self.questions])
+        again, _ = self.get_ids(url, {'random': 'true', 'seed': response['X-Random-Seed']})
+        self.assertEqual(first, again)
+
+    def test_question_list_pages_are_stable(self):
+        """問題一覧のランダムモードはページをまたいで重複しない"""
+        params = {'random': 'true', 'seed': 's1', 'limit': 20, 'page_size': 10}
+        page1, _ = self.get_ids('/api/quiz/questions/', params)
+        page2, _ = self.get_ids('/api/quiz/questions/', {**params, 'page': 2})
+        page1_again, _ = self.get_ids('/api/quiz/questions/', params)
+
+        self.assertEqual(page1, page1_again)
+        self.assertEqual(len(set(page1) | set(page2)), 20)
+
+    def test_question_list_samples_without_loading_all_ids(self):
+        """候補が多い場合は全件のIDを読み込まずに選び、欠番があっても limit 件揃う"""
+        extra = Question.objects.bulk_create([
+            Question(title=self.title, text=f'追加{i}', order=100 + i) for i in range(270)
+        ])
+        Question.objects.filter(id__in=[q.id for q in extra[::2]]).delete()
+
+        params = {'random': 'true', 'seed': 's1', 'limit': 5}
+        with mock.patch('apps.quiz.sampling.sample_all_queryset_ids', side_effect=AssertionError):
+            first, _ = self.get_ids('/api/quiz/questions/', params)
+            again, _ = self.get_ids('/api/quiz/questions/', params)
+
+        self.assertEqual(first, again)
+        self.assertEqual(len(set(first)), 5)
+        self.assertEqual(Question.objects.filter(id__in=first).count(), 5)
+
+    def test_sample_max_limit_over_sparse_range_batches_probes(self):
+        """limit が上限でも、存在を確かめる値は1クエリあたり SAMPLE_PROBE_BATCH_SIZE 件までに分ける"""
+        import re
+        from .sampling import SAMPLE_PROBE_BATCH_SIZE, get_max_limit, sample_queryset_ids
+
+        limit = get_max_limit()
+        extra = Question.objects.bulk_create([
+            Question(title=self.title, text=f'追加{i}', order=100 + i) for i in range(limit * 12)
+        ])
+        Question.objects.filter(id__in=[q.id for i, q in enumerate(extra) if i % 4]).delete()
+
+        queryset = Question.objects.all()
+        with mock.patch('apps.quiz.sampling.sample_all_queryset_ids', side_effect=AssertionError):
+            with CaptureQueriesContext(connection) as context:
+                first = sample_queryset_ids(queryset, 's1', limit)
+            again = sample_queryset_ids(queryset, 's1', limit)
+
+        self.assertEqual(first, again)
+        self.assertEqual(len(set(first)), limit)
+        self.assertEqual(Question.objects.filter(id__in=first).count(), limit)
+        probe_sizes = [
+            len(match.group(1).split(','))
+            for query in context.captured_queries
+            for match in re.finditer(r'"id" IN \(([^)]*)\)', query['sql'])
+        ]
+        self.assertGreater(len(probe_sizes), 1)
+        self.assertLessEqual(max(probe_sizes), SAMPLE_PROBE_BATCH_SIZE)
+
+    def test_question_list_cursor_keeps_random_order(self):
+        """ランダムモードとカーソルを併用すると、生成したシードを引き継いで選んだ順序のまま続きを返す"""
+        first, response = self.get_ids('/api/quiz/questions/', {'random': 'true', 'limit': 20, 'page_size': 10})
+        seed = response['X-Random-Seed']
+
+        seen = []
+        url = '/api/quiz/questions/?random=true&limit=20&pagination=cursor&page_size=10&seed=' + seed
+        while url:
+            ids, response = self.get_ids(url, {})
+            seen.extend(ids)
+            url = response.data['next']
+            if url:
+                self.assertIn(f'seed={seed}', url)
+
+        self.assertEqual(seen[:10], first)
+        self.assertEqual(len(seen), 20)
+        self.assertEqual(len(set(seen)), 20)
+
+    def test_invalid_limit(self):
+        """不正なlimitは400"""
+        response = self.client.get(f'/api/quiz/titles/{self.title.id}/questions/', {'random': 'true', 'limit': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchCheckAnswerAPITest(APITestCase):
+    """一括採点APIのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.owner = CustomUser.objects.create_user(username='owner', email='owner@example.com', password='testpass')
+        self.title = Title.objects.create(name='公開タイトル', owner=self.owner, status=Title.PUBLIC)
+        self.other_title = Title.objects.create(name='別タイトル', owner=self.owner, status=Title.PUBLIC)
+        self.url = f'/api/quiz/titles/{self.title.id}/check/'
+        self.questions = [self.create_question(self.title, i) for i in range(3)]
+
+    def create_question(self, title, index):
+        question = Question.objects.create(title=title, text=f'問題{index}', explanation=f'解説{index}', order=index + 1)
+        correct = Choice.objects.create(question=question, text='正解', is_correct=True, order=1)
+        wrong = Choice.objects.create(question=question, text='不正解', is_correct=False, order=2)
+        return question, correct, wrong
+
+    def test_batch_check_scores_all_answers(self):
+        """全回答を採点し、問題ごとの結果と合計を返す"""
+        self.client.force_authenticate(user=self.user)
+        answers = [
+            {'question_id': self.questions[0][0].id, 'selected_choice_ids': [self.questions[0][1].id]},
+            {'question_id': self.questions[1][0].id, 'selected_choice_ids': [self.questions[1][2].id]},
+            {'question_id': self.questions[2][0].id, 'selected_choice_ids': [self.questions[2][1].id]},
+        ]
+        response = self.client.post(self.url, {'answers': answers}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['correct_count'], 2)
+        self.assertEqual(response.data['score'], 66.7)
+        self.assertEqual([r['is_correct'] for r in response.data['results']], [True, False, True])
+        self.assertEqual(response.data['results'][1]['correct_choice_ids'], [self.questions[1][1].id])
+
+    def test_batch_check_query_count_is_constant(self):
+        """問題数に関わらず一定のクエリ数で採点する"""
+        self.client.force_authenticate(user=self.user)
+        questions = self.questions + [self.create_question(self.title, i) for i in range(3, 30)]
+        cache.clear()
+        answers = [
+            {'question_id': question.id, 'selected_choice_ids': [correct.id]}
+            for question, correct, _ in questions
+        ]
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, {'answers': answers}, format='json')
+        self.assertEqual(response.data['correct_count'], 30)
+
+        with self.assertNumQueries(1):
+            self.client.post(self.url, {'answers': answers}, format='json')
+
+    def test_batch_check_rejects_other_title_question(self):
+        """他の問題集の問題や重複した問題は400"""
+        self.client.force_authenticate(user=self.user)
+        other_question, other_correct, _ = self.create_question(self.other_title, 0)
+        response = self.client.post(self.url, {'answers': [
+            {'question_id': other_question.id, 'selected_choice_ids': [other_correct.id]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('answers', response.data)
+
+        question, correct, _ = self.questions[0]
+        answer = {'question_id': question.id, 'selected_choice_ids': [correct.id]}
+        response = self.client.post(self.url, {'answers': [answer, answer]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_check_private_title_by_non_owner(self):
+        """非公開の問題集は所有者以外採点できない"""
+        self.title.status = Title.PRIVATE
+        self.title.save()
+        self.client.force_authenticate(user=self.user)
+        question, correct, _ = self.questions[0]
+        response = self.client.post(self.url, {'answers': [
+            {'question_id': question.id, 'selected_choice_ids': [correct.id]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QuestionChoiceUpdateTest(APITestCase):
+    """選択肢の差分更新のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PRIVATE)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/quiz/questions/', {
+            'title_id': self.title.id,
+            'text': 'テスト問題',
+            'question_type': 'single',
+            'choices': [
+                {'text': 'A', 'is_correct': True, 'order': 1},
+                {'text': 'B', 'is_correct': False, 'order': 2},
+                {'text': 'C', 'is_correct': False, 'order': 3},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.question = Question.objects.get(pk=response.data['id'])
+        self.a, self.b, self.c = self.question.choices.all()
+
+    def test_update_keeps_ids_and_applies_diff(self):
+        """既存IDは維持され、変更・追加・削除が反映される"""
+        response = self.client.patch(f'/api/quiz/questions/{self.question.id}/', {
+            'question_type': 'single',
+            'choices': [
+                {'id': self.a.id, 'text': 'A', 'is_correct': False, 'order': 1},
+                {'id': self.b.id, 'text': 'B（改）', 'is_correct': True, 'order': 2},
+                {'text': 'D', 'is_correct': False, 'order': 3},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        choices = list(self.question.choices.all())
+        self.assertEqual([c.text for c in choices], ['A', 'B（改）', 'D'])
+        self.assertEqual(choices[0].id, self.a.id)
+        self.assertEqual(choices[1].id, self.b.id)
+        self.assertTrue(choices[1].is_correct)
+        self.assertFalse(Choice.objects.filter(pk=self.c.pk).exists())
+        self.assertEqual([c['id'] for c in response.data['choices']], [c.id for c in choices])
+
+    def update_with_queries(self, question, choices):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/quiz/questions/{question.id}/', {
+                'question_type': 'single', 'choices': choices,
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_removing_choices_uses_constant_queries(self):
+        """選択肢をいくつ削除してもクエリ数は一定で、問題集の内容バージョンは1回だけ進む"""
+        many = Question.objects.create(title=self.title, text='選択肢の多い問題', order=2)
+        kept, *others = [
+            Choice.objects.create(question=many, text=f'選択肢{i}', is_correct=i == 1, order=i)
+            for i in range(1, 6)
+        ]
+
+        def keep(choice):
+            return {'id': choice.id, 'text': choice.text, 'is_correct': choice.is_correct, 'order': choice.order}
+
+        version = Title.objects.get(pk=self.title.pk).content_version
+
+        # 3件中1件を削除 / 5件中3件を削除
+        one_removed = self.update_with_queries(self.question, [keep(self.a), keep(self.b)])
+        self.assertEqual(Title.objects.get(pk=self.title.pk).content_version, version + 1)
+        three_removed = self.update_with_queries(many, [keep(kept), keep(others[0])])
+
+        self.assertEqual(three_removed, one_removed)
+        self.assertEqual(Title.objects.get(pk=self.title.pk).content_version, version + 2)
+        self.assertEqual(list(many.choices.values_list('id', flat=True)), [kept.id, others[0].id])
+
+    def test_choice_has_no_dependent_rows(self):
+        """選択肢の削除はカスケードを通さない（_sync_choices）ため、選択肢を参照するテーブルがないこと"""
+        self.assertEqual([relation.related_model for relation in Choice._meta.related_objects], [])
+
+    def test_update_rejects_foreign_choice_id(self):
+        """他の問題の選択肢IDは指定できない"""
+        other = Question.objects.create(title=self.title, text='別の問題')
+        foreign = Choice.objects.create(question=other, text='X', is_correct=True)
+        response = self.client.patch(f'/api/quiz/questions/{self.question.id}/', {
+            'question_type': 'single',
+            'choices': [
+                {'id': foreign.id, 'text': 'X', 'is_correct': True, 'order': 1},
+                {'id': self.b.id, 'text': 'B', 'is_correct': False, 'order': 2},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('choices', response.data)
+        self.assertEqual(Choice.objects.get(pk=foreign.pk).question_id, other.id)
+
+    def test_update_invalidates_answer_key(self):
+        """選択肢の更新後は新しい正解で採点される"""
+        url = f'/api/quiz/questions/{self.question.id}/check/'
+        self.client.post(url, {'selected_choice_ids': [self.a.id]}, format='json')
+        self.client.patch(f'/api/quiz/questions/{self.question.id}/', {
+            'question_type': 'single',
+            'choices': [
+                {'id': self.a.id, 'text': 'A', 'is_correct': False, 'order': 1},
+                {'id': self.b.id, 'text': 'B', 'is_correct': True, 'order': 2},
+            ]
+        }, format='json')
+        response = self.client.post(url, {'selected_choice_ids': [self.b.id]}, format='json')
+        self.assertTrue(response.data['is_correct'])
+
+
+class QuestionImportAPITest(APITestCase):
+    """問題の一括インポートAPIのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', email='other@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PUBLIC)
+        Question.objects.create(title=self.title, text='既存の問題', order=1)
+        self.url = f'/api/quiz/titles/{self.title.id}/import/'
+        self.client.force_authenticate(user=self.user)
+
+    def record(self, index, correct=(0,)):
+        return {
+            'text': f'問題{index}',
+            'explanation': f'解説{index}',
+            'question_type': 'single' if len(correct) == 1 else 'multiple',
+            'choices': [
+                {'text': f'選択肢{i}', 'is_correct': i in correct, 'order': i + 1}
+                for i in range(3)
+            ],
+        }
+
+    def upload(self, name, content, **extra):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        data = {'file': SimpleUploadedFile(name, content), **extra}
+        return self.client.post(self.url, data, format='multipart')
+
+    def test_import_ndjson(self):
+        """NDJSONを取り込み、orderを続きから自動採番する"""
+        content = '\n'.join(json.dumps(self.record(i), ensure_ascii=False) for i in range(120))
+        response = self.upload('bank.ndjson', content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 120)
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.questions_count, 121)
+        self.assertEqual(Choice.objects.filter(question__title=self.title).count(), 360)
+        orders = list(self.title.questions.order_by('order').values_list('order', flat=True))
+        self.assertEqual(orders, [1] + [1024 * i for i in range(1, 121)])
+
+    def test_import_json_streams_large_payload_across_chunks(self):
+        """JSON配列（エクスポート形式のオブジェクトも可）を取り込む"""
+        payload = {'title': {'name': 'x'}, 'questions': [self.record(i, correct=(0, 2)) for i in range(50)]}
+        response = self.upload('bank.json', json.dumps(payload, ensure_ascii=False))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 50)
+        self.assertEqual(self.title.questions.filter(question_type='multiple').count(), 50)
+
+    def test_import_csv(self):
+        """CSVを取り込む"""
+        content = (
+            'text,explanation,question_type,choice1,choice2,choice3,correct\n'
+            '"カンマ, を含む問題",解説,single,A,B,C,2\n'
+            '複数選択,,multiple,A,B,C,1|3\n'
+        )
+        response = self.upload('bank.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        question = self.title.questions.get(text='カンマ, を含む問題')
+        self.assertEqual([c.is_correct for c in question.choices.all()], [False, True, False])
+
+    def test_import_non_utf8_file(self):
+        """UTF-8 以外（Excel の Shift_JIS など）のファイルは行番号付きの400"""
+        content = (
+            'text,choice1,choice2,correct\n'
+            '問題1,A,B,1\n'
+            '日本語の問題,はい,いいえ,1\n'
+        ).encode('shift_jis')
+        response = self.upload('bank.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('1行目', response.data['file'][0])
+        self.assertIn('UTF-8', response.data['file'][0])
+
+        response = self.upload('bank.ndjson', '{"text": "問題"}'.encode('shift_jis'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.upload('bank.json', '[{"text": "問題"}]'.encode('shift_jis'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.title.questions.count(), 1)
+
+    def test_import_csv_with_broken_quotes(self):
+        """閉じていない引用符などCSVとして不正なファイルは行番号付きの400"""
+        content = (
+            'text,choice1,choice2,correct\n'
+            '問題1,A,B,1\n'
+            '"閉じていない引用符,A,B,1\n'
+            '問題3,A,B,1\n'
+        )
+        response = self.upload('bank.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('CSVとして解析できません', response.data['file'][0])
+        self.assertEqual(self.title.questions.count(), 1)
+
+        response = self.upload('bank.csv', 'text,choice1,choice2,correct\n"問題"1,A,B,1\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('2行目', response.data['file'][0])
+
+    def test_import_broken_msgpack(self):
+        """MessagePack として不正なファイルは400"""
+        import msgpack
+
+        content = msgpack.packb(self.record(0)) + b'\xc1'
+        response = self.upload('bank.msgpack', content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('2件目', response.data['file'][0])
+        self.assertEqual(self.title.questions.count(), 1)
+
+    def test_import_json_with_trailing_data(self):
+        """トップレベルの配列・オブジェクトの後ろに空白以外が続くJSONは400（末尾の空白は可）"""
+        records = json.dumps([self.record(0), self.record(1)], ensure_ascii=False)
+        for content in [records + 'garbage', records + ' []', json.dumps({'questions': [self.record(0)]}) + '}']:
+            response = self.upload('bank.json', content)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('末尾に余分なデータ', response.data['file'][0])
+        self.assertEqual(self.title.questions.count(), 1)
+
+        response = self.upload('bank.json', records + '\n\n')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 2)
+
+    def test_import_errors_roll_back_or_skip(self):
+        """エラー行があれば全体を取り消し、skip_errors=true ならエラー行のみ除外"""
+        bad = self.record(99)
+        bad['choices'] = bad['choices'][:1]
+        content = '\n'.join([
+            json.dumps(self.record(0), ensure_ascii=False),
+            json.dumps(bad, ensure_ascii=False),
+            '{not json',
+        ])
+        response = self.upload('bank.ndjson', content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([e['row'] for e in response.data['errors']], [2, 3])
+        self.assertIn('choices', response.data['errors'][0]['errors'])
+        self.assertEqual(self.title.questions.count(), 1)
+
+        response = self.upload('bank.ndjson', content, skip_errors='true')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(self.title.questions.count(), 2)
+
+    def test_import_requires_owner(self):
+        """所有者以外はインポートできない"""
+        self.client.force_authenticate(user=self.other_user)
+        response = self.upload('bank.ndjson', json.dumps(self.record(0)))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class JSONStreamTest(TestCase):
+    """JSONの逐次パーサのテスト"""
+
+    def test_values_split_across_chunks(self):
+        """チャンク境界で値が分割されても正しく読み込める"""
+        from .importers import iter_json_records
+
+        text = json.dumps({'meta': 12345, 'questions': [{'text': f'問題{i}', 'order': i * 1000} for i in range(20)]},
+                          ensure_ascii=False).encode('utf-8')
+        chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+        records = [record for _, record in iter_json_records(chunks)]
+        self.assertEqual([r['order'] for r in records], [i * 1000 for i in range(20)])
+
+
+class TitleExportAPITest(APITestCase):
+    """問題集のエクスポートAPIのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='エクスポート元', description='説明', owner=self.user, status=Title.PUBLIC)
+        for i in range(1, 8):
+            question = Question.objects.create(
+                title=self.title, text=f'問題{i}', explanation=f'解説{i}', question_type='single', order=i
+            )
+            Choice.objects.create(question=question, text='正解', is_correct=True, order=1)
+            Choice.objects.create(question=question, text='不正解', is_correct=False, order=2)
+        self.url = f'/api/quiz/titles/{self.title.id}/export/'
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_ndjson(self):
+        """NDJSONは1行目が問題集の情報、以降1行1問"""
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(lines[0]['type'], 'title')
+        self.assertEqual(lines[0]['name'], 'エクスポート元')
+        self.assertEqual([line['text'] for line in lines[1:]], [f'問題{i}' for i in range(1, 8)])
+        self.assertEqual(lines[1]['choices'][0], {'text': '正解', 'is_correct': True, 'order': 1})
+
+    def test_export_json(self):
+        """JSONは title と questions を持つオブジェクト"""
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(self.read(response))
+        self.assertEqual(data['title']['id'], self.title.id)
+        self.assertEqual(len(data['questions']), 7)
+
+    def test_export_query_count_independent_of_size(self):
+        """問題数に関わらずチャンク単位のクエリ数で出力する"""
+        from .exporters import iter_ndjson_export
+
+        with CaptureQueriesContext(connection) as queries:
+            lines = list(iter_ndjson_export(self.title, chunk_size=3))
+        self.assertEqual(len(lines), 8)
+        # 問題1クエリ（サーバーサイドで逐次読み出し） + 3チャンク分の選択肢
+        self.assertEqual(len(queries), 4)
+
+    def test_export_can_be_imported(self):
+        """エクスポートしたファイルを別の問題集にそのままインポートできる"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        target = Title.objects.create(name='インポート先', owner=self.user)
+        for file_format in ['ndjson', 'json']:
+            content = self.read(self.client.get(self.url, {'format': file_format}))
+            response = self.client.post(
+                f'/api/quiz/titles/{target.id}/import/',
+                {'file': SimpleUploadedFile(f'export.{file_format}', content.encode('utf-8'))},
+                format='multipart'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            self.assertEqual(response.data['imported'], 7)
+        self.assertEqual(target.questions.count(), 14)
+        self.assertEqual(Choice.objects.filter(question__title=target, is_correct=True).count(), 14)
+
+    def test_export_private_title_of_other_user(self):
+        """他人の非公開タイトルはエクスポートできない"""
+        self.title.status = Title.PRIVATE
+        self.title.save()
+        other = CustomUser.objects.create_user(username='other', email='other@example.com', password='testpass')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class QuestionOrderAllocationTest(APITestCase):
+    """問題の表示順の採番カウンタのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PUBLIC)
+        self.client.force_authenticate(user=self.user)
+
+    def create_question(self, **extra):
+        data = {
+            'title_id': self.title.id,
+            'text': '問題',
+            'question_type': 'single',
+            'choices': [
+                {'text': 'A', 'is_correct': True, 'order': 1},
+                {'text': 'B', 'is_correct': False, 'order': 2},
+            ],
+            **extra,
+        }
+        return self.client.post('/api/quiz/questions/', data, format='json')
+
+    def test_allocate_returns_gapped_orders(self):
+        """払い出しは重複せず ORDER_GAP 間隔"""
+        self.assertEqual(Title.allocate_question_orders(self.title.id), 1024)
+        self.assertEqual(Title.allocate_question_orders(self.title.id, 3), 2048)
+        self.assertEqual(Title.allocate_question_orders(self.title.id), 5120)
+
+    def test_auto_order_without_aggregate(self):
+        """自動採番は max(order) の集計を行わない"""
+        self.create_question()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.create_question()
+        self.assertEqual(response.data['order'], 2048)
+        self.assertFalse(any('MAX(' in query['sql'].upper() for query in queries))
+
+    def test_explicit_order_advances_counter(self):
+        """明示指定された表示順の後ろから採番される"""
+        self.create_question(order=10000)
+        self.assertEqual(self.create_question().data['order'], 11024)
+        self.create_question(order=3)
+        self.assertEqual(self.create_question().data['order'], 12048)
+
+    def test_stale_title_save_keeps_counter(self):
+        """古いインスタンスの保存でカウンタが巻き戻らない"""
+        stale = Title.objects.get(pk=self.title.pk)
+        self.create_question()
+        stale.name = '変更後'
+        stale.save()
+        self.title.refresh_from_db()
+        self.assertEqual(self.title.name, '変更後')
+        self.assertEqual(self.title.next_question_order, 2048)
+        self.assertEqual(self.title.questions_count, 1)
+
+    def test_import_uses_counter(self):
+        """インポートもカウンタから採番し、その後の作成と重複しない"""
+        from .importers import QuestionImporter
+
+        self.create_question()
+        records = [
+            (i, {'text': f'問題{i}', 'question_type': 'single', 'choices': [
+                {'text': 'A', 'is_correct': True, 'order': 1},
+                {'text': 'B', 'is_correct': False, 'order': 2},
+            ]})
+            for i in range(5)
+        ]
+        self.assertEqual(QuestionImporter(self.title, chunk_size=2).run(iter(records)), 5)
+        self.assertEqual(self.create_question().data['order'], 7 * 1024)
+        orders = list(self.title.questions.values_list('order', flat=True))
+        self.assertEqual(sorted(orders), [1024 * i for i in range(1, 8)])
+
+    def test_import_into_non_empty_title_appends_in_file_order(self):
+        """問題がある問題集への取り込みではファイルの表示順を使わず、既存の問題の後ろに追加する"""
+        from .importers import QuestionImporter
+
+        first = self.create_question().data['id']
+        records = [
+            (i, {'text': f'問題{i}', 'question_type': 'single', 'order': order, 'choices': [
+                {'text': 'A', 'is_correct': True, 'order': 1},
+                {'text': 'B', 'is_correct': False, 'order': 2},
+            ]})
+            for i, order in enumerate([1024, 2048, 4096])
+        ]
+        self.title.refresh_from_db()
+        self.assertEqual(QuestionImporter(self.title, chunk_size=2).run(iter(records)), 3)
+        questions = list(self.title.questions.order_by('order', 'id').values_list('id', 'text', 'order'))
+        self.assertEqual(questions[0][0], first)
+        self.assertEqual([text for _, text, _ in questions[1:]], ['問題0', '問題1', '問題2'])
+        self.assertEqual([order for _, _, order in questions], [1024, 2048, 3072, 4096])
+        self.assertEqual(self.create_question().data['order'], 5 * 1024)
+
+    def test_import_into_empty_title_keeps_file_orders(self):
+        """空の問題集への取り込みではファイルの表示順をそのまま使う"""
+        from .importers import QuestionImporter
+
+        records = [
+            (i, {'text': f'問題{i}', 'question_type': 'single', 'order': order, 'choices': [
+                {'text': 'A', 'is_correct': True, 'order': 1},
+                {'text': 'B', 'is_correct': False, 'order': 2},
+            ]})
+            for i, order in enumerate([3072, 1024])
+        ]
+        self.assertEqual(QuestionImporter(self.title).run(iter(records)), 2)
+        self.assertEqual(
+            list(self.title.questions.order_by('order').values_list('text', 'order')),
+            [('問題1', 1024), ('問題0', 3072)],
+        )
+        self.assertEqual(self.create_question().data['order'], 4096)
+
+
+class ReorderAPITest(APITestCase):
+    """問題・選択肢の並べ替えAPIのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', email='other@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PUBLIC)
+        self.questions = [
+            Question.objects.create(title=self.title, text=f'問題{i}', order=i * 1024)
+            for i in range(1, 6)
+        ]
+        self.choices = [
+            Choice.objects.create(question=self.questions[0], text=f'選択肢{i}', is_correct=i == 1, order=i)
+            for i in range(1, 4)
+        ]
+        self.url = f'/api/quiz/titles/{self.title.id}/reorder/'
+        self.client.force_authenticate(user=self.user)
+
+    def ordered_ids(self):
+        return list(self.title.questions.order_by('order', 'id').values_list('id', flat=True))
+
+    def test_move_one_question_updates_one_row(self):
+        """1件の移動は1行の更新で済む"""
+        q1, q2, q3, q4, q5 = [q.id for q in self.questions]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'question_ids': [q1, q4, q2, q3, q5]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated_questions'], 1)
+        self.assertEqual(self.ordered_ids(), [q1, q4, q2, q3, q5])
+        self.assertEqual(sum(1 for query in queries if query['sql'].startswith('UPDATE "quiz_question"')), 1)
+
+    def test_auto_numbered_questions_move_without_rebalance(self):
+        """自動採番した問題は間隔が空いているため、移動しても全体を振り直さない"""
+        title = Title.objects.create(name='自動採番', owner=self.user, status=Title.PUBLIC)
+        ids = []
+        for i in range(6):
+            response = self.client.post('/api/quiz/questions/', {
+                'title_id': title.id, 'text': f'問題{i}', 'question_type': 'single',
+                'choices': [{'text': 'A', 'is_correct': True, 'order': 1}, {'text': 'B', 'is_correct': False, 'order': 2}],
+            }, format='json')
+            ids.append(response.data['id'])
+
+        moved = [ids[5], *ids[:5]]
+        response = self.client.post(f'/api/quiz/titles/{title.id}/reorder/', {'question_ids': moved}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated_questions'], 1)
+        self.assertEqual(list(title.questions.order_by('order', 'id').values_list('id', flat=True)), moved)
+
+    def test_rebalance_when_no_gap(self):
+        """間に値がない場合は全体を振り直す"""
+        from django.db.models import F
+
+        Question.objects.filter(title=self.title).update(order=F('order') / 1024)
+        ids = [q.id for q in reversed(self.questions)]
+        response = self.client.post(self.url, {'question_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ordered_ids(), ids)
+        # 振り直し後に追加した問題は末尾に並ぶ
+        self.assertGreater(Title.allocate_question_orders(self.title.id), 5 * 1024)
+
+    def test_reorder_choices(self):
+        """選択肢も並べ替えられる"""
+        c1, c2, c3 = [c.id for c in self.choices]
+        response = self.client.post(
+            self.url, {'choices': {str(self.questions[0].id): [c3, c1, c2]}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ordered = list(self.questions[0].choices.order_by('order').values_list('id', flat=True))
+        self.assertEqual(ordered, [c3, c1, c2])
+
+    def test_invalid_ids(self):
+        """問題集の全問題を過不足なく指定する必要がある"""
+        ids = [q.id for q in self.questions]
+        for question_ids in [ids[:-1], ids + [ids[0]]]:
+            response = self.client.post(self.url, {'question_ids': question_ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'choices': {str(self.questions[1].id): [self.choices[0].id]}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.ordered_ids(), ids)
+
+    def test_requires_owner(self):
+        """所有者以外は並べ替えできない"""
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post(self.url, {'question_ids': [q.id for q in self.questions]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderPlanTest(TestCase):
+    """並び順の計算のテスト"""
+
+    def test_plan_orders(self):
+        from .ordering import plan_orders
+
+        self.assertEqual(plan_orders([1, 2, 3]), [1, 2, 3])
+        self.assertEqual(plan_orders([1024, 3072, 2048, 4096]), [1024, 1536, 2048, 4096])
+        self.assertEqual(plan_orders([2048, 1024]), [512, 1024])
+        self.assertEqual(plan_orders([3, 1, 2]), [1024, 2048, 3072])
+
+    def test_migration_keeps_existing_orders(self):
+        """0008 のマイグレーションは既存の表示順を変えず、採番カウンタを末尾の後ろに合わせる"""
+        import importlib
+        from django.apps import apps
+
+        migration = importlib.import_module('apps.quiz.migrations.0008_question_order_gap')
+        user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        title = Title.objects.create(name='テストタイトル', owner=user, status=Title.PUBLIC)
+        empty = Title.objects.create(name='空の問題集', owner=user, status=Title.PUBLIC)
+        questions = [Question.objects.create(title=title, text=f'問題{i}', order=order) for i, order in enumerate([3, 1, 2])]
+        Title.objects.filter(pk__in=[title.pk, empty.pk]).update(next_question_order=1)
+        version = Title.objects.get(pk=title.pk).content_version
+
+        migration.advance_question_order_counters(apps, None)
+
+        self.assertEqual(
+            list(title.questions.order_by('order').values_list('id', 'order')),
+            [(questions[1].id, 1), (questions[2].id, 2), (questions[0].id, 3)],
+        )
+        title.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(title.next_question_order, 3 + 1024)
+        self.assertEqual(empty.next_question_order, 1024)
+        self.assertEqual(title.content_version, version)
+
+
+class ConditionalGetTest(APITestCase):
+    """ETag / Last-Modified による条件付きGETのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', email='other@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PUBLIC)
+        self.question = Question.objects.create(title=self.title, text='問題1', order=1)
+        self.choice = Choice.objects.create(question=self.question, text='A', is_correct=True, order=1)
+        Choice.objects.create(question=self.question, text='B', is_correct=False, order=2)
+        self.detail_url = f'/api/quiz/titles/{self.title.id}/'
+        self.client.force_authenticate(user=self.user)
+
+    def assert_revalidation(self, url, change, max_queries=1):
+        """変更がなければ 304（検証は軽量なクエリのみ）、変更後は新しい ETag で 200 を返す"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertLessEqual(len(queries), max_queries)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_retrieve_follows_child_changes(self):
+        """問題・選択肢・評価の変更で詳細の ETag が変わる"""
+        def update_choice():
+            self.choice.text = '変更'
+            self.choice.save()
+
+        self.assert_revalidation(self.detail_url, update_choice)
+        self.assert_revalidation(self.detail_url, lambda: Question.objects.create(title=self.title, text='問題2'))
+        self.assert_revalidation(self.detail_url, lambda: self.question.delete())
+        self.assert_revalidation(
+            self.detail_url, lambda: Rating.objects.create(user=self.other_user, title=self.title, stars=4)
+        )
+
+    def test_questions_and_list(self):
+        """問題一覧・タイトル一覧も条件付きGETに対応する"""
+        def update_question():
+            self.question.text = '変更'
+            self.question.save()
+
+        self.assert_revalidation(f'/api/quiz/titles/{self.title.id}/questions/', update_question)
+        # 一覧は1回の集計クエリで求める一覧バージョンで判定する
+        self.assert_revalidation(
+            '/api/quiz/titles/', lambda: Title.objects.create(name='新規', owner=self.other_user, status=Title.PUBLIC)
+        )
+        self.assert_revalidation('/api/quiz/titles/', update_question)
+        self.assert_revalidation('/api/quiz/titles/', lambda: Title.objects.get(name='新規').delete())
+
+    def test_list_follows_changes_from_other_workers(self):
+        """キャッシュを経由しない（他のワーカーでの）変更でも、一覧の ETag が変わる"""
+        response = self.client.get('/api/quiz/titles/')
+        etag = response['ETag']
+
+        Title.objects.filter(pk=self.title.pk).update(name='変更', content_updated_at=timezone.now())
+        response = self.client.get('/api/quiz/titles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['name'], '変更')
+
+    def test_last_modified(self):
+        """If-Modified-Since でも判定できる"""
+        response = self.client.get(self.detail_url)
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_differs_by_user_and_query(self):
+        """ユーザー・クエリ文字列が異なれば ETag も異なる"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.assertNotEqual(self.client.get(self.detail_url, {'format': 'json'})['ETag'], etag)
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_random_without_seed_has_no_etag(self):
+        """シード未指定のランダム表示には ETag を付けない"""
+        response = self.client.get(f'/api/quiz/titles/{self.title.id}/questions/', {'random': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+    def test_owner_rename_changes_etag(self):
+        """所有者のユーザー名変更で ETag が変わる（last_login のみの更新では変わらない）"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(self.detail_url)['ETag'], etag)
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertNotEqual(self.client.get(self.detail_url)['ETag'], etag)
+
+
+@override_settings(QUIZ_TITLE_SNAPSHOTS=False)
+class PayloadCacheTest(APITestCase):
+    """公開問題集のレスポンスキャッシュのテスト（スナップショットを使わない経路）"""
+
+    def setUp(self):
+        from .payload_cache import local_cache
+
+        cache.clear()
+        local_cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.PUBLIC)
+        for i in range(1, 6):
+            question = Question.objects.create(title=self.title, text=f'問題{i}', order=i)
+            Choice.objects.create(question=question, text='A', is_correct=True, order=1)
+            Choice.objects.create(question=question, text='B', is_correct=False, order=2)
+        self.detail_url = f'/api/quiz/titles/{self.title.id}/'
+        self.questions_url = f'/api/quiz/titles/{self.title.id}/questions/'
+
+    def get_with_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_payloads_are_served_from_cache(self):
+        """2回目以降は問題集の行の取得のみで返す"""
+        for url in [self.detail_url, self.questions_url]:
+            first, _ = self.get_with_queries(url)
+            second, queries = self.get_with_queries(url)
+            self.assertEqual(second.data, first.data)
+            self.assertEqual(queries, 1)
+
+    def test_random_mode_uses_cached_payload(self):
+        """ランダム表示もキャッシュから選び、同じシードなら同じ順序"""
+        self.get_with_queries(self.questions_url)
+        first, queries = self.get_with_queries(self.questions_url, {'random': 'true', 'seed': 'abc', 'limit': 3})
+        self.assertEqual(queries, 1)
+        self.assertEqual(len(first.data), 3)
+        second, _ = self.get_with_queries(self.questions_url, {'random': 'true', 'seed': 'abc', 'limit': 3})
+        self.assertEqual([q['id'] for q in second.data], [q['id'] for q in first.data])
+
+    def test_changes_use_new_key(self):
+        """問題・選択肢の変更後は新しい内容を返す"""
+        self.get_with_queries(self.detail_url)
+        choice = Choice.objects.filter(question__title=self.title).first()
+        choice.text = '変更後'
+        choice.save()
+        response, _ = self.get_with_queries(self.detail_url)
+        texts = [c['text'] for q in response.data['questions'] for c in q['choices']]
+        self.assertIn('変更後', texts)
+
+    def test_private_title_is_not_cached(self):
+        """非公開の問題集はキャッシュしない"""
+        self.title.status = Title.PRIVATE
+        self.title.save()
+        self.client.force_authenticate(user=self.user)
+        _, first = self.get_with_queries(self.detail_url)
+        _, second = self.get_with_queries(self.detail_url)
+        self.assertEqual(first, second)
+        self.assertGreater(second, 1)
+
+
+class SingleFlightTest(TestCase):
+    """キャッシュ再構築の single-flight のテスト"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_waits_for_rebuild_by_lock_holder(self):
+        """ロックを持つワーカーの再構築結果を待って使う"""
+        import threading
+        from .payload_cache import build_single_flight
+
+        cache.add('quiz:test:lock', True, 10)
+        timer = threading.Timer(0.1, lambda: cache.set('quiz:test', {'built': 'elsewhere'}))
+        timer.start()
+        calls = []
+        value = build_single_flight('quiz:test', lambda: calls.append(1) or {'built': 'here'})
+        timer.join()
+        self.assertEqual(value, {'built': 'elsewhere'})
+        self.assertEqual(calls, [])
+
+    def test_rebuilds_and_releases_lock(self):
+        """ロックを取得したワーカーが再構築してキャッシュに保存し、ロックを解放する"""
+        from .payload_cache import build_single_flight
+
+        self.assertEqual(build_single_flight('quiz:test', lambda: [1, 2]), [1, 2])
+        self.assertEqual(cache.get('quiz:test'), [1, 2])
+        self.assertIsNone(cache.get('quiz:test:lock'))
+
+    def test_local_lru_is_bounded(self):
+        """プロセス内キャッシュは件数上限を超えると古いものから追い出す"""
+        from .payload_cache import LocalLRUCache
+
+        lru = LocalLRUCache(max_size=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+
+    def test_local_lru_follows_settings(self):
+        """上限・有効期限を省略したプロセス内キャッシュは、アクセス時の settings を反映する"""
+        from .payload_cache import LocalLRUCache
+
+        lru = LocalLRUCache()
+        with override_settings(QUIZ_PAYLOAD_LOCAL_CACHE_SIZE=1):
+            lru.set('a', 1)
+            lru.set('b', 2)
+            self.assertIsNone(lru.get('a'))
+        with override_settings(QUIZ_PAYLOAD_CACHE_TIMEOUT=0):
+            lru.set('c', 3)
+            self.assertIsNone(lru.get('c'))
+        self.assertEqual(lru.get('b'), 2)
+
+
+class TitleSnapshotTest(APITestCase):
+    """公開スナップショットのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.learner = CustomUser.objects.create_user(username='learner', email='learner@example.com', password='testpass')
+        self.title = Title.objects.create(name='テストタイトル', owner=self.user, status=Title.DRAFT)
+        for i in range(1, 4):
+            question = Question.objects.create(title=self.title, text=f'問題{i}', order=i)
+            Choice.objects.create(question=question, text='A', is_correct=True, order=1)
+            Choice.objects.create(question=question, text='B', is_correct=False, order=2)
+        self.detail_url = f'/api/quiz/titles/{self.title.id}/'
+        self.publish()
+
+    def publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title.status = Title.PUBLIC
+            self.title.save()
+
+    def snapshot(self):
+        from .models import TitleSnapshot
+
+        return TitleSnapshot.objects.filter(title=self.title).first()
+
+    def test_compiled_on_publish(self):
+        """公開時にライブのレスポンスと同じ内容でコンパイルされる"""
+        snapshot = self.snapshot()
+        self.title.refresh_from_db()
+        self.assertEqual(snapshot.content_version, self.title.content_version)
+        self.assertEqual(len(snapshot.content_hash), 64)
+
+        self.client.force_authenticate(user=self.user)
+        live = self.client.get(self.detail_url)
+        self.client.force_authenticate(user=self.learner)
+        served = self.client.get(self.detail_url)
+        self.assertEqual(served.content, live.content)
+
+    def test_learner_read_is_single_query_without_join(self):
+        """所有者以外の取得はスナップショットの1クエリ（JOINなし）"""
+        self.client.get(self.detail_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0]['sql'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        import gzip
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['questions']), 3)
+
+    def test_recompiled_on_edit_and_owner_sees_live(self):
+        """編集でコンパイルし直し、所有者は常にライブの内容を参照する"""
+        import gzip
+        from .models import TitleSnapshot
+
+        question = self.title.questions.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            question.text = '変更後'
+            question.save()
+        response = self.client.get(f'/api/quiz/titles/{self.title.id}/questions/')
+        self.assertIn('変更後', [q['text'] for q in response.data])
+
+        # スナップショットを書き換えても所有者の表示には影響しない
+        TitleSnapshot.objects.filter(title=self.title).update(document=gzip.compress(b'{"questions":[]}'))
+        self.assertEqual(self.client.get(f'/api/quiz/titles/{self.title.id}/questions/').data, [])
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(len(self.client.get(f'/api/quiz/titles/{self.title.id}/questions/').data), 3)
+
+    def test_stale_snapshot_is_not_served(self):
+        """内容バージョンが古いスナップショットは使用しない"""
+        # コミット後の再コンパイルが行われていない状態
+        Question.objects.create(title=self.title, text='追加の問題', order=10)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(len(response.data['questions']), 4)
+
+    def test_unpublish_removes_snapshot(self):
+        """非公開にするとスナップショットを削除し、所有者以外は参照できない"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title.status = Title.PRIVATE
+            self.title.save()
+        self.assertIsNone(self.snapshot())
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UserStateAnnotationTest(APITestCase):
+    """一覧に付与するログインユーザーの状態（お気に入り・評価・メモ）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(username='owner', email='owner@example.com', password='testpass')
+        self.user = CustomUser.objects.create_user(username='learner', email='learner@example.com', password='testpass')
+        self.other_user = CustomUser.objects.create_user(username='other', email='other@example.com', password='testpass')
+        self.title = Title.objects.create(name='お気に入り', owner=self.owner, status=Title.PUBLIC)
+        self.rated_title = Title.objects.create(name='評価済み', owner=self.owner, status=Title.PUBLIC)
+        self.q1 = Question.objects.create(title=self.title, text='問題1', order=1)
+        self.q2 = Question.objects.create(title=self.title, text='問題2', order=2)
+        for question in (self.q1, self.q2):
+            Choice.objects.create(question=question, text='A', is_correct=True, order=1)
+            Choice.objects.create(question=question, text='B', is_correct=False, order=2)
+        TitleFavorite.objects.create(user=self.user, title=self.title)
+        Rating.objects.create(user=self.user, title=self.rated_title, stars=4)
+        QuestionFavorite.objects.create(user=self.user, question=self.q1)
+        QuestionNote.objects.create(user=self.user, question=self.q2, note='メモ')
+        self.questions_url = f'/api/quiz/titles/{self.title.id}/questions/'
+
+    def by_id(self, items):
+        return {item['id']: item for item in items}
+
+    def test_title_list_has_user_state(self):
+        """問題集一覧にお気に入り・自分の評価が付与される"""
+        self.client.force_authenticate(user=self.user)
+        titles = self.by_id(self.client.get('/api/quiz/titles/').data['results'])
+        self.assertTrue(titles[self.title.id]['is_favorited'])
+        self.assertIsNone(titles[self.title.id]['my_rating'])
+        self.assertFalse(titles[self.rated_title.id]['is_favorited'])
+        self.assertEqual(titles[self.rated_title.id]['my_rating'], 4)
+
+    def test_anonymous_gets_defaults(self):
+        """未ログインの場合は未登録の状態を返す"""
+        titles = self.by_id(self.client.get('/api/quiz/titles/').data['results'])
+        self.assertFalse(titles[self.title.id]['is_favorited'])
+        self.assertIsNone(titles[self.rated_title.id]['my_rating'])
+
+        questions = self.by_id(self.client.get(self.questions_url).data)
+        self.assertFalse(questions[self.q1.id]['is_favorited'])
+        self.assertFalse(questions[self.q2.id]['has_note'])
+
+    def test_question_list_has_user_state(self):
+        """問題一覧（QuestionViewSet）にお気に入り・メモの有無が付与される"""
+        self.client.force_authenticate(user=self.user)
+        questions = self.by_id(self.client.get('/api/quiz/questions/').data['results'])
+        self.assertEqual((questions[self.q1.id]['is_favorited'], questions[self.q1.id]['has_note']), (True, False))
+        self.assertEqual((questions[self.q2.id]['is_favorited'], questions[self.q2.id]['has_note']), (False, True))
+
+    @override_settings(QUIZ_TITLE_SNAPSHOTS=False)
+    def test_questions_action_overlays_cached_payload(self):
+        """共有キャッシュの問題一覧にユーザーごとの状態を重ねる（キャッシュ自体は書き換えない）"""
+        self.client.force_authenticate(user=self.user)
+        questions = self.by_id(self.client.get(self.questions_url).data)
+        self.assertTrue(questions[self.q1.id]['is_favorited'])
+        self.assertTrue(questions[self.q2.id]['has_note'])
+
+        self.client.force_authenticate(user=self.other_user)
+        with self.assertNumQueries(2):  # 問題集 + 状態の付与
+            questions = self.by_id(self.client.get(self.questions_url).data)
+        self.assertFalse(questions[self.q1.id]['is_favorited'])
+        self.assertFalse(questions[self.q2.id]['has_note'])
+
+    def test_questions_action_overlays_snapshot(self):
+        """スナップショットから返す問題一覧にもユーザーごとの状態を重ねる"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title.name = '再公開'
+            self.title.save()
+        self.client.force_authenticate(user=self.user)
+        questions = self.by_id(self.client.get(self.questions_url).data)
+        self.assertTrue(questions[self.q1.id]['is_favorited'])
+        self.assertTrue(questions[self.q2.id]['has_note'])
+
+    def test_favorite_changes_etag(self):
+        """お気に入りの変更で問題一覧・問題集一覧の ETag が変わる"""
+        self.client.force_authenticate(user=self.user)
+        changes = [
+            (self.questions_url, lambda: QuestionFavorite.objects.create(user=self.user, question=self.q2)),
+            ('/api/quiz/titles/', lambda: TitleFavorite.objects.filter(user=self.user).delete()),
+        ]
+        for url, change in changes:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class SparseFieldsetTest(APITestCase):
+    """?fields= / ?omit= / ?expand= のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(name='公開タイトル', description='説明文', owner=self.user, status=Title.PUBLIC)
+        for i in range(3):
+            question = Question.objects.create(title=self.title, text=f'問題{i}', explanation='解説', order=i + 1)
+            Choice.objects.create(question=question, text='正解', is_correct=True, order=1)
+            Choice.objects.create(question=question, text='不正解', is_correct=False, order=2)
+        Rating.objects.create(user=self.user, title=self.title, stars=4)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_fields_limits_output_and_columns(self):
+        """?fields= で指定したフィールドのみ出力し、それ以外のカラム・関連は取得しない"""
+        response, queries = self.get('/api/quiz/titles/', fields='id,name')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+        select = queries[-1]
+        self.assertNotIn('"description"', select)
+        self.assertNotIn('accounts_customuser', select)
+
+    def test_nested_fields_and_omit(self):
+        """ドットでネスト先のフィールドを指定でき、?omit= で除外できる"""
+        response, queries = self.get('/api/quiz/titles/', fields='id,owner.username')
+        self.assertEqual(response.data['results'][0]['owner'], {'username': 'testuser'})
+        self.assertNotIn('"email"', queries[-1])
+
+        response, queries = self.get('/api/quiz/titles/', omit='owner,description')
+        item = response.data['results'][0]
+        self.assertNotIn('owner', item)
+        self.assertIn('name', item)
+        self.assertNotIn('accounts_customuser', queries[-1])
+
+    def test_cursor_keys_are_kept(self):
+        """キーセットページネーションの並び順のカラムは除外せず、カーソル作成で追加クエリを発行しない"""
+        for i in range(11):
+            Title.objects.create(name=f'タイトル{i}', owner=self.user, status=Title.PUBLIC)
+        response, queries = self.get('/api/quiz/titles/', fields='id', pagination='cursor', page_size=10)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+        # 条件付きGETの一覧バージョン + 一覧
+        self.assertEqual(len(queries), 2)
+
+    def test_expand(self):
+        """?expand= で展開可能なフィールドをネストしたオブジェクトで出力する（件数に依存しないクエリ数）"""
+        response, queries = self.get('/api/quiz/titles/', expand='questions', fields='id,questions.id,questions.choices')
+        questions = response.data['results'][0]['questions']
+        self.assertEqual(len(questions), 3)
+        self.assertEqual(set(questions[0]), {'id', 'choices'})
+        self.assertLessEqual(len(queries), 5)
+
+        response, _ = self.get('/api/quiz/questions/', expand='title', fields='id,title.name')
+        self.assertEqual(response.data['results'][0]['title'], {'name': '公開タイトル'})
+
+    def test_omitted_prefetch_is_skipped(self):
+        """ネストした一覧を除外すると prefetch のクエリも発行しない"""
+        _, full = self.get('/api/quiz/questions/')
+        response, sparse = self.get('/api/quiz/questions/', omit='choices,explanation')
+        self.assertNotIn('choices', response.data['results'][0])
+        self.assertEqual(len(sparse), len(full) - 1)
+        self.assertFalse(any('quiz_choice' in sql for sql in sparse))
+
+    def test_cached_detail_is_filtered_without_polluting_cache(self):
+        """共有キャッシュから返す詳細・問題一覧にも適用し、キャッシュ自体は全フィールドのまま"""
+        response, _ = self.get(f'/api/quiz/titles/{self.title.id}/', fields='id,name,questions.text')
+        self.assertEqual(set(response.data), {'id', 'name', 'questions'})
+        self.assertEqual(set(response.data['questions'][0]), {'text'})
+
+        response, _ = self.get(f'/api/quiz/titles/{self.title.id}/questions/', omit='choices,explanation')
+        self.assertNotIn('choices', response.data[0])
+        self.assertIn('is_favorited', response.data[0])
+
+        response, _ = self.get(f'/api/quiz/titles/{self.title.id}/')
+        self.assertIn('description', response.data)
+        self.assertIn('choices', response.data['questions'][0])
+
+
+class FastJSONTest(APITestCase):
+    """orjson 版の JSONRenderer / JSONParser のテスト（標準の json と同一の結果）"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.title = Title.objects.create(
+            name='公開タイトル', description='"引用符"\\改行\n\u2028\u2029\x00\x1f😀', owner=self.user, status=Title.PUBLIC
+        )
+        for i in range(3):
+            question = Question.objects.create(title=self.title, text=f'問題{i}\t</script>', explanation='解説', order=i + 1)
+            Choice.objects.create(question=question, text='正解', is_correct=True, order=1)
+        Rating.objects.create(user=self.user, title=self.title, stars=4)
+
+    def test_detail_output_is_byte_identical(self):
+        """TitleDetailSerializer の出力を JSONRenderer と同じバイト列で描画する"""
+        from rest_framework.renderers import JSONRenderer
+        from apps.common.renderers import FastJSONRenderer
+        from .serializers import TitleDetailSerializer
+
+        data = TitleDetailSerializer(Title.objects.get(pk=self.title.pk)).data
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_values_json_formats_differently_are_identical(self):
+        """日時・指数表記の数値・巨大な整数・JavaScriptで不正な文字も JSONRenderer と一致する"""
+        from decimal import Decimal
+        from uuid import UUID
+        from rest_framework.renderers import JSONRenderer
+        from apps.common.renderers import FastJSONRenderer
+
+        for data in [
+            {'at': timezone.now(), 'date': timezone.now().date()},
+            {'large': 1e16, 'small': 0.00001, 'rating': 4.5, 'text': '1e5'},
+            {'int': 2 ** 64, 'negative': -(2 ** 63) - 1},
+            {'text': '\u2028\u2029', 1: 'key', 'uuid': UUID(int=1), 'decimal': Decimal('1.50')},
+            [], '', None,
+        ]:
+            with self.subTest(data=data):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back_to_json(self):
+        """インデント指定（Accept の indent 等）は標準の json で描画する"""
+        from rest_framework.renderers import JSONRenderer
+        from apps.common.renderers import FastJSONRenderer
+
+        data = {'a': [1, 2]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_parser_matches_json(self):
+        """解析結果・エラーともに JSONParser と一致する"""
+        from io import BytesIO
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+        from apps.common.parsers import FastJSONParser
+
+        for body in [b'{"a": [1, 2.5, "\\u3042"]}', b'123456789012345678901234567890', b'"\\ud800"', b'[]']:
+            with self.subTest(body=body):
+                self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+        for body in [b'{"a": NaN}', b'{"a": 1,}', b'', b'\xff']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    JSONParser().parse(BytesIO(body))
+                with self.assertRaises(ParseError) as actual:
+                    FastJSONParser().parse(BytesIO(body))
+                self.assertEqual(str(actual.exception), str(expected.exception))
+
+    def test_api_uses_fast_renderer_and_parser(self):
+        """API は既定で FastJSONRenderer / FastJSONParser を使用する"""
+        from apps.common.renderers import FastJSONRenderer
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            '/api/quiz/titles/', json.dumps({'name': '新規', 'status': Title.DRAFT}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(json.loads(response.content)['name'], '新規')
+
+
+class MessagePackAPITest(APITestCase):
+    """MessagePack（Accept / Content-Type: application/msgpack）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.learner = CustomUser.objects.create_user(username='learner', email='learner@example.com', password='testpass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title = Title.objects.create(name='公開タイトル', description='説明', owner=self.user, status=Title.PUBLIC)
+            self.questions = []
+            for i in range(1, 4):
+                question = Question.objects.create(title=self.title, text=f'問題{i}', explanation='解説', order=i)
+                correct = Choice.objects.create(question=question, text='正解', is_correct=True, order=1)
+                Choice.objects.create(question=question, text='不正解', is_correct=False, order=2)
+                self.questions.append((question, correct))
+
+    def get_msgpack(self, url, **params):
+        import msgpack
+
+        response = self.client.get(url, params, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        return msgpack.unpackb(response.content)
+
+    def test_responses_match_json(self):
+        """一覧・詳細（スナップショット経由を含む）は JSON と同じ内容を返す"""
+        self.client.force_authenticate(user=self.learner)
+        for url in [
+            '/api/quiz/titles/',
+            f'/api/quiz/titles/{self.title.id}/',
+            f'/api/quiz/titles/{self.title.id}/questions/',
+            f'/api/quiz/questions/{self.questions[0][0].id}/',
+        ]:
+            with self.subTest(url=url):
+                expected = json.loads(self.client.get(url, HTTP_ACCEPT='application/json').content)
+                self.assertEqual(self.get_msgpack(url), expected)
+
+    def test_conditional_get_is_per_format(self):
+        """JSON と MessagePack で ETag が異なる"""
+        url = f'/api/quiz/titles/{self.title.id}/'
+        json_response = self.client.get(url, HTTP_ACCEPT='application/json')
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], json_response['ETag'])
+        self.assertIn('Accept', response['Vary'])
+
+    def test_batch_check_request_body(self):
+        """一括採点のリクエストボディを MessagePack で送信できる"""
+        import msgpack
+
+        self.client.force_authenticate(user=self.learner)
+        answers = [
+            {'question_id': question.id, 'selected_choice_ids': [correct.id]}
+            for question, correct in self.questions
+        ]
+        response = self.client.post(
+            f'/api/quiz/titles/{self.title.id}/check/', msgpack.packb({'answers': answers}),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data['correct_count'], 3)
+        self.assertEqual(data['score'], 100.0)
+
+    def test_invalid_body_is_rejected(self):
+        """解析できないボディは 400（エラーも MessagePack で返す）"""
+        import msgpack
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            '/api/quiz/titles/', b'\xc1', content_type='application/msgpack', HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('MessagePack parse error', msgpack.unpackb(response.content)['detail'])
+
+    def test_export_and_import_round_trip(self):
+        """MessagePack でエクスポートしたファイルをそのままインポートできる"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/quiz/titles/{self.title.id}/export/', {'format': 'msgpack'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        content = b''.join(response.streaming_content)
+
+        target = Title.objects.create(name='インポート先', owner=self.user)
+        response = self.client.post(
+            f'/api/quiz/titles/{target.id}/import/',
+            {'file': SimpleUploadedFile('title.msgpack', content, content_type='application/msgpack')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 3)
+        self.assertEqual(
+            list(target.questions.order_by('order').values_list('text', flat=True)), ['問題1', '問題2', '問題3']
+        )
+
+        response = self.client.post(
+            f'/api/quiz/titles/{target.id}/import/',
+            {'file': SimpleUploadedFile('title.msgpack', content[:-3], content_type='application/msgpack')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_schema_documents_msgpack(self):
+        """OpenAPI スキーマにリクエスト・レスポンスの形式として記載される"""
+        from drf_spectacular.generators import SchemaGenerator
+
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        operation = schema['paths']['/api/quiz/titles/{id}/check/']['post']
+        self.assertIn('application/msgpack', operation['requestBody']['content'])
+        self.assertIn('application/msgpack', operation['responses']['200']['content'])
+        self.assertIn('jwtAuth', schema['components']['securitySchemes'])
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, APITestCase):
+    """ViewSet のアクションごとのクエリ数の上限（query_budgets）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(username='owner', email='owner@example.com', password='testpass')
+        self.learner = CustomUser.objects.create_user(username='learner', email='learner@example.com', password='testpass')
+        self.sequence = 0
+
+    def reset_query_budget_state(self):
+        from .payload_cache import local_cache
+
+        super().reset_query_budget_state()
+        local_cache.clear()
+
+    def make_title(self, questions=0, choices=2, status=Title.PUBLIC):
+        self.sequence += 1
+        title = Title.objects.create(name=f'問題集{self.sequence}', owner=self.owner, status=status)
+        for i in range(1, questions + 1):
+            question = Question.objects.create(title=title, text=f'問題{i}', explanation='解説', order=i)
+            for j in range(1, choices + 1):
+                Choice.objects.create(question=question, text=f'選択肢{j}', is_correct=j == 1, order=j)
+        return title
+
+    def make_question(self, choices=2):
+        return self.make_title(questions=1, choices=choices).questions.get()
+
+    def question_payload(self, choices=2):
+        return {
+            'text': '問題文',
+            'explanation': '解説',
+            'question_type': 'single',
+            'choices': [
+                {'text': f'選択肢{j}', 'is_correct': j == 0, 'order': j + 1}
+                for j in range(choices)
+            ],
+        }
+
+    def test_every_action_has_budget(self):
+        """すべての ViewSet のすべてのアクションにクエリ数の上限が宣言されている"""
+        from rest_framework.viewsets import ViewSetMixin
+        from apps.common.query_budget import get_undeclared_actions
+        from . import views
+
+        viewsets = [
+            value for value in vars(views).values()
+            if isinstance(value, type) and issubclass(value, ViewSetMixin) and value.__module__ == views.__name__
+        ]
+        self.assertEqual(len(viewsets), 6)
+        for viewset in viewsets:
+            with self.subTest(viewset=viewset.__name__):
+                self.assertEqual(get_undeclared_actions(viewset), [])
+
+    def test_helper_detects_growing_queries(self):
+        """データ量に応じてクエリ数が増えるとテストが失敗する"""
+        class LeakyViewSet:
+            query_budgets = {'list': 100}
+
+        def prepare(size):
+            for _ in range(size):
+                self.make_title()
+
+            def send():
+                # 問題集ごとに所有者を取得する（N+1）
+                for title in Title.objects.all():
+                    title.owner.username
+                return self.client.get('/api/quiz/titles/')
+            return send
+
+        with self.assertRaisesMessage(AssertionError, 'LeakyViewSet.list のクエリ数がデータ量に応じて増えています'):
+            self.assertQueryBudget(LeakyViewSet, 'list', prepare, sizes=(1, 3))
+
+    # --- TitleViewSet ---
+
+    def test_title_list(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            for _ in range(size):
+                title = self.make_title(questions=1)
+                TitleFavorite.objects.create(user=self.learner, title=title)
+                Rating.objects.create(user=self.learner, title=title, stars=4)
+            return lambda: self.client.get('/api/quiz/titles/', {'page_size': 50})
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(TitleViewSet, 'list', prepare)
+
+    def test_title_retrieve(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            return lambda: self.client.get(f'/api/quiz/titles/{title.id}/')
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(TitleViewSet, 'retrieve', prepare)
+
+    def test_title_retrieve_by_owner(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size, status=Title.PRIVATE)
+            return lambda: self.client.get(f'/api/quiz/titles/{title.id}/')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'retrieve', prepare)
+
+    def test_title_create(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            for _ in range(size):
+                self.make_title()
+            return lambda: self.client.post('/api/quiz/titles/', {'name': '新しい問題集', 'status': Title.PUBLIC}, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'create', prepare)
+
+    def test_title_update(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            payload = {'name': '更新後', 'description': '説明', 'status': Title.PRIVATE}
+            return lambda: self.client.put(f'/api/quiz/titles/{title.id}/', payload, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'update', prepare)
+
+    def test_title_partial_update(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            return lambda: self.client.patch(f'/api/quiz/titles/{title.id}/', {'name': '更新後'}, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'partial_update', prepare)
+
+    def test_title_destroy(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            for question in title.questions.all():
+                QuestionFavorite.objects.create(user=self.learner, question=question)
+                QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            Rating.objects.create(user=self.learner, title=title, stars=3)
+            return lambda: self.client.delete(f'/api/quiz/titles/{title.id}/')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'destroy', prepare)
+
+    def test_title_questions(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            return lambda: self.client.get(f'/api/quiz/titles/{title.id}/questions/')
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(TitleViewSet, 'questions', prepare)
+
+    def test_title_check(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            answers = [
+                {'question_id': question.id, 'selected_choice_ids': [question.choices.all()[0].id]}
+                for question in title.questions.all()
+            ]
+            return lambda: self.client.post(f'/api/quiz/titles/{title.id}/check/', {'answers': answers}, format='json')
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(TitleViewSet, 'check', prepare)
+
+    def test_title_reorder(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            question_ids = list(title.questions.order_by('-order').values_list('id', flat=True))
+            payload = {'question_ids': question_ids}
+            return lambda: self.client.post(f'/api/quiz/titles/{title.id}/reorder/', payload, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'reorder', prepare)
+
+    def test_title_export(self):
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=size)
+            return lambda: self.client.get(f'/api/quiz/titles/{title.id}/export/', {'format': 'ndjson'})
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(TitleViewSet, 'export', prepare)
+
+    def test_title_import_questions(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .views import TitleViewSet
+
+        def prepare(size):
+            title = self.make_title(questions=1)
+            content = '\n'.join(json.dumps(self.question_payload(), ensure_ascii=False) for _ in range(size))
+            upload = SimpleUploadedFile('bank.ndjson', content.encode('utf-8'))
+            return lambda: self.client.post(f'/api/quiz/titles/{title.id}/import/', {'file': upload}, format='multipart')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(TitleViewSet, 'import_questions', prepare)
+
+    # --- QuestionViewSet ---
+
+    def test_question_list(self):
+        from .views import QuestionViewSet
+
+        def prepare(size):
+            for question in self.make_title(questions=size).questions.all():
+                QuestionFavorite.objects.create(user=self.learner, question=question)
+                QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            return lambda: self.client.get('/api/quiz/questions/', {'page_size': 50})
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(QuestionViewSet, 'list', prepare)
+
+    def test_question_retrieve(self):
+        from .views import QuestionViewSet
+
+        def prepare(size):
+            question = self.make_question(choices=size)
+            return lambda: self.client.get(f'/api/quiz/questions/{question.id}/')
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(QuestionViewSet, 'retrieve', prepare, sizes=(2, 5))
+
+    def test_question_create(self):
+        from .views import QuestionViewSet
+
+        title = self.make_title(questions=1)
+
+        def prepare(size):
+            payload = {'title_id': title.id, **self.question_payload(choices=size)}
+            return lambda: self.client.post('/api/quiz/questions/', payload, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(QuestionViewSet, 'create', prepare, sizes=(2, 5))
+
+    def test_question_update(self):
+        from .views import QuestionViewSet
+
+        def prepare(size):
+            question = self.make_question(choices=size)
+            payload = {
+                'text': '更新後',
+                'explanation': '解説',
+                'question_type': 'single',
+                'choices': [
+                    {'id': choice.id, 'text': f'更新後{choice.order}', 'is_correct': choice.is_correct, 'order': choice.order}
+                    for choice in question.choices.all()
+                ],
+            }
+            return lambda: self.client.put(f'/api/quiz/questions/{question.id}/', payload, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(QuestionViewSet, 'update', prepare, sizes=(2, 5))
+
+    def test_question_partial_update(self):
+        from .views import QuestionViewSet
+
+        def prepare(size):
+            question = self.make_question(choices=size)
+            # 選択肢を省略すると正解数の検証に失敗するため、既存の選択肢をそのまま送る
+            payload = {
+                'text': '更新後',
+                'choices': [
+                    {'id': choice.id, 'text': choice.text, 'is_correct': choice.is_correct, 'order': choice.order}
+                    for choice in question.choices.all()
+                ],
+            }
+            return lambda: self.client.patch(f'/api/quiz/questions/{question.id}/', payload, format='json')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(QuestionViewSet, 'partial_update', prepare, sizes=(2, 5))
+
+    def test_question_destroy(self):
+        from .views import QuestionViewSet
+
+        def prepare(size):
+            question = self.make_question(choices=size)
+            QuestionFavorite.objects.create(user=self.learner, question=question)
+            QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            return lambda: self.client.delete(f'/api/quiz/questions/{question.id}/')
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertQueryBudget(QuestionViewSet, 'destroy', prepare, sizes=(2, 5))
+
+    def test_question_note(self):
+        from .views import QuestionViewSet
+
+        def make_notes(size):
+            # 他の問題のメモ（件数によらず1件だけ参照する）
+            for question in self.make_title(questions=size).questions.all():
+                QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            return self.make_question()
+
+        def prepare_get(size):
+            question = make_notes(size)
+            QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            return lambda: self.client.get(f'/api/quiz/questions/{question.id}/note/')
+
+        def prepare_post(size):
+            question = make_notes(size)
+            return lambda: self.client.post(f'/api/quiz/questions/{question.id}/note/', {'note': 'メモ'}, format='json')
+
+        def prepare_put(size):
+            question = make_notes(size)
+            QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            return lambda: self.client.put(f'/api/quiz/questions/{question.id}/note/', {'note': '更新後'}, format='json')
+
+        def prepare_delete(size):
+            question = make_notes(size)
+            QuestionNote.objects.create(user=self.learner, question=question, note='メモ')
+            return lambda: self.client.delete(f'/api/quiz/questions/{question.id}/note/')
+
+        self.client.force_authenticate(user=self.learner)
+        for method, prepare in [('GET', prepare_get), ('POST', prepare_post), ('PUT', prepare_put), ('DELETE', prepare_delete)]:
+            with self.subTest(method=method):
+                self.assertQueryBudget(QuestionViewSet, 'note', prepare)
+
+    def test_question_check(self):
+        from .views import QuestionViewSet
+
+        def prepare(size):
+            question = self.make_question(choices=size)
+            payload = {'selected_choice_ids': [question.choices.all()[0].id]}
+            return lambda: self.client.post(f'/api/quiz/questions/{question.id}/check/', payload, format='json')
+
+        self.client.force_authenticate(user=self.learner)
+        self.assertQueryBudget(QuestionViewSet, 'check', prepare, sizes=(2, 5))
+
+    # --- お気に入り・評価・メモ ---
+
+    def assertModelViewSetBudgets(self, viewset, url, make_item, create_payload, update_payload):
+        """一覧・詳細・作成・更新・削除のクエリ数を、利用者のデータ件数を変えて検証する"""
+        from apps.common.query_budget import get_view_actions
+
+        def make_items(size):
+            return [make_item() for _ in range(size)]
+
+        def prepare_list(size):
+            make_items(size)
+            return lambda: self.client.get(url, {'page_size': 50})
+
+        def prepare_retrieve(size):
+            item = make_items(size)[0]
+            return lambda: self.client.get(f'{url}{item.id}/')
+
+        def prepare_create(size):
+            make_items(size)
+            payload = create_payload()
+            return lambda: self.client.post(url, payload, format='json')
+
+        def prepare_update(size):
+            item = make_items(size)[0]
+            return lambda: self.client.put(f'{url}{item.id}/', update_payload(item), format='json')
+
+        def prepare_partial_update(size):
+            item = make_items(size)[0]
+            return lambda: self.client.patch(f'{url}{item.id}/', update_payload(item), format='json')
+
+        def prepare_destroy(size):
+            item = make_items(size)[0]
+            return lambda: self.client.delete(f'{url}{item.id}/')
+
+        self.client.force_authenticate(user=self.learner)
+        for action, prepare in [
+            ('list', prepare_list), ('retrieve', prepare_retrieve), ('create', prepare_create),
+            ('update', prepare_update), ('partial_update', prepare_partial_update), ('destroy', prepare_destroy),
+        ]:
+            if action not in get_view_actions(viewset):
+                continue
+            with self.subTest(action=action):
+                self.assertQueryBudget(viewset, action, prepare)
+
+    def test_title_favorites(self):
+        from .views import TitleFavoriteViewSet
+
+        self.assertModelViewSetBudgets(
+            TitleFavoriteViewSet, '/api/quiz/favorites/titles/',
+            make_item=lambda: TitleFavorite.objects.create(user=self.learner, title=self.make_title()),
+            create_payload=lambda: {'title_id': self.make_title().id},
+            update_payload=lambda item: {'title_id': self.make_title().id},
+        )
+
+    def test_question_favorites(self):
+        from .views import QuestionFavoriteViewSet
+
+        self.assertModelViewSetBudgets(
+            QuestionFavoriteViewSet, '/api/quiz/favorites/questions/',
+            make_item=lambda: QuestionFavorite.objects.create(user=self.learner, question=self.make_question()),
+            create_payload=lambda: {'question_id': self.make_question().id},
+            update_payload=lambda item: {'question_id': self.make_question().id},
+        )
+
+    def test_ratings(self):
+        from .views import RatingViewSet
+
+        self.assertModelViewSetBudgets(
+            RatingViewSet, '/api/quiz/ratings/',
+            make_item=lambda: Rating.objects.create(user=self.learner, title=self.make_title(), stars=3),
+            create_payload=lambda: {'title_id': self.make_title().id, 'stars': 5, 'comment': '良い'},
+            update_payload=lambda item: {'stars': 4, 'comment': '更新後'},
+        )
+
+    def test_notes(self):
+        from .views import QuestionNoteViewSet
+
+        self.assertModelViewSetBudgets(
+            QuestionNoteViewSet, '/api/quiz/notes/',
+            make_item=lambda: QuestionNote.objects.create(user=self.learner, question=self.make_question(), note='メモ'),
+            create_payload=lambda: {'note': 'メモ'},
+            update_payload=lambda item: {'note': '更新後'},
+        )
+
+    def test_exempt_action_is_not_undeclared(self):
+        """対象外の理由を宣言したアクションは上限の宣言がなくてもよい"""
+        from apps.common.query_budget import get_undeclared_actions
+        from .views import QuestionNoteViewSet
+
+        self.assertNotIn('create', QuestionNoteViewSet.query_budgets)
+        self.assertEqual(get_undeclared_actions(QuestionNoteViewSet), [])
@@ -0,0 +1,90 @@
+"""
+ログインユーザーごとの状態（お気に入り・評価・メモ）
+
+一覧の各行に Exists / Subquery でユーザーの状態を付与し、フロントエンドがお気に入り一覧の全件取得や
+問題ごとのメモ取得をしなくてもバッジを表示できるようにする。
+ユーザーに依存しない共有キャッシュ・スナップショットから返す問題一覧には、
+ページ内の問題IDに対する1回のクエリで状態を重ねる（overlay_question_user_state）。
+
+状態はユーザーごとに変わるため、条件付きGETの検証子にはユーザーの状態の更新日時
+（get_user_state_changed_at）を含める。
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import Question, QuestionFavorite, QuestionNote, Rating, TitleFavorite
+
+
+def _select_annotations(annotations, fields):
+    """出力するフィールド（None は全て）の注釈のみ残す"""
+    if fields is None:
+        return annotations
+    return {name: expression for name, expression in annotations.items() if name in fields}
+
+
+def annotate_title_user_state(queryset, user, fields=None):
+    """問題集に is_favorited / my_rating を付与（未ログインの場合はそのまま）"""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(**_select_annotations({
+        'is_favorited': Exists(TitleFavorite.objects.filter(user=user, title=OuterRef('pk'))),
+        'my_rating': Subquery(Rating.objects.filter(user=user, title=OuterRef('pk')).values('stars')[:1]),
+    }, fields))
+
+
+def annotate_question_user_state(queryset, user, fields=None):
+    """問題に is_favorited / has_note を付与（未ログインの場合はそのまま）"""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(**_select_annotations({
+        'is_favorited': Exists(QuestionFavorite.objects.filter(user=user, question=OuterRef('pk'))),
+        'has_note': Exists(QuestionNote.objects.filter(user=user, question=OuterRef('pk'))),
+    }, fields))
+
+
+def overlay_question_user_state(items, user):
+    """
+    シリアライズ済みの問題に is_favorited / has_note を重ねた新しいリストを返す
+    items は共有キャッシュの値の場合があるため、要素は書き換えずにコピーする
+    """
+    states = {}
+    if user.is_authenticated and items:
+        rows = (
+            annotate_question_user_state(Question.objects.filter(pk__in=[item['id'] for item in items]), user)
+            .filter(Q(is_favorited=True) | Q(has_note=True))
+            .values_list('pk', 'is_favorited', 'has_note')
+        )
+        states = {pk: (is_favorited, has_note) for pk, is_favorited, has_note in rows}
+
+    overlaid = []
+    for item in items:
+        is_favorited, has_note = states.get(item['id'], (False, False))
+        overlaid.append({**item, 'is_favorited': is_favorited, 'has_note': has_note})
+    return overlaid
+
+
+def user_state_cache_key(user_id):
+    return f'quiz:user-state:{user_id}'
+
+
+def get_user_state_changed_at(user):
+    """ユーザーの状態の更新日時（未ログインは None、キャッシュから消えていれば現在時刻を発行）"""
+    if not user.is_authenticated:
+        return None
+    key = user_state_cache_key(user.pk)
+    timestamp = cache.get(key)
+    if timestamp is None:
+        cache.add(key, timezone.now().timestamp(), None)
+        timestamp = cache.get(key)
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def touch_user_state(user_id):
+    """コミット後にユーザーの状態の更新日時を進める"""
+    transaction.on_commit(
+        lambda: cache.set(user_state_cache_key(user_id), timezone.now().timestamp(), None)
+    )
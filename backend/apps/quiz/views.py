@@ -1,44 +1,90 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from .models import Title, Question, Choice, TitleFavorite, QuestionFavorite, Rating, QuestionNote
 from .serializers import (
-    TitleSerializer, TitleDetailSerializer, TitleCreateSerializer,
-    QuestionSerializer, QuestionCreateSerializer,
+    TitleSerializer, TitleWithUserStateSerializer, TitleDetailSerializer, TitleCreateSerializer,
+    QuestionSerializer, QuestionWithUserStateSerializer, QuestionCreateSerializer,
     TitleFavoriteSerializer, QuestionFavoriteSerializer,
     RatingSerializer, RatingCreateSerializer,
     QuestionNoteSerializer, QuestionNoteCreateSerializer,
-    CheckAnswerSerializer, CheckAnswerResponseSerializer
+    CheckAnswerSerializer, CheckAnswerResponseSerializer,
+    BatchCheckAnswerSerializer, BatchCheckAnswerResponseSerializer,
+    ReorderSerializer
 )
 from .permissions import (
     IsOwnerOrReadOnly, IsTitleOwnerOrReadOnly, IsOwner,
     CanAccessTitle, CanAccessQuestion, IsPublicTitleOnly
 )
+from apps.common.dynamic_fields import FieldSpec
+from apps.common.renderers import MessagePackRenderer
+from .optimizers import QuerysetOptimizerMixin, prefetch_objects
+from .payload_cache import get_or_build, payload_cache_key
+from .snapshots import document_response, get_current_snapshot, load_document, snapshots_enabled
+from .ordering import apply_order
+from .renderers import NDJSONRenderer
+from .signals import touch_title
+from .search import get_search_backend
+from .conditional import ConditionalGetMixin, get_titles_list_version
+from .answer_keys import get_answer_keys, get_checked_answer_key, get_title_access, get_title_owner_id
+from .exporters import EXPORTERS
+from .importers import PARSERS, ImportParseError, QuestionImporter, detect_format
+from .user_state import (
+    annotate_question_user_state, annotate_title_user_state, get_user_state_changed_at,
+    overlay_question_user_state
+)
+from .sampling import (
+    RandomParams, get_default_limit, get_title_question_ids, invalidate_title_question_ids,
+    order_by_ids, sample_ids, sample_items, sample_queryset_ids, sort_by_ids
+)
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(ConditionalGetMixin, QuerysetOptimizerMixin, viewsets.ModelViewSet):
     """問題集（タイトル）のViewSet"""
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-
-    def get_queryset(self):
-        """公開タイトル + 自分のタイトルを取得"""
+    cursor_ordering = ('-created_at', '-id')
+    # 1リクエストのクエリ数の上限（データ量によらず一定、apps.common.query_budget のテストで検証）
+    query_budgets = {
+        'list': 3, 'retrieve': 5, 'create': 3, 'update': 6, 'partial_update': 6, 'destroy': 16,
+        'questions': 6, 'check': 3, 'reorder': 8, 'export': 3, 'import_questions': 11,
+    }
+
+    def get_visible_queryset(self):
+        """公開タイトル + 自分のタイトル"""
         if self.request.user.is_authenticated:
-            queryset = Title.objects.filter(
+            return Title.objects.filter(
                 Q(status=Title.PUBLIC) | Q(owner=self.request.user)
             ).distinct()
-        else:
-            queryset = Title.objects.filter(status=Title.PUBLIC)
+        return Title.objects.filter(status=Title.PUBLIC)
+
+    def get_queryset(self):
+        """公開タイトル + 自分のタイトルを取得"""
+        queryset = self.get_visible_queryset()
 
-        # 検索機能
+        # 検索機能（全文検索インデックスを使用し、関連度順に並べる）
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
+            queryset = get_search_backend().search(queryset, search)
+
+        # 一覧ではログインユーザーのお気に入り・評価の状態を各行に付与
+        if self.action == 'list':
+            queryset = annotate_title_user_state(queryset, self.request.user, self.get_output_field_names())
 
-        return queryset
+        return self.optimize_queryset(queryset)
+
+    def get_cursor_ordering(self):
+        """検索時は関連度順を保ったまま続きを返すため、関連度（search_rank）もカーソルに含める"""
+        if self.request.query_params.get('search'):
+            return ('-search_rank',) + self.cursor_ordering
+        return self.cursor_ordering
 
     def get_serializer_class(self):
         """アクションに応じてシリアライザを切り替え"""
@@ -46,8 +92,81 @@ class TitleViewSet(viewsets.ModelViewSet):
             return TitleDetailSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return TitleCreateSerializer
+        elif self.action == 'list':
+            return TitleWithUserStateSerializer
         return TitleSerializer
 
+    def get_field_spec(self):
+        """
+        ?fields= 等をシリアライザ・SQL に反映するのは一覧のみ
+        詳細・問題一覧はユーザー共通のデータを共有キャッシュから返すため、シリアライズ後のデータに適用する
+        """
+        if self.action != 'list':
+            return None
+        return super().get_field_spec()
+
+    def apply_field_spec(self, data):
+        spec = FieldSpec.from_request(self.request)
+        return spec.apply(data) if spec is not None else data
+
+    def list(self, request, *args, **kwargs):
+        """タイトル一覧を取得（一覧の内容が変わっていなければ 304）"""
+        not_modified = self.check_conditional(
+            request, 'titles', get_titles_list_version(), get_user_state_changed_at(request.user)
+        )
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
+
+    def get_learner_snapshot(self):
+        """所有者以外が公開問題集を参照する場合は、最新のスナップショットを返す（使用できなければNone）"""
+        pk = str(self.kwargs['pk'])
+        if not snapshots_enabled() or not pk.isdigit():
+            return None
+        # 公開状態はスナップショットの取得時にDBで照合する
+        owner_id = get_title_owner_id(int(pk))
+        if owner_id is None:
+            return None
+        if self.request.user.is_authenticated and owner_id == self.request.user.id:
+            return None
+        return get_current_snapshot(int(pk))
+
+    def retrieve(self, request, *args, **kwargs):
+        """タイトル詳細を取得（内容バージョンが変わっていなければ問題を読み込まずに 304）"""
+        snapshot = self.get_learner_snapshot()
+        if snapshot is not None:
+            not_modified = self.check_conditional(
+                request, 'title', snapshot.title_id, snapshot.content_version,
+                last_modified=snapshot.content_updated_at
+            )
+            if not_modified is not None:
+                return not_modified
+            # JSONの場合はコンパイル済みのバイト列をそのまま返す（フィールドの指定がある場合を除く）
+            if request.accepted_renderer.format == 'json' and FieldSpec.from_request(request) is None:
+                return document_response(snapshot, request)
+            return Response(self.apply_field_spec(load_document(snapshot)))
+
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        title = get_object_or_404(queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(request, title)
+
+        not_modified = self.check_conditional(
+            request, 'title', title.id, title.content_version, last_modified=title.content_updated_at
+        )
+        if not_modified is not None:
+            return not_modified
+
+        if title.status == Title.PUBLIC:
+            # 公開問題集はユーザーに依存しないため、シリアライズ済みデータを共有キャッシュから返す
+            data = get_or_build(payload_cache_key('title-detail', title), lambda: self.serialize_title(title))
+        else:
+            data = self.serialize_title(title)
+        return Response(self.apply_field_spec(data))
+
+    def serialize_title(self, title):
+        prefetch_objects([title], self.get_serializer_class())
+        return self.get_serializer(title).data
+
     def perform_create(self, serializer):
         """作成時にowner を設定"""
         serializer.save(owner=self.request.user)
@@ -63,25 +182,261 @@ class TitleViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def questions(self, request, pk=None):
         """タイトルに紐づく問題一覧を取得"""
+        random_params = RandomParams.from_request(request)
+        snapshot = self.get_learner_snapshot()
+        if snapshot is not None:
+            return self.snapshot_questions_response(request, snapshot, random_params)
+
+        title = self.get_object()
+
+        # アクセス権限チェック
+        if title.status != Title.PUBLIC and (not request.user.is_authenticated or title.owner_id != request.user.id):
+            return Response({'detail': 'このタイトルにアクセスする権限がありません。'}, status=status.HTTP_403_FORBIDDEN)
+
+        not_modified = self.check_questions_conditional(
+            request, random_params, title.id, title.content_version, title.content_updated_at
+        )
+        if not_modified is not None:
+            return not_modified
+
+        questions = self.optimize_queryset(title.questions.all(), QuestionSerializer)
+
+        if title.status == Title.PUBLIC:
+            # 公開問題集は全問題のシリアライズ済みデータを共有キャッシュから取得し、ランダム表示もそこから選ぶ
+            data = get_or_build(
+                payload_cache_key('title-questions', title),
+                lambda: QuestionSerializer(questions, many=True).data
+            )
+            if random_params.enabled:
+                data = sample_items(data, random_params.seed, random_params.limit)
+        else:
+            # ランダム表示モード（キャッシュしたID一覧からシード付きで選び、その行だけ読み込む）
+            if random_params.enabled:
+                ids = sample_ids(get_title_question_ids(title.id), random_params.seed, random_params.limit)
+                questions = sort_by_ids(questions.filter(id__in=ids), ids)
+            data = QuestionSerializer(questions, many=True).data
+
+        response = Response(self.questions_data(data))
+        if random_params.enabled:
+            response['X-Random-Seed'] = random_params.seed
+        return response
+
+    def snapshot_questions_response(self, request, snapshot, random_params):
+        """公開スナップショットから問題一覧を返す"""
+        not_modified = self.check_questions_conditional(
+            request, random_params, snapshot.title_id, snapshot.content_version, snapshot.content_updated_at
+        )
+        if not_modified is not None:
+            return not_modified
+
+        data = load_document(snapshot)['questions']
+        if random_params.enabled:
+            data = sample_items(data, random_params.seed, random_params.limit)
+        response = Response(self.questions_data(data))
+        if random_params.enabled:
+            response['X-Random-Seed'] = random_params.seed
+        return response
+
+    def questions_data(self, data):
+        """問題一覧のレスポンスデータ（ログインユーザーの状態を重ね、?fields= 等を適用）"""
+        spec = FieldSpec.from_request(self.request)
+        if spec is None or spec.includes('is_favorited') or spec.includes('has_note'):
+            data = overlay_question_user_state(data, self.request.user)
+        return spec.apply(data) if spec is not None else data
+
+    def check_questions_conditional(self, request, random_params, title_id, content_version, content_updated_at):
+        """問題一覧の条件付きGET（内容バージョンとログインユーザーの状態の更新日時から検証子を作成）"""
+        # シード未指定のランダム表示は毎回異なるため条件付きGETの対象外
+        if random_params.enabled and not request.query_params.get('seed'):
+            return None
+        state_changed_at = get_user_state_changed_at(request.user)
+        last_modified = max(filter(None, [content_updated_at, state_changed_at]))
+        return self.check_conditional(
+            request, 'questions', title_id, content_version, state_changed_at, last_modified=last_modified
+        )
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='check')
+    def check(self, request, pk=None):
+        """問題集の複数問題の回答をまとめて採点する"""
+        title_access = get_title_access(int(pk)) if pk.isdigit() else None
+        if title_access is None:
+            return Response(
+                {'detail': '指定されたリソースが見つかりません。'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not title_access.can_access(request.user):
+            return Response(
+                {'detail': 'このタイトルにアクセスする権限がありません。'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # 回答に含まれる問題の解答をまとめて取得（キャッシュにないもの・内容バージョンが古いものは1回のクエリで読み込む）
+        answer_keys = {
+            question_id: answer_key
+            for question_id, answer_key in get_answer_keys(
+                self._extract_question_ids(request.data), title_access.content_version
+            ).items()
+            if answer_key.title_id == title_access.title_id
+        }
+
+        serializer = BatchCheckAnswerSerializer(data=request.data, context={'answer_keys': answer_keys})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        for answer in serializer.validated_data['answers']:
+            answer_key = answer_keys[answer['question_id']]
+            results.append({
+                'question_id': answer_key.question_id,
+                'selected_choice_ids': answer['selected_choice_ids'],
+                'is_correct': answer_key.is_correct(answer['selected_choice_ids']),
+                'explanation': answer_key.explanation,
+                'correct_choice_ids': sorted(answer_key.correct_choice_ids),
+            })
+
+        correct_count = sum(1 for result in results if result['is_correct'])
+        response_data = {
+            'title_id': title_access.title_id,
+            'total': len(results),
+            'correct_count': correct_count,
+            'score': round(correct_count / len(results) * 100, 1),
+            'results': results,
+        }
+
+        response_serializer = BatchCheckAnswerResponseSerializer(response_data)
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def reorder(self, request, pk=None):
+        """問題・選択肢の並び順をまとめて更新する（変更が必要な行のみ1文で更新）"""
+        title = self.get_object()
+        if title.owner_id != request.user.id:
+            return Response({'detail': 'このタイトルを編集する権限がありません。'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        question_ids = serializer.validated_data.get('question_ids')
+        choice_ids_map = serializer.validated_data.get('choices', {})
+
+        with transaction.atomic():
+            # 同じ問題集への並べ替え・問題追加と競合しないよう問題集の行をロック
+            Title.objects.select_for_update().filter(pk=title.pk).first()
+
+            updated_questions = []
+            if question_ids:
+                questions = {q.id: q for q in Question.objects.filter(title=title).only('id', 'title_id', 'order')}
+                if set(question_ids) != set(questions):
+                    raise ValidationError({'question_ids': ['問題集に含まれる全ての問題IDを指定してください。']})
+                updated_questions = apply_order([questions[pk] for pk in question_ids])
+                Question.objects.bulk_update(updated_questions, ['order'], batch_size=500)
+                if updated_questions:
+                    Title.reserve_question_order(title.pk, max(q.order for q in updated_questions))
+
+            updated_choices = []
+            if choice_ids_map:
+                choices = {}
+                for choice in Choice.objects.filter(
+                    question__title=title, question_id__in=choice_ids_map
+                ).only('id', 'question_id', 'order'):
+                    choices.setdefault(choice.question_id, {})[choice.id] = choice
+                for question_id, choice_ids in choice_ids_map.items():
+                    question_choices = choices.get(question_id, {})
+                    if not question_choices or set(choice_ids) != set(question_choices):
+                        raise ValidationError({'choices': {
+                            str(question_id): ['問題に含まれる全ての選択肢IDを指定してください。']
+                        }})
+                    updated_choices += apply_order([question_choices[pk] for pk in choice_ids])
+                Choice.objects.bulk_update(updated_choices, ['order'], batch_size=500)
+
+            # bulk_update はシグナルを発行しないため、内容バージョンと並び順を含むキャッシュを明示的に更新
+            if updated_questions or updated_choices:
+                touch_title(title.pk)
+            if updated_questions:
+                transaction.on_commit(lambda: invalidate_title_question_ids(title.pk))
+
+        return Response({
+            'updated_questions': len(updated_questions),
+            'updated_choices': len(updated_choices),
+        })
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, NDJSONRenderer, MessagePackRenderer])
+    def export(self, request, pk=None):
+        """問題集を NDJSON / JSON / MessagePack でストリーミング出力する（?format=ndjson|json|msgpack）"""
         title = self.get_object()
 
         # アクセス権限チェック
-        if title.status != Title.PUBLIC and (not request.user.is_authenticated or title.owner != request.user):
+        if title.status != Title.PUBLIC and (not request.user.is_authenticated or title.owner_id != request.user.id):
             return Response({'detail': 'このタイトルにアクセスする権限がありません。'}, status=status.HTTP_403_FORBIDDEN)
 
-        questions = title.questions.all()
+        renderer = request.accepted_renderer
+        content_type = f'{renderer.media_type}; charset=utf-8' if renderer.charset else renderer.media_type
+        response = StreamingHttpResponse(EXPORTERS[renderer.format](title), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="title-{title.id}.{renderer.format}"'
+        return response
+
+    @action(
+        detail=True, methods=['post'], permission_classes=[IsAuthenticated],
+        parser_classes=[MultiPartParser, FormParser], url_path='import'
+    )
+    def import_questions(self, request, pk=None):
+        """CSV / JSON / NDJSON / MessagePack ファイルから問題を一括インポートする"""
+        title = self.get_object()
+        if title.owner_id != request.user.id:
+            return Response({'detail': 'このタイトルに問題を追加する権限がありません。'}, status=status.HTTP_403_FORBIDDEN)
 
-        # ランダム表示モード
-        if request.query_params.get('random', '').lower() == 'true':
-            questions = questions.order_by('?')
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['インポートするファイルを指定してください。']}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = QuestionSerializer(questions, many=True)
-        return Response(serializer.data)
+        file_format = detect_format(upload.name, request.data.get('file_format'))
+        if file_format is None:
+            return Response(
+                {'file_format': ['ファイル形式は csv / json / ndjson / msgpack のいずれかを指定してください。']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        skip_errors = str(request.data.get('skip_errors', '')).lower() == 'true'
+        importer = QuestionImporter(title, skip_errors=skip_errors)
+        try:
+            imported = importer.run(PARSERS[file_format](upload.chunks()))
+        except ImportParseError as e:
+            return Response({'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
 
-class QuestionViewSet(viewsets.ModelViewSet):
+        response_data = {
+            'imported': imported,
+            'error_count': importer.error_count,
+            'errors': importer.errors,
+        }
+        if importer.error_count and not skip_errors:
+            response_data['detail'] = 'エラーのある行が含まれるため、インポートを取り消しました。'
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def _extract_question_ids(data):
+        """バリデーション前のリクエストから問題IDを取り出す（不正な値は無視し、後段のバリデーションで検出）"""
+        answers = data.get('answers') if hasattr(data, 'get') else None
+        if not isinstance(answers, list):
+            return []
+        question_ids = []
+        for answer in answers[:BatchCheckAnswerSerializer.MAX_ANSWERS]:
+            question_id = answer.get('question_id') if isinstance(answer, dict) else None
+            if isinstance(question_id, int) and not isinstance(question_id, bool):
+                question_ids.append(question_id)
+            elif isinstance(question_id, str) and question_id.isdigit():
+                question_ids.append(int(question_id))
+        return question_ids
+
+
+class QuestionViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     """問題のViewSet"""
     permission_classes = [IsAuthenticatedOrReadOnly, IsTitleOwnerOrReadOnly]
+    cursor_ordering = ('title_id', 'order', 'id')
+    query_budgets = {
+        'list': 3, 'retrieve': 2, 'create': 15, 'update': 12, 'partial_update': 11, 'destroy': 12,
+        'note': 7, 'check': 3,
+    }
 
     def get_queryset(self):
         """公開タイトルの問題 + 自分のタイトルの問題を取得"""
@@ -92,34 +447,62 @@ class QuestionViewSet(viewsets.ModelViewSet):
         else:
             queryset = Question.objects.filter(title__status=Title.PUBLIC)
 
-        # ランダム表示モード
-        if self.request.query_params.get('random', '').lower() == 'true':
-            queryset = queryset.order_by('?')
-
-        return queryset
+        # ランダム表示モード（シード付きでIDを選び、選んだ順序で並べる）
+        if self.action == 'list':
+            self.random_params = RandomParams.from_request(self.request, default_limit=get_default_limit())
+            if self.random_params.enabled:
+                ids = sample_queryset_ids(queryset, self.random_params.seed, self.random_params.limit)
+                queryset = order_by_ids(queryset, ids)
+
+        # 一覧・詳細ではログインユーザーのお気に入り・メモの状態を付与
+        if self.action in ['list', 'retrieve']:
+            queryset = annotate_question_user_state(queryset, self.request.user, self.get_output_field_names())
+
+        return self.optimize_queryset(queryset)
+
+    def is_random_mode(self):
+        random_params = getattr(self, 'random_params', None)
+        return random_params is not None and random_params.enabled
+
+    def get_cursor_ordering(self):
+        """ランダム表示モードはシードで選んだ順序（random_position）のまま続きを返す"""
+        if self.is_random_mode():
+            return ('random_position',)
+        return self.cursor_ordering
+
+    def get_cursor_query_params(self):
+        """ランダム表示モードの次ページは同じシードで選び直す（シード未指定で生成した場合も引き継ぐ）"""
+        if self.is_random_mode():
+            return {'seed': self.random_params.seed}
+        return {}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """ランダム表示モードで使用したシードをヘッダで返す"""
+        if self.is_random_mode():
+            response['X-Random-Seed'] = self.random_params.seed
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get_serializer_class(self):
         """アクションに応じてシリアライザを切り替え"""
         if self.action in ['create', 'update', 'partial_update']:
             return QuestionCreateSerializer
+        elif self.action in ['list', 'retrieve']:
+            return QuestionWithUserStateSerializer
         return QuestionSerializer
 
     def perform_create(self, serializer):
         """作成時にtitleを設定し、orderを自動採番"""
-        from django.db.models import Max
-
         title_id = self.request.data.get('title_id')
         try:
             title = Title.objects.get(id=title_id)
             if title.owner != self.request.user:
                 raise Exception('このタイトルに問題を追加する権限がありません。')
 
-            # orderが指定されていない、または0の場合は自動採番
+            # orderが指定されていない、または0の場合は採番カウンタから払い出す
             order = serializer.validated_data.get('order', 0)
             if order == 0:
-                max_order = title.questions.aggregate(Max('order'))['order__max']
-                next_order = (max_order or 0) + 1
-                serializer.save(title=title, order=next_order)
+                with transaction.atomic():
+                    serializer.save(title=title, order=Title.allocate_question_orders(title.id))
             else:
                 serializer.save(title=title)
         except Title.DoesNotExist:
@@ -189,58 +572,51 @@ class QuestionViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def check(self, request, pk=None):
         """回答を採点する"""
-        # get_object()ではなく直接取得（querysetフィルタリングを避ける）
-        try:
-            question = Question.objects.get(pk=pk)
-        except Question.DoesNotExist:
+        # get_object()ではなくキャッシュした解答を参照（問題集の内容バージョンと照合し、古ければ読み込み直す）
+        answer_key, title_access = get_checked_answer_key(int(pk)) if pk.isdigit() else (None, None)
+        if title_access is None:
             return Response(
                 {'detail': '指定されたリソースが見つかりません。'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
         # アクセス権限チェック: 公開タイトルは全員OK、非公開/下書きは所有者のみ
-        if question.title.status != Title.PUBLIC:
-            if not request.user.is_authenticated or question.title.owner != request.user:
-                return Response(
-                    {'detail': 'この問題にアクセスする権限がありません。'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
+        if not title_access.can_access(request.user):
+            return Response(
+                {'detail': 'この問題にアクセスする権限がありません。'},
+                status=status.HTTP_403_FORBIDDEN
+            )
 
         # バリデーション
-        serializer = CheckAnswerSerializer(data=request.data, context={'question': question})
+        serializer = CheckAnswerSerializer(data=request.data, context={'answer_key': answer_key})
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         selected_choice_ids = serializer.validated_data['selected_choice_ids']
 
-        # 正解判定
-        correct_choice_ids = set(question.choices.filter(is_correct=True).values_list('id', flat=True))
-        selected_set = set(selected_choice_ids)
-
-        # 選択した選択肢が全て正解 かつ 正解が全て選択されている
-        is_correct = (selected_set == correct_choice_ids)
-
         # レスポンス作成
         response_data = {
-            'question_id': question.id,
+            'question_id': answer_key.question_id,
             'selected_choice_ids': selected_choice_ids,
-            'is_correct': is_correct,
-            'explanation': question.explanation or '',
-            'correct_choice_ids': list(correct_choice_ids)
+            'is_correct': answer_key.is_correct(selected_choice_ids),
+            'explanation': answer_key.explanation,
+            'correct_choice_ids': sorted(answer_key.correct_choice_ids)
         }
 
         response_serializer = CheckAnswerResponseSerializer(response_data)
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
 
-class TitleFavoriteViewSet(viewsets.ModelViewSet):
+class TitleFavoriteViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     """問題集のお気に入りのViewSet"""
     serializer_class = TitleFavoriteSerializer
     permission_classes = [IsAuthenticated, IsOwner]
+    cursor_ordering = ('-created_at', '-id')
+    query_budgets = {'list': 2, 'retrieve': 1, 'create': 3, 'update': 7, 'partial_update': 7, 'destroy': 2}
 
     def get_queryset(self):
         """自分のお気に入りのみ取得"""
-        return TitleFavorite.objects.filter(user=self.request.user)
+        return self.optimize_queryset(TitleFavorite.objects.filter(user=self.request.user))
 
     def perform_create(self, serializer):
         """作成時にuserを設定"""
@@ -253,14 +629,16 @@ class TitleFavoriteViewSet(viewsets.ModelViewSet):
         return [IsAuthenticated(), IsOwner()]
 
 
-class QuestionFavoriteViewSet(viewsets.ModelViewSet):
+class QuestionFavoriteViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     """問題のお気に入りのViewSet"""
     serializer_class = QuestionFavoriteSerializer
     permission_classes = [IsAuthenticated, IsOwner]
+    cursor_ordering = ('-created_at', '-id')
+    query_budgets = {'list': 3, 'retrieve': 2, 'create': 3, 'update': 16, 'partial_update': 16, 'destroy': 3}
 
     def get_queryset(self):
         """自分のお気に入りのみ取得"""
-        return QuestionFavorite.objects.filter(user=self.request.user)
+        return self.optimize_queryset(QuestionFavorite.objects.filter(user=self.request.user))
 
     def perform_create(self, serializer):
         """作成時にuserを設定"""
@@ -273,20 +651,23 @@ class QuestionFavoriteViewSet(viewsets.ModelViewSet):
         return [IsAuthenticated(), IsOwner()]
 
 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     """評価のViewSet"""
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwner]
+    cursor_ordering = ('-created_at', '-id')
+    query_budgets = {'list': 2, 'retrieve': 1, 'create': 3, 'update': 4, 'partial_update': 4, 'destroy': 3}
 
     def get_queryset(self):
         """公開タイトルの評価のみ取得"""
         if self.action == 'list':
             # 一覧取得時は全ての公開タイトルの評価を取得
-            return Rating.objects.filter(title__status=Title.PUBLIC)
-        else:
+            queryset = Rating.objects.filter(title__status=Title.PUBLIC)
+        elif self.request.user.is_authenticated:
             # 詳細・更新・削除時は自分の評価のみ
-            if self.request.user.is_authenticated:
-                return Rating.objects.filter(user=self.request.user)
+            queryset = Rating.objects.filter(user=self.request.user)
+        else:
             return Rating.objects.none()
+        return self.optimize_queryset(queryset)
 
     def get_serializer_class(self):
         """アクションに応じてシリアライザを切り替え"""
@@ -312,14 +693,18 @@ class RatingViewSet(viewsets.ModelViewSet):
         return [IsAuthenticatedOrReadOnly()]
 
 
-class QuestionNoteViewSet(viewsets.ModelViewSet):
+class QuestionNoteViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     """問題メモのViewSet"""
     serializer_class = QuestionNoteSerializer
     permission_classes = [IsAuthenticated, IsOwner]
+    cursor_ordering = ('-updated_at', '-id')
+    query_budgets = {'list': 3, 'retrieve': 2, 'update': 3, 'partial_update': 3, 'destroy': 3}
+    # 既知の不具合: 一覧への POST は対象の問題を指定できず常に失敗する（作成は questions/{id}/note/ から）
+    query_budget_exemptions = {'create': '一覧への POST は対象の問題を指定できず、正常なレスポンスを計測できない'}
 
     def get_queryset(self):
         """自分のメモのみ取得"""
-        return QuestionNote.objects.filter(user=self.request.user)
+        return self.optimize_queryset(QuestionNote.objects.filter(user=self.request.user))
 
     def get_permissions(self):
         """全アクションで認証と所有者チェックが必要"""
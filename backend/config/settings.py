@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     # Local apps
     'apps.accounts',  # カスタムユーザーモデル（apps.quizより前に配置）
     'apps.quiz',
+    'apps.benchmarks',  # ベンチマーク用のデータ作成・計測コマンド（モデルなし）
 ]
 
 MIDDLEWARE = [
@@ -108,6 +109,55 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    # Production: 全ワーカーで共有するRedis（公開問題集のレスポンス・採点用の解答などをキャッシュ）
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'quizhub',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    # Development: プロセス内メモリ
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'quizhub',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+# 公開問題集のレスポンスキャッシュ（apps.quiz.payload_cache）
+QUIZ_PAYLOAD_CACHE_TIMEOUT = int(os.getenv('QUIZ_PAYLOAD_CACHE_TIMEOUT', 60 * 10))
+QUIZ_PAYLOAD_LOCAL_CACHE_SIZE = int(os.getenv('QUIZ_PAYLOAD_LOCAL_CACHE_SIZE', 256))
+
+# JWT認証時のユーザーキャッシュ（apps.accounts.authentication）
+ACCOUNTS_USER_CACHE_TIMEOUT = int(os.getenv('ACCOUNTS_USER_CACHE_TIMEOUT', 60))
+
+# ログイン日時の書き込み間隔（apps.accounts.last_login、0 で即時書き込み）
+ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv('ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL', 60))
+ACCOUNTS_LAST_LOGIN_BUFFER_SIZE = int(os.getenv('ACCOUNTS_LAST_LOGIN_BUFFER_SIZE', 1000))
+# 失効トークンの書き込み間隔（apps.accounts.revocation、0 でリクエスト中に書き込み）
+# 共有キャッシュ（Redis）がない場合はプロセスをまたいだ再利用を DB の一意制約で防ぐため 0
+ACCOUNTS_REVOKED_TOKEN_FLUSH_INTERVAL = int(os.getenv('ACCOUNTS_REVOKED_TOKEN_FLUSH_INTERVAL', 60 if REDIS_URL else 0))
+ACCOUNTS_REVOKED_TOKEN_BUFFER_SIZE = int(os.getenv('ACCOUNTS_REVOKED_TOKEN_BUFFER_SIZE', 1000))
+# 書き込みバッファの反映間隔ごとのタイマーとプロセス終了時の書き込み（テストランナー config.test_runner が無効にする）
+ACCOUNTS_BACKGROUND_FLUSH = os.getenv('ACCOUNTS_BACKGROUND_FLUSH', 'True') == 'True'
+
+# テストランナー（テスト用の設定の上書き）
+TEST_RUNNER = 'config.test_runner.TestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -169,11 +219,24 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # orjson で描画・解析（未インストール時は標準の json、出力は JSONRenderer と同一）
+    # Accept / Content-Type が application/msgpack の場合は MessagePack
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.common.renderers.FastJSONRenderer',
+        'apps.common.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'apps.common.parsers.FastJSONParser',
+        'apps.common.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'apps.quiz.pagination.CustomPageNumberPagination',
     'EXCEPTION_HANDLER': 'apps.quiz.exceptions.custom_exception_handler',
@@ -220,7 +283,10 @@ CORS_ALLOW_CREDENTIALS = True
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'PQuizHub API',
-    'DESCRIPTION': 'API for a quiz/question bank service similar to QuizHub',
+    'DESCRIPTION': (
+        'API for a quiz/question bank service similar to QuizHub. '
+        'Every endpoint also accepts and returns MessagePack (Accept / Content-Type: application/msgpack).'
+    ),
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
     'COMPONENT_SPLIT_REQUEST': True,
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    プロジェクトのテストランナー
+    - 書き込みバッファ（ログイン日時・失効トークン）のタイマーとプロセス終了時の書き込みを無効にする（テストの発行クエリ数を一定に保つ）
+    - 別のランナーで実行する場合は環境変数 ACCOUNTS_BACKGROUND_FLUSH=False を指定する
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._saved_background_flush = settings.ACCOUNTS_BACKGROUND_FLUSH
+        settings.ACCOUNTS_BACKGROUND_FLUSH = False
+
+    def teardown_test_environment(self, **kwargs):
+        settings.ACCOUNTS_BACKGROUND_FLUSH = self._saved_background_flush
+        super().teardown_test_environment(**kwargs)
@@ -18,12 +18,11 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenRefreshView
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
 )
-from apps.accounts.authentication import EmailTokenObtainPairView
+from apps.accounts.views import EmailTokenObtainPairView, RevokingTokenRefreshView
 
 urlpatterns = [
     # Admin
@@ -31,7 +30,7 @@ urlpatterns = [
 
     # JWT Authentication (Email-based)
     path('api/token/', EmailTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/refresh/', RevokingTokenRefreshView.as_view(), name='token_refresh'),
 
     # OpenAPI Schema
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),